@@ -0,0 +1,153 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List
+from chunk_reader import CHUNK_HEADER, PNG_SIGNATURE
+from constants import BAND_ROWS, CrcPolicies, FilterEngines
+from encoder import make_chunk
+from instrumentation import logger
+from parser import Parser
+from pixel_buffer import PixelBuffer
+
+_default_executor = None
+
+
+class DecodeExecutor:
+    def __init__(self, max_concurrency: int = 8, max_pending: int = None, threads: int = None,
+                 processes: int = None):
+        cpu_count = os.cpu_count() or 1
+        self.threads = threads or cpu_count
+        # 0 процессов - чистый Python тоже выполняется в потоках
+        self.processes = cpu_count if processes is None else processes
+        self.max_pending = max_pending or 2 * (self.threads + self.processes)
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self._pending = asyncio.Semaphore(self.max_pending)
+        self._thread_pool = ThreadPoolExecutor(max_workers=self.threads)
+        self._process_pool = None
+        self._manager = None
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.processes > 0
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._concurrency:
+            yield
+
+    async def run_in_thread(self, func, *args):
+        # Семафор очереди - это и есть backpressure: новые задачи ждут, пока пул не разгребёт текущие
+        async with self._pending:
+            return await asyncio.get_running_loop().run_in_executor(self._thread_pool, func, *args)
+
+    async def run_in_process(self, func, *args):
+        async with self._pending:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes)
+                self._manager = multiprocessing.Manager()
+            cancel_event = self._manager.Event()
+            future = asyncio.get_running_loop().run_in_executor(self._process_pool, func, cancel_event, *args)
+            try:
+                return await future
+            except asyncio.CancelledError:
+                # Процесс не прервать извне, поэтому просим его остановиться на границе полосы строк
+                cancel_event.set()
+                raise
+
+    def shutdown(self):
+        self._thread_pool.shutdown(wait=True, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True, cancel_futures=True)
+            self._manager.shutdown()
+            self._process_pool = None
+            self._manager = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+
+
+def get_executor() -> DecodeExecutor:
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = DecodeExecutor()
+    return _default_executor
+
+
+async def parse_async(source, decode: bool = True, band_rows: int = BAND_ROWS, executor: DecodeExecutor = None,
+                      **parser_options) -> Parser:
+    executor = executor or get_executor()
+    async with executor.slot():
+        parser = Parser(**parser_options)
+        await executor.run_in_thread(parser.parse, source)
+        if decode and not parser.metadata_only:
+            await _decode(parser, band_rows, executor)
+    return parser
+
+
+async def _decode(parser: Parser, band_rows: int, executor: DecodeExecutor):
+    if parser.streaming or parser._is_interlaced():
+        # Потоковый режим уже распаковал IDAT при разборе, Adam7 не делится на полосы
+        await executor.run_in_thread(parser.decompress_data)
+        return
+    if parser._lookup_decode_cache():
+        return
+
+    # Пул процесса держит оценку всего декодирования, пока склеенный буфер не готов
+    with parser._reserve_memory():
+        if parser.filter_engine == FilterEngines.Python and executor.uses_processes:
+            # Фильтры на чистом Python держат GIL, поэтому уходят в отдельный процесс
+            options = {"downconvert_16bit": parser.downconvert_16bit, "expand_palette": parser.expand_palette}
+            pixels = await executor.run_in_process(_decode_bands_in_process, decode_payload(parser), band_rows,
+                                                   options)
+            if pixels is None:
+                raise asyncio.CancelledError()
+        else:
+            # zlib и NumPy отпускают GIL; между полосами проверяется отмена задачи
+            bands = parser._decode_bands(band_rows)
+            decoded = []
+            while True:
+                band = await executor.run_in_thread(next, bands, None)
+                if band is None:
+                    break
+                decoded.append(band[1])
+            pixels = join_bands(decoded)
+
+    if parser._cache_key is not None:
+        parser.decode_cache.put(parser._cache_key, pixels)
+    parser.pixels = pixels
+    parser.mode = pixels.mode
+    logger.debug("Асинхронно декодировано изображение %s.", pixels)
+
+
+def join_bands(bands: List[PixelBuffer]) -> PixelBuffer:
+    first = bands[0]
+    data = bytearray().join(band.data for band in bands)
+    return PixelBuffer(data, first.width, sum(band.height for band in bands), first.channels, first.mode,
+                       bit_depth=first.bit_depth)
+
+
+def decode_payload(parser: Parser) -> bytes:
+    # Исходник заново не открываем: процессу нужны только уже разобранные IHDR/PLTE/tRNS и IDAT
+    parts = [PNG_SIGNATURE]
+    for chunk in parser.chunks:
+        if chunk.chunk_type in (b'IHDR', b'PLTE', b'tRNS', b'IDAT'):
+            parts += [CHUNK_HEADER.pack(chunk.length, chunk.chunk_type), chunk.view, chunk.crc]
+    parts.append(make_chunk(b'IEND', b''))
+    return b''.join(parts)
+
+
+def _decode_bands_in_process(cancel_event, payload: bytes, band_rows: int, options: dict):
+    parser = Parser(crc_policy=CrcPolicies.Skip, process_hidden_files=False, read_hidden_data=False,
+                    memory_budget=None, **options)
+    parser.parse(payload)
+    bands = []
+    for _, band in parser.iter_bands(band_rows):
+        if cancel_event.is_set():
+            return None
+        bands.append(band)
+    return join_bands(bands)
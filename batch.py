@@ -0,0 +1,117 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator, List
+from parser import Parser
+from constants import CrcPolicies, FilterEngines
+
+_crc_executor = None
+
+
+def expand_paths(patterns: Iterable[str]) -> List[str]:
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith('.png'))
+        elif glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern, recursive=True)))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def decode_file(path: str, decode: bool = True, **parser_options) -> dict:
+    result = {
+        "path": path,
+        "ihdr": None,
+        "chunks": [],
+        "hidden_data": False,
+        "hidden_png": False,
+        "timings": {},
+        "error": None,
+    }
+    parser = Parser(process_hidden_files=False, crc_executor=_crc_executor, **parser_options)
+    started = time.perf_counter()
+    try:
+        parser.parse(path)
+        if decode:
+            parser.decompress_data()
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    result["timings"] = parser.timings
+    result["timings"]["total"] = time.perf_counter() - started
+    report = parser.instrumentation.report()
+    result["stages"] = report["stages"]
+    result["filters"] = report["filters"]
+
+    if hasattr(parser, "ihdr_information"):
+        result["ihdr"] = vars(parser.ihdr_information)
+    result["chunks"] = [
+        {"type": chunk.chunk_type.decode("ascii", errors="replace"), "offset": chunk.offset, "length": chunk.length}
+        for chunk in parser.chunks
+    ]
+    result["hidden_data"] = parser.hidden_data_length > 0
+    result["hidden_data_offset"] = parser.hidden_data_offset
+    result["hidden_data_length"] = parser.hidden_data_length
+    if parser._hidden_view:
+        result["hidden_png"] = parser._is_png(parser._hidden_view)
+    elif result["hidden_data"]:
+        result["hidden_png"] = None
+    return result
+
+
+def run_batch(paths: List[str], workers: int = None, chunksize: int = 16, decode: bool = True,
+              crc_threads: int = 0, **parser_options) -> Iterator[dict]:
+    task = partial(decode_file, decode=decode, **parser_options)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(crc_threads,)) as executor:
+        yield from executor.map(task, paths, chunksize=chunksize)
+
+
+def _init_worker(crc_threads: int):
+    global _crc_executor
+    if crc_threads > 0:
+        # zlib.crc32 отпускает GIL, поэтому проверка чанков масштабируется на потоках
+        _crc_executor = ThreadPoolExecutor(max_workers=crc_threads)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Пакетный разбор PNG файлов с выводом в JSON Lines.")
+    arg_parser.add_argument("paths", nargs="+", help="Файлы, каталоги или glob-шаблоны")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Число процессов (по умолчанию все ядра)")
+    arg_parser.add_argument("-c", "--chunksize", type=int, default=16, help="Сколько файлов отдавать процессу за раз")
+    arg_parser.add_argument("-o", "--output", default="-", help="Файл для JSON Lines (по умолчанию stdout)")
+    arg_parser.add_argument("--no-decode", action="store_true", help="Только разбор чанков, без декомпрессии")
+    arg_parser.add_argument("--metadata-only", action="store_true",
+                            help="Только IHDR, PLTE и текстовые чанки, IDAT перескакиваются без чтения")
+    arg_parser.add_argument("--skip-hidden-data", action="store_true",
+                            help="Не читать данные после IEND, только записать их смещение и длину")
+    arg_parser.add_argument("--streaming", action="store_true", help="Потоковая распаковка IDAT")
+    arg_parser.add_argument("--filter-engine", choices=[engine.value for engine in FilterEngines],
+                            default=FilterEngines.Python.value)
+    arg_parser.add_argument("--crc", choices=[policy.value for policy in CrcPolicies], default=CrcPolicies.Warn.value,
+                            help="Проверка CRC: strict - ошибка, warn - предупреждение, skip - не проверять")
+    arg_parser.add_argument("--crc-threads", type=int, default=0, help="Потоки для проверки CRC в каждом процессе")
+    args = arg_parser.parse_args(argv)
+
+    paths = expand_paths(args.paths)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        decode = not (args.no_decode or args.metadata_only)
+        for result in run_batch(paths, workers=args.workers, chunksize=args.chunksize, decode=decode,
+                                crc_threads=args.crc_threads, streaming=args.streaming,
+                                filter_engine=args.filter_engine, crc_policy=args.crc,
+                                metadata_only=args.metadata_only, read_hidden_data=not args.skip_hidden_data):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
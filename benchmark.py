@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+from constants import BYTES_ON_PIXEL_BY_COLOR_TYPE, ColorTypes, FilterEngines, FilterTypes, MAX_WIDTH
+from chunk_reader import PNG_SIGNATURE
+from encoder import filter_scanline, make_chunk
+from parser import Parser
+
+MIXED_FILTER = "Mixed"
+
+DEFAULT_SIZES = [(64, 64), (512, 512), (2048, 256), (MAX_WIDTH - 100, 8)]
+
+STAGES = ("parse", "inflate", "apply_filters", "decode_pixels", "to_image")
+
+# Короткий вызов только с разбором: печатает тяжёлые модули, которые всё-таки загрузились
+STARTUP_SCRIPT = (
+    "import sys, types; from parser import Parser; "
+    "Parser(metadata_only=True).parse(sys.argv[1]); "
+    "print(','.join(name for name in sys.argv[2:] if type(sys.modules.get(name)) is types.ModuleType))"
+)
+
+HEAVY_MODULES = ("PIL.Image", "numpy")
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def generate_pixels(width: int, height: int, color_type: int, seed: int = 0) -> bytes:
+    # Градиент с шумом: сжимается не идеально, но и не как чистый шум
+    rng = random.Random(seed)
+    channels = BYTES_ON_PIXEL_BY_COLOR_TYPE[color_type]
+    noise = rng.randbytes(width * height * channels)
+    gradient = bytes((x * 7 + y * 3) & 0xFF for y in range(height) for x in range(width) for _ in range(channels))
+    return bytes((g + (n & 0x1F)) & 0xFF for g, n in zip(gradient, noise))
+
+
+def build_png(pixels: bytes, width: int, height: int, color_type: int, filter_choice) -> bytes:
+    bpp = BYTES_ON_PIXEL_BY_COLOR_TYPE[color_type]
+    stride = width * bpp
+    previous = bytes(stride)
+    raw = bytearray()
+    for y in range(height):
+        row = pixels[y * stride:(y + 1) * stride]
+        filter_type = y % len(FilterTypes) if filter_choice == MIXED_FILTER else int(filter_choice)
+        raw.append(filter_type)
+        raw += filter_scanline(filter_type, row, previous, bpp)
+        previous = row
+
+    ihdr = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([8, color_type, 0, 0, 0])
+    png = PNG_SIGNATURE + make_chunk(b"IHDR", ihdr)
+    if color_type == ColorTypes.P:
+        png += make_chunk(b"PLTE", bytes(range(256)) * 3)
+    return png + make_chunk(b"IDAT", zlib.compress(bytes(raw))) + make_chunk(b"IEND", b"")
+
+
+def time_decode(path: str, filter_engine: str) -> Dict[str, float]:
+    parser = Parser(filter_engine=filter_engine)
+    parser.parse(path)
+    parser.decompress_data()
+    started = time.perf_counter()
+    parser.to_image().load()
+    timings = parser.timings
+    timings["to_image"] = time.perf_counter() - started
+    return {stage: timings[stage] for stage in STAGES}
+
+
+def run_benchmark(sizes: List[Tuple[int, int]], color_types=tuple(ColorTypes), filters=None,
+                  filter_engine: str = FilterEngines.Python, repeat: int = 3) -> List[dict]:
+    filters = list(filters) if filters is not None else [*FilterTypes, MIXED_FILTER]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in sizes:
+            for color_type in color_types:
+                pixels = generate_pixels(width, height, color_type)
+                raw_size = len(pixels)
+                for filter_choice in filters:
+                    name = filter_choice if filter_choice == MIXED_FILTER else FilterTypes(filter_choice).name
+                    path = os.path.join(directory, f"{width}x{height}_{color_type}_{name}.png")
+                    with open(path, "wb") as file:
+                        file.write(build_png(pixels, width, height, color_type, filter_choice))
+
+                    runs = [time_decode(path, filter_engine) for _ in range(repeat)]
+                    stages = {stage: statistics.median(run[stage] for run in runs) for stage in STAGES}
+                    results.append({
+                        "case": f"{ColorTypes(color_type).name}/{name}/{width}x{height}",
+                        "color_type": ColorTypes(color_type).name,
+                        "filter": name,
+                        "width": width,
+                        "height": height,
+                        "raw_bytes": raw_size,
+                        "seconds": stages,
+                        "mb_per_s": {stage: _rate(raw_size / 1e6, seconds) for stage, seconds in stages.items()},
+                        "mpixel_per_s": {stage: _rate(width * height / 1e6, seconds)
+                                         for stage, seconds in stages.items()},
+                    })
+    return results
+
+
+def measure_startup(repeat: int = 5) -> dict:
+    root = os.path.dirname(os.path.abspath(__file__))
+    # Байткод кэшируется после прогревочного запуска, как у установленного пакета
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    command = [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "startup.png")
+        with open(path, "wb") as file:
+            file.write(build_png(generate_pixels(16, 16, ColorTypes.RGB), 16, 16, ColorTypes.RGB, FilterTypes.Sub))
+
+        runs = []
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            process = subprocess.run(command + [path, *HEAVY_MODULES], capture_output=True, text=True, cwd=root,
+                                     env=env, check=True)
+            runs.append((time.perf_counter() - started, parse_importtime(process.stderr),
+                         [name for name in process.stdout.strip().split(",") if name]))
+        runs = runs[1:]
+
+    modules = {name for _, imports, _ in runs for name in imports}
+    return {
+        "wall_seconds": statistics.median(wall for wall, _, _ in runs),
+        "import_us": statistics.median(sum(imports.values()) for _, imports, _ in runs),
+        "modules": {name: statistics.median(imports.get(name, 0) for _, imports, _ in runs)
+                    for name in sorted(modules)},
+        "heavy_modules": sorted({name for _, _, loaded in runs for name in loaded}),
+    }
+
+
+def parse_importtime(output: str) -> Dict[str, int]:
+    # Только модули верхнего уровня: их cumulative уже включает всё, что они импортировали
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith(" ") and not name.startswith("  ") and cumulative.strip().isdigit():
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def _rate(amount: float, seconds: float) -> Optional[float]:
+    return amount / seconds if seconds > 0 else None
+
+
+def environment(filter_engine: str, repeat: int) -> dict:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "filter_engine": filter_engine,
+        "repeat": repeat,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    previous = {result["case"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(result["case"])
+        if old is None:
+            continue
+        old_total = sum(old["seconds"].values())
+        new_total = sum(result["seconds"].values())
+        ratio = new_total / old_total if old_total else float("inf")
+        marker = " <- регрессия" if ratio > 1 + threshold else ""
+        print(f"{result['case']:<32} {old_total:9.4f} с -> {new_total:9.4f} с ({ratio:5.2f}x){marker}")
+        if marker:
+            regressions.append(result["case"])
+
+    if "startup" in baseline and "startup" in current:
+        old_total = baseline["startup"]["import_us"]
+        new_total = current["startup"]["import_us"]
+        ratio = new_total / old_total if old_total else float("inf")
+        marker = " <- регрессия" if ratio > 1 + threshold else ""
+        print(f"{'startup (imports)':<32} {old_total / 1e6:9.4f} с -> {new_total / 1e6:9.4f} с ({ratio:5.2f}x){marker}")
+        if marker:
+            regressions.append("startup")
+    return regressions
+
+
+def print_results(results: List[dict]):
+    print(f"{'case':<32}" + "".join(f"{stage:>16}" for stage in STAGES))
+    for result in results:
+        print(f"{result['case']:<32}" + "".join(
+            f"{result['mb_per_s'][stage] or 0:>11.2f} MB/s" for stage in STAGES
+        ))
+
+
+def print_startup(startup: dict):
+    print(f"Запуск с разбором: {startup['wall_seconds']:.4f} с, импорты {startup['import_us'] / 1e3:.1f} мс")
+    for name, cumulative in sorted(startup["modules"].items(), key=lambda item: -item[1])[:10]:
+        print(f"  {name:<30} {cumulative / 1e3:8.1f} мс")
+    if startup["heavy_modules"]:
+        print(f"  загружены тяжёлые модули: {', '.join(startup['heavy_modules'])}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Воспроизводимый бенчмарк декодирования PNG.")
+    arg_parser.add_argument("--sizes", nargs="+", type=parse_size, default=DEFAULT_SIZES,
+                            help="Размеры в формате WIDTHxHEIGHT")
+    arg_parser.add_argument("--color-types", nargs="+", choices=[color.name for color in ColorTypes],
+                            default=[color.name for color in ColorTypes])
+    arg_parser.add_argument("--filters", nargs="+", choices=[f.name for f in FilterTypes] + [MIXED_FILTER],
+                            default=[f.name for f in FilterTypes] + [MIXED_FILTER])
+    arg_parser.add_argument("--engine", choices=[engine.value for engine in FilterEngines],
+                            default=FilterEngines.Python.value)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("-o", "--output", help="Сохранить результаты в JSON")
+    arg_parser.add_argument("--compare", help="JSON с результатами предыдущей версии для сравнения")
+    arg_parser.add_argument("--startup", action="store_true",
+                            help="Замерить время импорта при запуске только с разбором (python -X importtime)")
+    arg_parser.add_argument("--threshold", type=float, default=0.1, help="Допустимое замедление (0.1 = 10%%)")
+    args = arg_parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.sizes,
+        color_types=[ColorTypes[name] for name in args.color_types],
+        filters=[name if name == MIXED_FILTER else FilterTypes[name] for name in args.filters],
+        filter_engine=args.engine,
+        repeat=args.repeat,
+    )
+    report = {"environment": environment(args.engine, args.repeat), "results": results}
+    print_results(results)
+    if args.startup:
+        report["startup"] = measure_startup(args.repeat)
+        print_startup(report["startup"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 class Chunk():
-    def __init__(self, length: int, chunk_type: bytes, data: bytes, crc: bytes):
+    def __init__(self, length: int, chunk_type: bytes, data, crc: bytes, offset: int = None):
         self.length = length
         self.chunk_type = chunk_type
-        self.data = data
+        self.view = data
         self.crc = crc
+        self.offset = offset
+        self._data = None
+
+    @property
+    def data(self) -> bytes:
+        # Полезная нагрузка копируется из отображённого файла только при первом обращении
+        if self._data is None:
+            if self.view is None:
+                raise ValueError(f"Данные чанка {self.chunk_type} не были прочитаны.")
+            self._data = bytes(self.view)
+        return self._data
 
     def __str__(self):
         return (f"Length: {self.length} \n"
                 f"Chunk Type: {self.chunk_type} \n"
-                f"Data size: {len(self.data)} \n"
+                f"Data size: {self.length if self.view is None else len(self.view)} \n"
                 f"CRC: {self.crc.hex()} \n")
@@ -0,0 +1,199 @@
+import hashlib
+import os
+import sqlite3
+import sys
+from typing import Dict, Iterable, List, Optional
+from chunk import Chunk
+from constants import CrcPolicies, METADATA_CHUNK_TYPES
+from ihdr_information import IHDRInformation
+from instrumentation import logger
+from parser import Parser
+
+HASH_BLOCK_SIZE = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    width INTEGER,
+    height INTEGER,
+    bit_depth INTEGER,
+    color_type INTEGER,
+    compression_method INTEGER,
+    filter_method INTEGER,
+    interface_method INTEGER,
+    hidden_data_offset INTEGER,
+    hidden_data_length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    chunk_type BLOB NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    crc BLOB NOT NULL,
+    PRIMARY KEY (path, seq)
+);
+"""
+
+IHDR_FIELDS = ('width', 'height', 'bit_depth', 'color_type', 'compression_method', 'filter_method',
+               'interface_method')
+
+
+class IndexEntry:
+    def __init__(self, path: str, size: int, mtime_ns: int, content_hash: Optional[str],
+                 ihdr_information: Optional[IHDRInformation], chunks: List[Chunk],
+                 hidden_data_offset: Optional[int], hidden_data_length: int):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.content_hash = content_hash
+        self.ihdr_information = ihdr_information
+        self.chunks = chunks
+        self.hidden_data_offset = hidden_data_offset
+        self.hidden_data_length = hidden_data_length
+
+
+class ChunkIndex:
+    def __init__(self, index_path: str, hash_content: bool = False):
+        self.index_path = index_path
+        self.hash_content = hash_content
+        self.errors: Dict[str, str] = {}
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lookup(self, path: str) -> Optional[IndexEntry]:
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.remove(path)
+            return None
+
+        entry = self._load(path)
+        if entry is None:
+            return None
+        if entry.size != stat.st_size or entry.mtime_ns != stat.st_mtime_ns:
+            self.remove(path)
+            return None
+        return entry
+
+    def store(self, path: str, parser, stat: os.stat_result = None, content_hash: str = None) -> bool:
+        path = os.path.abspath(path)
+        if not parser.chunks or parser.chunks[-1].chunk_type != b'IEND':
+            # Разбор остановился раньше IEND: таблица чанков и смещение скрытых данных неполные
+            logger.debug("Файл %s разобран не до IEND, в индекс не записываем.", path)
+            return False
+        stat = stat or os.stat(path)
+        if content_hash is None and self.hash_content:
+            content_hash = self._hash_file(path)
+
+        ihdr = getattr(parser, 'ihdr_information', None)
+        ihdr_values = [getattr(ihdr, field) if ihdr else None for field in IHDR_FIELDS]
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, content_hash, *ihdr_values,
+                 parser.hidden_data_offset, parser.hidden_data_length)
+            )
+            self.connection.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, seq, chunk.chunk_type, chunk.offset, chunk.length, chunk.crc)
+                 for seq, chunk in enumerate(parser.chunks)]
+            )
+        return True
+
+    def remove(self, path: str):
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(path),))
+
+    def update(self, paths: Iterable[str]) -> int:
+        rescanned = 0
+        for path in paths:
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            entry = self._load(path)
+            if entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                continue
+
+            content_hash = self._hash_file(path) if self.hash_content else None
+            if entry is not None and content_hash is not None and entry.content_hash == content_hash:
+                # Файл только «потрогали»: содержимое то же, обновляем лишь размер и время изменения
+                with self.connection:
+                    self.connection.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                                            (stat.st_size, stat.st_mtime_ns, path))
+                continue
+
+            try:
+                stored = self._scan(path, content_hash)
+            except ValueError as error:
+                # Один битый файл не должен прерывать обновление всего архива
+                logger.warning("Не удалось проиндексировать %s: %s", path, error)
+                self.errors[path] = str(error)
+                self.remove(path)
+                continue
+            self.errors.pop(path, None)
+            if stored:
+                rescanned += 1
+        return rescanned
+
+    def prune(self) -> int:
+        paths = [row[0] for row in self.connection.execute("SELECT path FROM files")]
+        missing = [path for path in paths if not os.path.exists(path)]
+        for path in missing:
+            self.remove(path)
+        return len(missing)
+
+    def _scan(self, path: str, content_hash: Optional[str]) -> bool:
+        parser = Parser(metadata_only=True, metadata_chunk_types=METADATA_CHUNK_TYPES + (b'IEND',),
+                        read_hidden_data=False, crc_policy=CrcPolicies.Skip, process_hidden_files=False)
+        parser.parse(path)
+        return self.store(path, parser, content_hash=content_hash)
+
+    def _load(self, path: str) -> Optional[IndexEntry]:
+        row = self.connection.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+
+        path, size, mtime_ns, content_hash, *ihdr_values, hidden_data_offset, hidden_data_length = row
+        ihdr = None
+        if ihdr_values[0] is not None:
+            ihdr = IHDRInformation(**dict(zip(IHDR_FIELDS, ihdr_values)))
+        chunks = [
+            Chunk(length, bytes(chunk_type), None, bytes(crc), offset=offset)
+            for chunk_type, offset, length, crc in self.connection.execute(
+                "SELECT chunk_type, offset, length, crc FROM chunks WHERE path = ? ORDER BY seq", (path,)
+            )
+        ]
+        return IndexEntry(path, size, mtime_ns, content_hash, ihdr, chunks, hidden_data_offset, hidden_data_length)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    from batch import expand_paths
+
+    with ChunkIndex(sys.argv[1]) as index:
+        rescanned = index.update(expand_paths(sys.argv[2:]))
+        removed = index.prune()
+        failed = len(index.errors)
+    print(f"Пересканировано файлов: {rescanned}, удалено из индекса: {removed}, ошибок: {failed}.")
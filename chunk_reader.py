@@ -0,0 +1,117 @@
+import mmap
+import os
+import struct
+import zlib
+from typing import Iterator, List
+from chunk import Chunk
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+CHUNK_HEADER = struct.Struct('>I4s')
+
+CRC_SIZE = 4
+
+CRC_BLOCK_SIZE = 1 << 20
+
+
+def map_file(file) -> memoryview:
+    return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class ChunkReader:
+    def __init__(self, buffer, position: int = len(PNG_SIGNATURE)):
+        self.buffer = memoryview(buffer)
+        self.position = position
+        self.truncated = False
+
+    def __iter__(self) -> Iterator[Chunk]:
+        buffer = self.buffer
+        size = len(buffer)
+        while self.position < size:
+            header_end = self.position + CHUNK_HEADER.size
+            if header_end > size:
+                self.truncated = True
+                return
+
+            length, chunk_type = CHUNK_HEADER.unpack_from(buffer, self.position)
+            data_end = min(header_end + length, size)
+            crc_end = min(data_end + CRC_SIZE, size)
+            if crc_end - header_end < length + CRC_SIZE:
+                self.truncated = True
+
+            chunk = Chunk(length, chunk_type, buffer[header_end:data_end], bytes(buffer[data_end:crc_end]),
+                          offset=self.position)
+            self.position = crc_end
+            yield chunk
+
+    def remaining(self) -> memoryview:
+        return self.buffer[self.position:]
+
+
+class ChunkHeaderScanner:
+    def __init__(self, file, payload_types, position: int = len(PNG_SIGNATURE)):
+        self.file = file
+        self.payload_types = set(payload_types)
+        self.position = position
+        self.truncated = False
+
+    def __iter__(self) -> Iterator[Chunk]:
+        file = self.file
+        file.seek(self.position)
+        while True:
+            header = file.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                self.truncated = len(header) > 0
+                return
+
+            length, chunk_type = CHUNK_HEADER.unpack(header)
+            if chunk_type in self.payload_types:
+                data = file.read(length)
+                payload_truncated = len(data) < length
+            else:
+                # Полезную нагрузку не читаем, а перескакиваем
+                data = None
+                payload_truncated = False
+                file.seek(length, os.SEEK_CUR)
+            crc = file.read(CRC_SIZE)
+            self.truncated = payload_truncated or len(crc) < CRC_SIZE
+
+            chunk = Chunk(length, chunk_type, data, crc, offset=self.position)
+            self.position += CHUNK_HEADER.size + length + CRC_SIZE
+            yield chunk
+            if self.truncated:
+                return
+
+
+def find_iend_end(file) -> int:
+    # Идём по заголовкам чанков, поэтому байты 'IEND' внутри сжатых IDAT не мешают
+    scanner = ChunkHeaderScanner(file, ())
+    for chunk in scanner:
+        if chunk.chunk_type == b'IEND':
+            if scanner.truncated:
+                raise ValueError("PNG файл поврежден: некорректный блок IEND.")
+            return scanner.position
+    raise ValueError("Блок IEND не найден в PNG файле.")
+
+
+def compute_crc(chunk: Chunk) -> int:
+    crc = zlib.crc32(chunk.chunk_type)
+    view = chunk.view
+    # Большие IDAT считаем блоками прямо по отображению файла, не копируя полезную нагрузку
+    for start in range(0, len(view), CRC_BLOCK_SIZE):
+        crc = zlib.crc32(view[start:start + CRC_BLOCK_SIZE], crc)
+    return crc
+
+
+def is_crc_valid(chunk: Chunk) -> bool:
+    if chunk.view is None:
+        return True
+    return len(chunk.crc) == CRC_SIZE and compute_crc(chunk) == int.from_bytes(chunk.crc, 'big')
+
+
+def find_corrupted_chunks(chunks: List[Chunk], executor=None) -> List[Chunk]:
+    if executor is None:
+        results = map(is_crc_valid, chunks)
+    else:
+        results = executor.map(is_crc_valid, chunks)
+    return [chunk for chunk, valid in zip(chunks, results) if not valid]
@@ -0,0 +1,191 @@
+import argparse
+import os
+import shutil
+import tempfile
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+from chunk_reader import CHUNK_HEADER, CRC_SIZE, PNG_SIGNATURE, ChunkHeaderScanner
+from constants import TEXT_CHUNK_TYPES
+from encoder import make_chunk
+from instrumentation import logger
+
+COPY_BLOCK_SIZE = 1 << 20
+
+
+def make_text_chunk(keyword: str, text: str, chunk_type: bytes = b'iTXt', compress: bool = False) -> bytes:
+    name = keyword.encode('latin-1')
+    if chunk_type == b'tEXt':
+        return make_chunk(b'tEXt', name + b'\x00' + text.encode('latin-1'))
+    if chunk_type == b'zTXt':
+        return make_chunk(b'zTXt', name + b'\x00\x00' + zlib.compress(text.encode('latin-1')))
+    if chunk_type == b'iTXt':
+        value = text.encode('utf-8')
+        if compress:
+            value = zlib.compress(value)
+        # Флаг сжатия, метод сжатия, пустые тег языка и переведённое ключевое слово
+        return make_chunk(b'iTXt', name + b'\x00' + bytes([compress, 0]) + b'\x00\x00' + value)
+    raise ValueError(f"Неизвестный тип текстового чанка: {chunk_type}")
+
+
+def chunk_keyword(payload: bytes) -> str:
+    return payload.split(b'\x00', 1)[0].decode('latin-1')
+
+
+def copy_range(source, target, offset: int, length: int):
+    # target открыт без буферизации: системные вызовы пишут с текущей позиции дескриптора
+    source_fd, target_fd = source.fileno(), target.fileno()
+    for copy in (_copy_file_range, _sendfile):
+        copied = copy(source_fd, target_fd, offset, length)
+        offset += copied
+        length -= copied
+        if not length:
+            return
+
+    source.seek(offset)
+    while length:
+        block = source.read(min(length, COPY_BLOCK_SIZE))
+        if not block:
+            raise ValueError("Файл закончился раньше ожидаемого.")
+        write_all(target, block)
+        length -= len(block)
+
+
+def write_all(target, data):
+    # Небуферизованный файл может записать только часть данных за один вызов
+    view = memoryview(data)
+    while view:
+        view = view[target.write(view):]
+
+
+@contextmanager
+def open_output(input_path: str, output_path: str):
+    # Перезапись на месте идёт через временный файл в том же каталоге
+    in_place = os.path.exists(output_path) and os.path.samefile(input_path, output_path)
+    target_path = output_path
+    if in_place:
+        descriptor, target_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), suffix='.png')
+        os.close(descriptor)
+    try:
+        with open(target_path, 'wb', buffering=0) as target:
+            yield target
+        if in_place:
+            # mkstemp создаёт файл с правами 0600, возвращаем права исходного
+            shutil.copymode(input_path, target_path)
+            os.replace(target_path, output_path)
+    except BaseException:
+        # Недописанный результат не оставляем ни во временном файле, ни на месте вывода
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        raise
+
+
+def _copy_file_range(source_fd: int, target_fd: int, offset: int, length: int) -> int:
+    if not hasattr(os, 'copy_file_range'):
+        return 0
+    total = 0
+    while total < length:
+        try:
+            copied = os.copy_file_range(source_fd, target_fd, length - total, offset + total)
+        except OSError:
+            # Разные файловые системы или старое ядро: докопируем следующим способом
+            break
+        if not copied:
+            break
+        total += copied
+    return total
+
+
+def _sendfile(source_fd: int, target_fd: int, offset: int, length: int) -> int:
+    if not hasattr(os, 'sendfile'):
+        return 0
+    total = 0
+    while total < length:
+        try:
+            copied = os.sendfile(target_fd, source_fd, offset + total, length - total)
+        except OSError:
+            break
+        if not copied:
+            break
+        total += copied
+    return total
+
+
+def plan_rewrite(file, text: Dict[str, str], delete: Iterable[str]) -> Tuple[List[Tuple[int, int]], int]:
+    # Возвращает непрерывные диапазоны исходного файла для копирования и позицию вставки новых чанков
+    replaced = set(text) | set(delete)
+    scanner = ChunkHeaderScanner(file, TEXT_CHUNK_TYPES)
+    spans = [[0, len(PNG_SIGNATURE)]]
+    insert_at = None
+    for chunk in scanner:
+        start = chunk.offset
+        end = start + CHUNK_HEADER.size + chunk.length + CRC_SIZE
+        if chunk.chunk_type in TEXT_CHUNK_TYPES and chunk_keyword(chunk.data) in replaced:
+            continue
+        if insert_at is None and chunk.chunk_type in (b'IDAT', b'IEND'):
+            insert_at = start
+        if spans[-1][1] == start:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+        if chunk.chunk_type == b'IEND':
+            break
+    if scanner.truncated:
+        raise ValueError("У файла в конце чанк битый, переписывать его небезопасно.")
+
+    # Всё после IEND копируем как есть
+    size = file.seek(0, os.SEEK_END)
+    if size > scanner.position:
+        if spans[-1][1] == scanner.position:
+            spans[-1][1] = size
+        else:
+            spans.append([scanner.position, size])
+    return [(start, end) for start, end in spans], insert_at if insert_at is not None else scanner.position
+
+
+def rewrite_text_chunks(input_path: str, output_path: str, text: Dict[str, str] = None, delete: Iterable[str] = (),
+                        chunk_type: bytes = b'iTXt', compress: bool = False):
+    text = text or {}
+    delete = set(delete)
+    new_chunks = b''.join(make_text_chunk(keyword, value, chunk_type, compress) for keyword, value in text.items())
+
+    with open(input_path, 'rb') as source:
+        if source.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError("Не PNG файл, попробуйте другой")
+        spans, insert_at = plan_rewrite(source, text, delete)
+
+        with open_output(input_path, output_path) as target:
+            for start, end in spans:
+                if start <= insert_at <= end and new_chunks:
+                    copy_range(source, target, start, insert_at - start)
+                    write_all(target, new_chunks)
+                    new_chunks = b''
+                    start = insert_at
+                copy_range(source, target, start, end - start)
+            write_all(target, new_chunks)
+
+    logger.debug("Переписаны текстовые чанки %s: добавлено %d, удалено ключей %d.",
+                 output_path, len(text), len(delete))
+
+
+def main(argv=None):
+    from batch import expand_paths
+
+    arg_parser = argparse.ArgumentParser(description="Изменение текстовых чанков PNG без перекодирования пикселей.")
+    arg_parser.add_argument("paths", nargs="+", help="Файлы, каталоги или glob-шаблоны; файлы меняются на месте")
+    arg_parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Добавить или заменить")
+    arg_parser.add_argument("--delete", action="append", default=[], metavar="KEY", help="Удалить ключ")
+    arg_parser.add_argument("--type", choices=[chunk_type.decode() for chunk_type in TEXT_CHUNK_TYPES],
+                            default="iTXt")
+    arg_parser.add_argument("--compress", action="store_true", help="Сжимать текст iTXt")
+    args = arg_parser.parse_args(argv)
+
+    text = dict(item.split("=", 1) for item in args.set)
+    paths = expand_paths(args.paths)
+    for path in paths:
+        rewrite_text_chunks(path, path, text, args.delete, args.type.encode(), args.compress)
+    print(f"Обновлено файлов: {len(paths)}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,54 @@ MAX_WIDTH = 15_000
 
 MAX_HEIGHT = 15_000
 
+# Предел стандарта PNG на ширину и высоту
+MAX_PNG_DIMENSION = (1 << 31) - 1
+
 SCALE_FACTOR = 100
 
-BYTES_ON_PIXEL_BY_COLOR_TYPE = {
+# Изображения меньше этого по любой стороне увеличиваются в SCALE_FACTOR раз
+MIN_DISPLAY_SIDE = 50
+
+BLUR_RADIUS = 15
+
+# Бюджет памяти на полное декодирование одного изображения, байт
+MEMORY_BUDGET = 1 << 30
+
+# Бюджет на все одновременные декодирования в процессе, байт
+PROCESS_MEMORY_BUDGET = 4 << 30
+
+BAND_ROWS = 64
+
+# Ограничения на разбор PNG, вложенных после IEND
+MAX_HIDDEN_DEPTH = 4
+
+HIDDEN_BYTES_BUDGET = 64 << 20
+
+TEXT_CHUNK_TYPES = (b'tEXt', b'iTXt', b'zTXt')
+
+# Больше этого сжатый текст не распаковываем
+TEXT_INFLATE_LIMIT = 1 << 20
+
+# Текстовые чанки длиннее этого при потоковом приёме не буферизуются
+TEXT_CHUNK_LIMIT = 1 << 20
+
+METADATA_CHUNK_TYPES = (b'IHDR', b'PLTE', b'tRNS') + TEXT_CHUNK_TYPES
+
+# (x0, y0, dx, dy) для каждого из семи проходов Adam7
+ADAM7_PASSES = (
+    (0, 0, 8, 8),
+    (4, 0, 8, 8),
+    (0, 4, 4, 8),
+    (2, 0, 4, 4),
+    (0, 2, 2, 4),
+    (1, 0, 2, 2),
+    (0, 1, 1, 2)
+)
+
+# Размер блока (ширина, высота), которым покрывается каждый известный пиксель после прохода
+ADAM7_PREVIEW_BLOCKS = ((8, 8), (4, 8), (4, 4), (2, 4), (2, 2), (1, 2), (1, 1))
+
+SAMPLES_ON_PIXEL_BY_COLOR_TYPE = {
     0: 1,  # Grayscale
     2: 3,  # Truecolor
     3: 1,  # Indexed-color
@@ -14,6 +59,17 @@ BYTES_ON_PIXEL_BY_COLOR_TYPE = {
     6: 4  # Truecolor with alpha
 }
 
+# При глубине 8 бит на отсчёт число байт на пиксель совпадает с числом отсчётов
+BYTES_ON_PIXEL_BY_COLOR_TYPE = SAMPLES_ON_PIXEL_BY_COLOR_TYPE
+
+ALLOWED_BIT_DEPTHS_BY_COLOR_TYPE = {
+    0: (1, 2, 4, 8, 16),
+    2: (8, 16),
+    3: (1, 2, 4, 8),
+    4: (8, 16),
+    6: (8, 16)
+}
+
 
 class Modes(StrEnum):
     L = "L"  # Grayscale
@@ -37,3 +93,41 @@ class ColorTypes(IntEnum):
     P = 3
     LA = 4
     RGBA = 6
+
+
+class InterlaceMethods(IntEnum):
+    None_ = 0
+    Adam7 = 1
+
+
+class FilterEngines(StrEnum):
+    Python = "python"
+    NumPy = "numpy"
+
+
+class CrcPolicies(StrEnum):
+    Strict = "strict"
+    Warn = "warn"
+    Skip = "skip"
+
+
+class TextActions(StrEnum):
+    Blur = "blur"
+    Grayscale = "grayscale"
+
+
+class PushEvents(StrEnum):
+    Header = "header"
+    Chunk = "chunk"
+    Row = "row"
+    HiddenData = "hidden_data"
+    End = "end"
+
+
+MODES_BY_COLOR_TYPE = {
+    ColorTypes.L: Modes.L,
+    ColorTypes.RGB: Modes.RGB,
+    ColorTypes.P: Modes.Palette,
+    ColorTypes.LA: Modes.LA,
+    ColorTypes.RGBA: Modes.RGBA
+}
@@ -0,0 +1,179 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+from instrumentation import logger
+from pixel_buffer import PixelBuffer
+
+DECODE_CACHE_SIZE = 256 << 20
+
+CACHE_FILE_SUFFIX = '.pix'
+
+# Заголовок файла дискового уровня: сигнатура, ширина, высота, каналы, глубина, режим
+PIXEL_HEADER = struct.Struct('>4sIIBB8s')
+
+PIXEL_MAGIC = b'PXB1'
+
+
+def decode_key(parts: Iterable) -> str:
+    # Ключ по содержимому: IHDR/PLTE/tRNS, опции декодирования и все IDAT в порядке следования
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class DecodeCache:
+    def __init__(self, max_bytes: int = DECODE_CACHE_SIZE, directory: str = None, max_disk_bytes: int = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[PixelBuffer]:
+        with self._lock:
+            pixels = self._entries.get(key)
+            if pixels is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pixels
+
+        pixels = self._load(key) if self.directory is not None else None
+        with self._lock:
+            if pixels is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, pixels)
+        return pixels
+
+    def put(self, key: str, pixels: PixelBuffer) -> PixelBuffer:
+        # В кэше лежит неизменяемая копия: буфер делится между всеми, кто получит попадание
+        cached = PixelBuffer(bytes(pixels.data), pixels.width, pixels.height, pixels.channels, pixels.mode,
+                             bit_depth=pixels.bit_depth)
+        self._remember(key, cached)
+        if self.directory is not None:
+            self._store(key, cached)
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, pixels: PixelBuffer):
+        size = len(pixels.data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.data)
+            self._entries[key] = pixels
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.data)
+                self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_FILE_SUFFIX)
+
+    def _load(self, key: str) -> Optional[PixelBuffer]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Пустой или нечитаемый файл - такой же промах, как и отсутствующий
+            self._discard(path)
+            return None
+
+        # Пиксели не копируются и не декодируются: буфер смотрит прямо в отображённый файл
+        view = memoryview(mapped)
+        try:
+            magic, width, height, channels, bit_depth, mode = PIXEL_HEADER.unpack_from(view)
+            if magic != PIXEL_MAGIC:
+                raise ValueError("Неизвестная сигнатура файла кэша.")
+            pixels = PixelBuffer(view[PIXEL_HEADER.size:], width, height, channels,
+                                 mode.rstrip(b'\x00').decode('ascii'), bit_depth=bit_depth)
+        except (struct.error, ValueError):
+            self._discard(path)
+            return None
+        os.utime(path)
+        return pixels
+
+    def _discard(self, path: str):
+        logger.warning("Повреждённая запись кэша декодирования %s, удаляем.", path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _store(self, key: str, pixels: PixelBuffer):
+        header = PIXEL_HEADER.pack(PIXEL_MAGIC, pixels.width, pixels.height, pixels.channels, pixels.bit_depth,
+                                   pixels.mode.encode('ascii'))
+        # Запись через временный файл: другой процесс не увидит наполовину записанный буфер
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(header)
+                file.write(pixels.data)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        if self.max_disk_bytes is not None:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_FILE_SUFFIX):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        # Вытесняем давно не читанные: при попадании у файла обновляется время изменения
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.disk_evictions += 1
@@ -1,31 +1,32 @@
-def embed_png_in_png(container_path: str, hidden_path: str, output_path: str):
-    with open(container_path, 'rb') as container_file:
-        container_data = container_file.read()
-
-    with open(hidden_path, 'rb') as hidden_file:
-        hidden_data = hidden_file.read()
+import sys
+from typing import List
+from chunk_reader import PNG_SIGNATURE
+from hidden_data import splice_after_iend
 
-    if not container_data.startswith(b'\x89PNG\r\n\x1a\n'):
-        raise ValueError("Основной файл не является PNG!")
 
-    if not hidden_data.startswith(b'\x89PNG\r\n\x1a\n'):
-        raise ValueError("Скрываемый файл не является PNG!")
+def embed_png_in_png(container_path: str, hidden_path: str, output_path: str):
+    embed_pngs_in_png(container_path, [hidden_path], output_path)
 
-    iend_index = container_data.rfind(b'IEND')
-    if iend_index == -1:
-        raise ValueError("Не найден блок IEND в контейнерной PNG!")
 
-    embedded_data = container_data[:iend_index + 8] + hidden_data
+def embed_pngs_in_png(container_path: str, hidden_paths: List[str], output_path: str):
+    for hidden_path in hidden_paths:
+        with open(hidden_path, 'rb') as hidden_file:
+            if hidden_file.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+                raise ValueError("Скрываемый файл не является PNG!")
 
-    with open(output_path, 'wb') as output_file:
-        output_file.write(embedded_data)
+    # Вложенные PNG идут подряд, и парсер разбирает их цепочкой
+    splice_after_iend(container_path, output_path, hidden_paths, keep_trailer=False)
 
     print(f"Скрытая PNG-картинка успешно встроена в {output_path}.")
 
 
 if __name__ == "__main__":
-    embed_png_in_png(
-        container_path="images/originals/rgb.png",  # Путь к основной PNG
-        hidden_path="images/cat 1950s vibe.png",  # Путь к скрываемой PNG
-        output_path="images/test.png"  # Путь для результата
-    )
+    if len(sys.argv) > 3:
+        # python embeding.py container.png output.png hidden1.png hidden2.png ...
+        embed_pngs_in_png(sys.argv[1], sys.argv[3:], sys.argv[2])
+    else:
+        embed_png_in_png(
+            container_path="images/originals/rgb.png",  # Путь к основной PNG
+            hidden_path="images/cat 1950s vibe.png",  # Путь к скрываемой PNG
+            output_path="images/test.png"  # Путь для результата
+        )
@@ -0,0 +1,207 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from chunk_reader import PNG_SIGNATURE
+from constants import (ALLOWED_BIT_DEPTHS_BY_COLOR_TYPE, SAMPLES_ON_PIXEL_BY_COLOR_TYPE, ColorTypes, FilterTypes,
+                       Modes)
+from pixel_buffer import PixelBuffer
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+DEFLATE_LEVEL = 6
+
+# Размер независимо сжимаемого блока и окно словаря из предыдущего блока, как в pigz
+DEFLATE_BLOCK_SIZE = 1 << 20
+
+DEFLATE_WINDOW = 1 << 15
+
+COLOR_TYPES_BY_MODE = {
+    Modes.L: ColorTypes.L,
+    Modes.RGB: ColorTypes.RGB,
+    Modes.Palette: ColorTypes.P,
+    Modes.LA: ColorTypes.LA,
+    Modes.RGBA: ColorTypes.RGBA,
+}
+
+# Байт фильтрованной строки как знаковое число по модулю: основа эвристики минимальной суммы
+_SIGNED_ABS = bytes(value if value < 128 else 256 - value for value in range(256))
+
+
+def make_chunk(chunk_type: bytes, data) -> bytes:
+    return (len(data).to_bytes(4, 'big') + chunk_type + bytes(data)
+            + zlib.crc32(data, zlib.crc32(chunk_type)).to_bytes(4, 'big'))
+
+
+def encode_png(data, width: int, height: int, color_type: int, bit_depth: int = 8, palette: bytes = None,
+               text: Dict[str, str] = None, filter_type: Optional[int] = None, level: int = DEFLATE_LEVEL,
+               workers: int = None, block_size: int = DEFLATE_BLOCK_SIZE, transparency: bytes = None) -> bytes:
+    return b''.join(iter_png(data, width, height, color_type, bit_depth, palette, text, filter_type, level, workers,
+                             block_size, transparency))
+
+
+def save_png(path: str, data, width: int, height: int, color_type: int, **options):
+    with open(path, 'wb') as file:
+        for part in iter_png(data, width, height, color_type, **options):
+            file.write(part)
+
+
+def encode_pixel_buffer(pixels: PixelBuffer, palette: bytes = None, **options) -> bytes:
+    return encode_png(pixels.data, pixels.width, pixels.height, COLOR_TYPES_BY_MODE[pixels.mode],
+                      bit_depth=pixels.bit_depth, palette=palette, **options)
+
+
+def iter_png(data, width: int, height: int, color_type: int, bit_depth: int = 8, palette: bytes = None,
+             text: Dict[str, str] = None, filter_type: Optional[int] = None, level: int = DEFLATE_LEVEL,
+             workers: int = None, block_size: int = DEFLATE_BLOCK_SIZE,
+             transparency: bytes = None) -> Iterator[bytes]:
+    # data - строки изображения подряд, без байтов фильтра, в упаковке PNG для данной глубины
+    if bit_depth not in ALLOWED_BIT_DEPTHS_BY_COLOR_TYPE.get(color_type, ()):
+        raise ValueError(f"Недопустимая глубина цвета {bit_depth} для цветового типа {color_type}.")
+    bits_per_pixel = SAMPLES_ON_PIXEL_BY_COLOR_TYPE[color_type] * bit_depth
+    stride = (width * bits_per_pixel + 7) // 8
+    if len(data) != stride * height:
+        raise ValueError("Размер данных не соответствует размеру изображения.")
+    if color_type == ColorTypes.P and not palette:
+        raise ValueError("Для Indexed-color изображения нужна палитра.")
+
+    yield PNG_SIGNATURE
+    ihdr = width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + bytes([bit_depth, color_type, 0, 0, 0])
+    yield make_chunk(b'IHDR', ihdr)
+    if palette:
+        yield make_chunk(b'PLTE', palette)
+    if transparency:
+        yield make_chunk(b'tRNS', transparency)
+    for keyword, value in (text or {}).items():
+        yield make_chunk(b'tEXt', keyword.encode('latin-1') + b'\x00' + value.encode('latin-1'))
+
+    bpp = max(1, bits_per_pixel // 8)
+    rows_per_block = max(1, block_size // (stride + 1))
+    blocks = [(start, min(start + rows_per_block, height)) for start in range(0, height, rows_per_block)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(blocks) == 1:
+        filtered = [filter_rows(data, stride, start, end, bpp, filter_type) for start, end in blocks]
+        compressed = _deflate_blocks(filtered, level, map)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # zlib и NumPy отпускают GIL, поэтому и фильтрация, и сжатие масштабируются на потоках
+            filtered = list(executor.map(lambda block: filter_rows(data, stride, *block, bpp, filter_type), blocks))
+            compressed = _deflate_blocks(filtered, level, executor.map)
+
+    for part in compressed:
+        if part:
+            yield make_chunk(b'IDAT', part)
+    yield make_chunk(b'IEND', b'')
+
+
+def _deflate_blocks(filtered: List[bytes], level: int, mapper) -> List[bytes]:
+    last = len(filtered) - 1
+    dictionaries = [None] + [block[-DEFLATE_WINDOW:] for block in filtered[:-1]]
+    parts = list(mapper(_deflate_block, filtered, [level] * len(filtered), dictionaries,
+                        [index == last for index in range(len(filtered))]))
+
+    # Сырые deflate-блоки склеиваются в один zlib-поток: общий заголовок и Adler-32 от всех данных
+    adler = 1
+    for block in filtered:
+        adler = zlib.adler32(block, adler)
+    parts[0] = _zlib_header(level) + parts[0]
+    parts[-1] += adler.to_bytes(4, 'big')
+    return parts
+
+
+def _deflate_block(data: bytes, level: int, zdict: Optional[bytes], last: bool) -> bytes:
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # Z_SYNC_FLUSH выравнивает блок по байту, так что следующий блок можно дописать сразу за ним
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _zlib_header(level: int) -> bytes:
+    cmf = 0x78
+    flevel = 0 if 0 <= level <= 1 else 1 if level <= 5 else 2 if level in (-1, 6) else 3
+    flg = flevel << 6
+    flg += 31 - (cmf * 256 + flg) % 31
+    return bytes([cmf, flg])
+
+
+def filter_rows(data, stride: int, start: int, end: int, bpp: int, filter_type: Optional[int] = None) -> bytes:
+    if np is not None:
+        return _filter_rows_numpy(data, stride, start, end, bpp, filter_type)
+
+    view = memoryview(data)
+    previous = bytes(view[(start - 1) * stride:start * stride]) if start else bytes(stride)
+    filtered = bytearray()
+    for y in range(start, end):
+        row = bytes(view[y * stride:(y + 1) * stride])
+        if filter_type is None:
+            candidates = [filter_scanline(candidate, row, previous, bpp) for candidate in FilterTypes]
+            chosen = min(FilterTypes, key=lambda candidate: sum(candidates[candidate].translate(_SIGNED_ABS)))
+            filtered.append(chosen)
+            filtered += candidates[chosen]
+        else:
+            filtered.append(filter_type)
+            filtered += filter_scanline(filter_type, row, previous, bpp)
+        previous = row
+    return bytes(filtered)
+
+
+def filter_scanline(filter_type: int, row: bytes, previous: bytes, bpp: int) -> bytes:
+    if filter_type == FilterTypes.None_:
+        return bytes(row)
+    filtered = bytearray(len(row))
+    for i in range(len(row)):
+        left = row[i - bpp] if i >= bpp else 0
+        up = previous[i]
+        if filter_type == FilterTypes.Sub:
+            predictor = left
+        elif filter_type == FilterTypes.Up:
+            predictor = up
+        elif filter_type == FilterTypes.Average:
+            predictor = (left + up) // 2
+        else:
+            up_left = previous[i - bpp] if i >= bpp else 0
+            p = left + up - up_left
+            pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+            predictor = left if pa <= pb and pa <= pc else up if pb <= pc else up_left
+        filtered[i] = (row[i] - predictor) & 0xFF
+    return bytes(filtered)
+
+
+def _filter_rows_numpy(data, stride: int, start: int, end: int, bpp: int, filter_type: Optional[int]) -> bytes:
+    image = np.frombuffer(data, dtype=np.uint8, count=end * stride).reshape(end, stride)
+    rows = image[start:end]
+    previous = np.zeros_like(rows)
+    if start:
+        previous[0] = image[start - 1]
+    previous[1:] = rows[:-1]
+
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    up_left = np.zeros_like(rows)
+    up_left[:, bpp:] = previous[:, :-bpp]
+
+    # Все пять фильтров сразу для всего блока: у кодировщика нет зависимости от соседей
+    candidates = np.empty((len(FilterTypes),) + rows.shape, dtype=np.uint8)
+    candidates[FilterTypes.None_] = rows
+    candidates[FilterTypes.Sub] = rows - left
+    candidates[FilterTypes.Up] = rows - previous
+    candidates[FilterTypes.Average] = rows - ((left.astype(np.uint16) + previous) >> 1).astype(np.uint8)
+    a, b, c = left.astype(np.int16), previous.astype(np.int16), up_left.astype(np.int16)
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, previous, up_left))
+    candidates[FilterTypes.Paeth] = rows - predictor
+
+    if filter_type is None:
+        scores = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+        choice = scores.argmin(axis=0)
+    else:
+        choice = np.full(len(rows), filter_type)
+
+    filtered = np.empty((len(rows), stride + 1), dtype=np.uint8)
+    filtered[:, 0] = choice
+    filtered[:, 1:] = candidates[choice, np.arange(len(rows))]
+    return filtered.tobytes()
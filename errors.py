@@ -0,0 +1,22 @@
+class CrcMismatchError(ValueError):
+    def __init__(self, chunk_type: bytes, offset: int):
+        super().__init__(f"Неверная контрольная сумма CRC у чанка {chunk_type!r} по смещению {offset}.")
+        self.chunk_type = chunk_type
+        self.offset = offset
+
+
+class ImageTooLargeError(ValueError):
+    def __init__(self, required: int, budget: int):
+        super().__init__(f"Для полного декодирования нужно около {required} байт памяти при бюджете {budget}. "
+                         f"Используйте Parser.iter_bands() или увеличьте memory_budget.")
+        self.required = required
+        self.budget = budget
+
+
+class MemoryBudgetExceededError(ImageTooLargeError):
+    def __init__(self, required: int, budget: int, in_use: int):
+        ValueError.__init__(self, f"Декодированию нужно около {required} байт, но в процессе уже занято {in_use} "
+                                  f"из {budget}. Повторите позже или уменьшите число одновременных декодирований.")
+        self.required = required
+        self.budget = budget
+        self.in_use = in_use
@@ -1,27 +1,41 @@
-def add_hidden_data_to_png(input_file_path: str, output_file_path: str, hidden_data: bytes):
-    with open(input_file_path, 'rb') as input_file:
-        png_data = input_file.read()
+import os
+import sys
+from typing import Iterable
+from chunk_reader import PNG_SIGNATURE, find_iend_end
+from chunk_rewriter import copy_range, open_output, write_all
 
-    iend_marker = b'IEND'
-    iend_index = png_data.find(iend_marker)
-    if iend_index == -1:
-        raise ValueError("Блок IEND не найден в PNG файле.")
 
-    iend_block_end = iend_index + 8
-    if len(png_data) < iend_block_end:
-        raise ValueError("PNG файл поврежден: некорректный блок IEND.")
+def add_hidden_data_to_png(input_file_path: str, output_file_path: str, hidden_data: bytes):
+    splice_after_iend(input_file_path, output_file_path, [hidden_data])
+    print(f"Скрытая информация добавлена в файл: {output_file_path}")
 
-    with open(output_file_path, 'wb') as output_file:
-        output_file.write(png_data[:iend_block_end])
-        output_file.write(hidden_data)
-        output_file.write(png_data[iend_block_end:])
 
-    print(f"Скрытая информация добавлена в файл: {output_file_path}")
+def splice_after_iend(container_path: str, output_path: str, payloads: Iterable, keep_trailer: bool = True) -> int:
+    # payloads - байты или пути к файлам; все они дописываются за IEND за один проход по контейнеру
+    with open(container_path, 'rb') as container:
+        if container.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+            raise ValueError("Основной файл не является PNG!")
+        iend_end = find_iend_end(container)
+        size = container.seek(0, os.SEEK_END)
+
+        with open_output(container_path, output_path) as target:
+            copy_range(container, target, 0, iend_end)
+            for payload in payloads:
+                if isinstance(payload, (bytes, bytearray, memoryview)):
+                    write_all(target, payload)
+                    continue
+                with open(payload, 'rb') as source:
+                    copy_range(source, target, 0, os.fstat(source.fileno()).st_size)
+            if keep_trailer:
+                copy_range(container, target, iend_end, size - iend_end)
+    return iend_end
 
 
 if __name__ == '__main__':
-    input_file = "images/originals/rgb.png"
-    output_file = "images/tochka_test.png"
-    hidden_data = b"Mozno recomendaciyu v Tochku?"
+    # python hidden_data.py input.png output.png "текст" ...
+    input_file = sys.argv[1] if len(sys.argv) > 1 else "images/originals/rgb.png"
+    output_file = sys.argv[2] if len(sys.argv) > 2 else "images/tochka_test.png"
+    payloads = [text.encode('utf-8') for text in sys.argv[3:]] or [b"Mozno recomendaciyu v Tochku?"]
 
-    add_hidden_data_to_png(input_file, output_file, hidden_data)
+    splice_after_iend(input_file, output_file, payloads)
+    print(f"Скрытая информация добавлена в файл: {output_file}")
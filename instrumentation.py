@@ -0,0 +1,91 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+from constants import FilterTypes
+
+logger = logging.getLogger("png_parser")
+logger.addHandler(logging.NullHandler())
+
+
+class StageRecord:
+    def __init__(self, name: str, bytes_in: int = 0):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+
+    def add(self, other: "StageRecord"):
+        self.calls += other.calls
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+    def __repr__(self):
+        return (f"StageRecord({self.name}, calls={self.calls}, wall={self.wall_time:.6f}s, "
+                f"cpu={self.cpu_time:.6f}s, in={self.bytes_in}, out={self.bytes_out})")
+
+
+StageHook = Callable[[StageRecord], None]
+
+
+class Instrumentation:
+    def __init__(self, hooks: Optional[Iterable[StageHook]] = None):
+        self.hooks = list(hooks or [])
+        self.stages: Dict[str, StageRecord] = {}
+        self.chunk_counts = Counter()
+        self.filter_histogram = Counter()
+
+    @contextmanager
+    def stage(self, name: str, bytes_in: int = 0):
+        record = StageRecord(name, bytes_in)
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield record
+        finally:
+            record.calls = 1
+            record.wall_time = time.perf_counter() - wall_started
+            record.cpu_time = time.process_time() - cpu_started
+            self.stages.setdefault(name, StageRecord(name)).add(record)
+            for hook in self.hooks:
+                hook(record)
+            logger.debug("Стадия %s: %.6f с (CPU %.6f с), вход %d байт, выход %d байт",
+                         name, record.wall_time, record.cpu_time, record.bytes_in, record.bytes_out)
+
+    def count_chunk(self, chunk_type: bytes):
+        self.chunk_counts[chunk_type.decode("ascii", errors="replace")] += 1
+
+    def count_filter(self, filter_type: int):
+        self.filter_histogram[filter_type] += 1
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        return {name: record.wall_time for name, record in self.stages.items()}
+
+    def report(self) -> dict:
+        return {
+            "stages": {name: record.as_dict() for name, record in self.stages.items()},
+            "chunks": dict(self.chunk_counts),
+            "filters": {_filter_name(filter_type): rows for filter_type, rows in sorted(self.filter_histogram.items())},
+        }
+
+
+def _filter_name(filter_type: int) -> str:
+    try:
+        return FilterTypes(filter_type).name
+    except ValueError:
+        return str(filter_type)
@@ -0,0 +1,133 @@
+from typing import Callable, List, Optional, Tuple
+from constants import ADAM7_PASSES, ADAM7_PREVIEW_BLOCKS
+from samples import unpack_samples
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+
+class Adam7Pass:
+    def __init__(self, number: int, x0: int, y0: int, dx: int, dy: int, width: int, height: int, stride: int):
+        self.number = number
+        self.x0 = x0
+        self.y0 = y0
+        self.dx = dx
+        self.dy = dy
+        self.width = width
+        self.height = height
+        self.stride = stride
+
+    @property
+    def is_empty(self) -> bool:
+        return self.width == 0 or self.height == 0
+
+
+def adam7_passes(width: int, height: int, bits_per_pixel: int) -> List[Adam7Pass]:
+    passes = []
+    for number, (x0, y0, dx, dy) in enumerate(ADAM7_PASSES, start=1):
+        pass_width = (width - x0 + dx - 1) // dx if width > x0 else 0
+        pass_height = (height - y0 + dy - 1) // dy if height > y0 else 0
+        stride = (pass_width * bits_per_pixel + 7) // 8
+        passes.append(Adam7Pass(number, x0, y0, dx, dy, pass_width, pass_height, stride))
+    return passes
+
+
+class Adam7Decoder:
+    def __init__(self, width: int, height: int, channels: int, bit_depth: int, scale: bool, bpp: int,
+                 unfilter_scanline: Callable):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.bit_depth = bit_depth
+        self.scale = scale
+        self.bpp = bpp
+        self.unfilter_scanline = unfilter_scanline
+        self.pixel_size = channels * (2 if bit_depth == 16 else 1)
+        self.passes = [p for p in adam7_passes(width, height, channels * bit_depth) if not p.is_empty]
+        self.samples = bytearray(width * height * self.pixel_size)
+        self.completed_pass: Optional[Adam7Pass] = None
+        self._pass_index = 0
+        self._start_pass()
+
+    def row_layout(self) -> List[Tuple[int, int]]:
+        return [(p.stride, p.height) for p in self.passes]
+
+    def push_row(self, filter_type: int, scanline) -> bool:
+        current = self.passes[self._pass_index]
+        recon = self.unfilter_scanline(filter_type, scanline, self._previous, self.bpp)
+        if recon is None:
+            recon = bytearray(current.stride)
+        offset = self._pass_row * current.stride
+        self._pass_data[offset:offset + current.stride] = recon
+        self._previous = recon
+        self._pass_row += 1
+
+        if self._pass_row < current.height:
+            return False
+
+        # Подызображение прохода полностью восстановлено: распаковываем и раскладываем по сетке
+        self._scatter(current, unpack_samples(self._pass_data, current.width, current.height, self.channels,
+                                              self.bit_depth, scale=self.scale))
+        self.completed_pass = current
+        self._pass_index += 1
+        self._start_pass()
+        return True
+
+    def preview(self) -> bytearray:
+        if self.completed_pass is None:
+            return bytearray(len(self.samples))
+        block_width, block_height = ADAM7_PREVIEW_BLOCKS[self.completed_pass.number - 1]
+        if block_width == 1 and block_height == 1:
+            return bytearray(self.samples)
+        if np is not None:
+            return self._preview_numpy(block_width, block_height)
+        return self._preview_slices(block_width, block_height)
+
+    def _start_pass(self):
+        if self._pass_index < len(self.passes):
+            current = self.passes[self._pass_index]
+            self._pass_data = bytearray(current.stride * current.height)
+            self._previous = bytearray(current.stride)
+            self._pass_row = 0
+
+    def _scatter(self, current: Adam7Pass, pass_samples: bytearray):
+        if np is not None:
+            target = np.frombuffer(self.samples, dtype=np.uint8).reshape(self.height, self.width, self.pixel_size)
+            source = np.frombuffer(pass_samples, dtype=np.uint8).reshape(current.height, current.width,
+                                                                         self.pixel_size)
+            target[current.y0::current.dy, current.x0::current.dx] = source
+            return
+
+        pixel_size = self.pixel_size
+        row_size = self.width * pixel_size
+        pass_row_size = current.width * pixel_size
+        step = current.dx * pixel_size
+        for pass_y in range(current.height):
+            source_row = pass_samples[pass_y * pass_row_size:(pass_y + 1) * pass_row_size]
+            row_start = (current.y0 + pass_y * current.dy) * row_size + current.x0 * pixel_size
+            for byte in range(pixel_size):
+                start = row_start + byte
+                self.samples[start:start + (current.width - 1) * step + 1:step] = source_row[byte::pixel_size]
+
+    def _preview_numpy(self, block_width: int, block_height: int) -> bytearray:
+        image = np.frombuffer(self.samples, dtype=np.uint8).reshape(self.height, self.width, self.pixel_size)
+        rows = (np.arange(self.height) // block_height) * block_height
+        columns = (np.arange(self.width) // block_width) * block_width
+        return bytearray(image[rows][:, columns].tobytes())
+
+    def _preview_slices(self, block_width: int, block_height: int) -> bytearray:
+        pixel_size = self.pixel_size
+        row_size = self.width * pixel_size
+        step = block_width * pixel_size
+        preview = bytearray(len(self.samples))
+        for block_y in range(0, self.height, block_height):
+            source_row = self.samples[block_y * row_size:(block_y + 1) * row_size]
+            row = bytearray(row_size)
+            for column in range(min(block_width, self.width)):
+                for byte in range(pixel_size):
+                    start = column * pixel_size + byte
+                    count = len(range(start, row_size, step))
+                    row[start::step] = source_row[byte::step][:count]
+            for y in range(block_y, min(block_y + block_height, self.height)):
+                preview[y * row_size:(y + 1) * row_size] = row
+        return preview
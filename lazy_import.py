@@ -0,0 +1,31 @@
+import importlib
+import importlib.util
+import threading
+from typing import Optional
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attribute: str):
+        # Первое обращение импортирует модуль под блокировкой: потоки кодировщика могут прийти одновременно
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return f"LazyModule({self._name!r}, loaded={self._module is not None})"
+
+
+def lazy_module(name: str) -> Optional[LazyModule]:
+    # Модуль загружается при первом обращении к атрибуту; None, если он не установлен
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
@@ -1,6 +1,12 @@
+import logging
+import sys
 from parser import Parser
 
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+file_path = sys.argv[1] if len(sys.argv) > 1 else "images/originals/pine.png"
+
 parser = Parser()
-parser.parse("images/originals/pine.png")
+parser.parse(file_path)
 parser.decompress_data()
 parser.display_image()
@@ -0,0 +1,34 @@
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from constants import PROCESS_MEMORY_BUDGET
+from errors import MemoryBudgetExceededError
+
+
+class MemoryPool:
+    def __init__(self, budget: Optional[int] = PROCESS_MEMORY_BUDGET):
+        # Общий счётчик на все декодирования процесса: каждое резервирует оценку своего пика
+        self.budget = budget
+        self.in_use = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reserve(self, size: int):
+        with self._lock:
+            if self.budget is not None and self.in_use + size > self.budget:
+                raise MemoryBudgetExceededError(size, self.budget, self.in_use)
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= size
+
+
+process_memory = MemoryPool()
+
+
+def set_process_memory_budget(budget: Optional[int]):
+    process_memory.budget = budget
@@ -1,13 +1,12 @@
 import json
 
-from PIL import Image, PngImagePlugin
+from chunk_rewriter import rewrite_text_chunks
 
 
 def add_metadata_to_png(input_file_path, output_file_path, metadata):
-    img = Image.open(input_file_path)
-    meta = PngImagePlugin.PngInfo()
-    meta.add_itxt('Json metadata', json.dumps(metadata, ensure_ascii=False))
-    img.save(output_file_path, "PNG", pnginfo=meta)
+    # Пиксели не перекодируются: IDAT копируется в новый файл байт в байт
+    rewrite_text_chunks(input_file_path, output_file_path,
+                        {'Json metadata': json.dumps(metadata, ensure_ascii=False)}, chunk_type=b'iTXt')
     print(f"Метаданные успешно добавлены в файл {output_file_path}")
 
 
@@ -0,0 +1,80 @@
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+def filter_sub(scanline, bpp: int) -> bytearray:
+    raw = np.frombuffer(scanline, dtype=np.uint8)
+    pad = -len(raw) % bpp
+    if pad:
+        raw = np.concatenate((raw, np.zeros(pad, dtype=np.uint8)))
+    # Накопительная сумма в uint8 сама даёт сложение по модулю 256
+    recon = np.cumsum(raw.reshape(-1, bpp), axis=0, dtype=np.uint8).reshape(-1)
+    return bytearray(recon[:len(recon) - pad].tobytes())
+
+
+def filter_up(scanline, previous) -> bytearray:
+    raw = np.frombuffer(scanline, dtype=np.uint8)
+    up = np.frombuffer(previous, dtype=np.uint8)[:len(raw)]
+    return bytearray((raw + up).tobytes())
+
+
+def filter_average(scanline, previous, bpp: int) -> bytearray:
+    up = np.frombuffer(previous, dtype=np.uint8)[:len(scanline)]
+    if not up.any():
+        return _filter_average_first_row(scanline, bpp)
+
+    raw = np.frombuffer(scanline, dtype=np.uint8)
+    head = (raw[:bpp] + (up[:bpp] >> 1)).tolist()
+
+    # Всё, что не зависит от левого соседа, посчитано векторно; в цикле осталась только зависимость с шагом bpp
+    recon = head + raw[bpp:].tolist()
+    up_values = up.tolist()
+    for i in range(bpp, len(recon)):
+        recon[i] = (recon[i] + ((recon[i - bpp] + up_values[i]) >> 1)) & 0xFF
+    return bytearray(recon)
+
+
+def filter_paeth(scanline, previous, bpp: int) -> bytearray:
+    up = np.frombuffer(previous, dtype=np.uint8)[:len(scanline)]
+    if not up.any():
+        # Над первой строкой предиктор Paeth всегда выбирает левого соседа, то есть совпадает с Sub
+        return filter_sub(scanline, bpp)
+
+    raw = np.frombuffer(scanline, dtype=np.uint8)
+    up = up.astype(np.int16)
+    up_left = np.zeros_like(up)
+    up_left[bpp:] = up[:-bpp]
+
+    pa_values = np.abs(up - up_left).tolist()
+    shift_values = (up - 2 * up_left).tolist()
+    up_values = up.tolist()
+    up_left_values = up_left.tolist()
+
+    recon = raw.tolist()
+    for i in range(min(bpp, len(recon))):
+        recon[i] = (recon[i] + up_values[i]) & 0xFF
+    for i in range(bpp, len(recon)):
+        left = recon[i - bpp]
+        pa = pa_values[i]
+        pb = abs(left - up_left_values[i])
+        pc = abs(left + shift_values[i])
+        if pa <= pb and pa <= pc:
+            pr = left
+        elif pb <= pc:
+            pr = up_values[i]
+        else:
+            pr = up_left_values[i]
+        recon[i] = (recon[i] + pr) & 0xFF
+    return bytearray(recon)
+
+
+def _filter_average_first_row(scanline, bpp: int) -> bytearray:
+    recon = bytearray(scanline)
+    for i in range(bpp, len(recon)):
+        recon[i] = (recon[i] + (recon[i - bpp] >> 1)) & 0xFF
+    return recon
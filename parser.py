@@ -1,97 +1,468 @@
-import random
+import os
 import zlib
-from typing import List
+from contextlib import ExitStack, contextmanager
+from typing import TYPE_CHECKING, List
 from chunk import Chunk
+from chunk_reader import ChunkHeaderScanner, ChunkReader, PNG_SIGNATURE, find_corrupted_chunks, map_file
+from errors import CrcMismatchError, ImageTooLargeError
+from instrumentation import Instrumentation, logger
+from interlace import Adam7Decoder, adam7_passes
+from lazy_import import lazy_module
+from memory_budget import MemoryPool, process_memory
 from ihdr_information import IHDRInformation
-from plte_information import PLTEInformation
-from PIL import Image, ImageFilter
+from plte_information import Palette
+from scanline_stream import ScanlineStream
+from pixel_buffer import PixelBuffer
+from samples import downconvert_16bit, unpack_samples
+from text_index import TextIndex
+from text_rules import DEFAULT_RULE_ENGINE, RuleEngine
 from constants import *
+import numpy_filters
+
+if TYPE_CHECKING:
+    from decode_cache import DecodeCache
+    from post_processing import PostProcessing
+
+# Pillow нужен только для показа и постобработки: разбор и декодирование без него
+Image = lazy_module('PIL.Image')
 
 
 class Parser:
-    def __init__(self):
-        self.should_blur = False
-        self.should_bw = False
-        self.compressed_data_idat = b''
+    def __init__(self, filter_engine: str = FilterEngines.Python, streaming: bool = False,
+                 process_hidden_files: bool = True, crc_policy: str = CrcPolicies.Warn, crc_executor=None,
+                 metadata_only: bool = False, metadata_chunk_types=METADATA_CHUNK_TYPES,
+                 read_hidden_data: bool = True, chunk_index=None, instrumentation: Instrumentation = None,
+                 downconvert_16bit: bool = False, memory_budget: int = MEMORY_BUDGET,
+                 max_hidden_depth: int = MAX_HIDDEN_DEPTH, hidden_bytes_budget: int = HIDDEN_BYTES_BUDGET,
+                 expand_palette: bool = False, text_rules: RuleEngine = None,
+                 memory_pool: MemoryPool = None, decode_cache: "DecodeCache" = None):
+        if filter_engine == FilterEngines.NumPy and not numpy_filters.is_available():
+            logger.warning("NumPy не установлен, используем фильтры на чистом Python.")
+            filter_engine = FilterEngines.Python
+        self.filter_engine = FilterEngines(filter_engine)
+        self._should_blur = False
+        self._should_bw = False
+        self.text_rules = text_rules if text_rules is not None else DEFAULT_RULE_ENGINE
+        self._text_actions = set()
+        self._matched_entries = 0
+        self.text_index = TextIndex()
+        self.streaming = streaming
+        self.process_hidden_files = process_hidden_files
+        self.crc_policy = CrcPolicies(crc_policy)
+        self.crc_executor = crc_executor
+        self.corrupted_chunks: List[Chunk] = []
+        self.metadata_only = metadata_only
+        self.metadata_chunk_types = tuple(metadata_chunk_types)
+        self.read_hidden_data = read_hidden_data
+        self.chunk_index = chunk_index
+        self.instrumentation = instrumentation or Instrumentation()
+        self.downconvert_16bit = downconvert_16bit
+        self.memory_budget = memory_budget
+        self.memory_pool = memory_pool or process_memory
+        self.decode_cache = decode_cache
+        self._cache_key = None
+        self._cache_hit = False
+        self.max_hidden_depth = max_hidden_depth
+        self.hidden_bytes_budget = hidden_bytes_budget
+        self.expand_palette = expand_palette
+        self.hidden_parser = None
+        self._depth = 0
+        self._over_budget = False
+        self.compressed_data_idat = bytearray()
+        self.scanline_stream = None
+        self._streaming_memory = None
+        self._adam7 = None
         self.chunks: List[Chunk] = []
         self.ihdr_information: IHDRInformation
-        self.palette: List[PLTEInformation] = []
+        self.palette = Palette()
         self.raw_image = None
-        self.image_data = []
-        self.pixels = []
+        self.image_data = bytearray()
+        self.pixels = PixelBuffer(bytearray(), 0, 0, 1, None)
         self.mode = None
-        self.hidden_data = b''
-
-    def parse(self, file_path: str):
-        with (open(file_path, 'rb') as file):
-            signature = file.read(8)
-            if signature != b'\x89PNG\r\n\x1a\n':
-                raise ValueError("Не PNG файл, попробуйте другой")
-
-            print(f"Сигнатура: {signature}\n")
-            self._record_chunks(file)
-            print("\nНачинаем печатать чанки...\n")
-            for chunk in self.chunks:
-                print(chunk)
-
-                if chunk.chunk_type == b'IHDR':
-                    self._parse_IHDR(chunk)
-                    if self.ihdr_information.width >= MAX_WIDTH or self.ihdr_information.height >= MAX_HEIGHT:
-                        print("PNG файл слишком большой, попробуйте другой")
-                        exit(0)
-                elif chunk.chunk_type == b'IDAT':
+        self.file_buffer = None
+        self._hidden_view = memoryview(b'')
+        self._hidden_data = None
+        self.hidden_data_offset = None
+        self.hidden_data_length = 0
+
+    @property
+    def timings(self) -> dict:
+        return self.instrumentation.timings
+
+    def parse(self, source):
+        # source - путь, bytes/bytearray/memoryview или двоичный файловый объект
+        with self.instrumentation.stage('parse'):
+            try:
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    buffer = memoryview(source).cast('B')
+                    self._check_signature(bytes(buffer[:len(PNG_SIGNATURE)]))
+                    self._record_chunks(buffer)
+                    self._parse_chunks()
+                elif hasattr(source, 'read'):
+                    self._parse_file(source)
+                else:
+                    with open(source, 'rb') as file:
+                        self._parse_file(file)
+                        if self.chunk_index is not None:
+                            self.chunk_index.store(source, self, stat=os.fstat(file.fileno()))
+                self._handle_hidden_data()
+            except BaseException:
+                self._release_streaming_memory()
+                raise
+
+    def _parse_file(self, file):
+        self._check_signature(file.read(len(PNG_SIGNATURE)))
+        if self.metadata_only and file.seekable():
+            self._scan_chunk_headers(file)
+        else:
+            self._record_chunks(self._map_source(file))
+        self._parse_chunks()
+
+    @staticmethod
+    def _check_signature(signature: bytes):
+        if signature != PNG_SIGNATURE:
+            raise ValueError("Не PNG файл, попробуйте другой")
+        logger.debug("Сигнатура: %s", signature)
+
+    @staticmethod
+    def _map_source(file) -> memoryview:
+        if file.seekable() and file.tell() == len(PNG_SIGNATURE):
+            try:
+                return map_file(file)
+            except (OSError, ValueError):
+                # BytesIO, каналы и сокеты отобразить в память нельзя
+                pass
+        return memoryview(PNG_SIGNATURE + file.read())
+
+    def _parse_chunks(self):
+        if self._over_budget:
+            return
+        self._verify_crc()
+        for chunk in self.chunks:
+            logger.debug("%s", chunk)
+            self.instrumentation.count_chunk(chunk.chunk_type)
+
+            if chunk.chunk_type == b'IHDR':
+                self._parse_IHDR(chunk)
+            elif chunk.chunk_type == b'IDAT':
+                if not self.metadata_only:
                     self._parse_IDAT(chunk)
-                elif chunk.chunk_type == b'PLTE':
-                    self._parse_PLTE(chunk)
-                    print(f"Распарсили PLTE с {len(self.palette)} палитрой.\n")
-                elif chunk.chunk_type in [b'tEXt', b'iTXt', b'zTXt']:
-                    self._parse_text_chunk(chunk)
-                elif chunk.chunk_type == b'IEND':
-                    break
+            elif chunk.chunk_type == b'PLTE':
+                self._parse_PLTE(chunk)
+                logger.info("Распарсили PLTE с %d цветами.", len(self.palette))
+            elif chunk.chunk_type == b'tRNS':
+                self._parse_tRNS(chunk)
+            elif chunk.chunk_type in TEXT_CHUNK_TYPES:
+                self._parse_text_chunk(chunk)
+            elif chunk.chunk_type == b'IEND':
+                break
 
-            if self.hidden_data:
-                print("\nОбнаружены скрытые данные после IEND:")
-                if self._is_png(self.hidden_data):
-                    print("Скрытые данные содержат ещё один PNG файл. Начинаем обработку второго файла...")
+    def _handle_hidden_data(self):
+        if self.hidden_data_length and not self._hidden_view:
+            logger.info("Обнаружены скрытые данные после IEND: %d байт по смещению %d.",
+                        self.hidden_data_length, self.hidden_data_offset)
+        elif self._hidden_view:
+            logger.info("Обнаружены скрытые данные после IEND.")
+            if self._is_png(self._hidden_view):
+                logger.info("Скрытые данные содержат ещё один PNG файл.")
+                if self.process_hidden_files:
+                    logger.info("Начинаем обработку второго файла...")
                     self._process_hidden_file()
-                else:
-                    print(f"Скрытый текст: {self.hidden_data.decode('utf-8', errors='ignore')}")
+            else:
+                logger.info("Скрытый текст: %s", self.hidden_data.decode('utf-8', errors='ignore'))
 
     def decompress_data(self):
-        print("Начинаем декомпрессию IDAT данных...")
-        decompressed_data = zlib.decompress(self.compressed_data_idat)
-        print(f"Размер декомпрессионных данных: {len(decompressed_data)} байт")
+        if self._lookup_decode_cache():
+            return
+
+        with self.instrumentation.stage('decompress_data'):
+            if self.streaming:
+                # Резерв взят ещё при первом IDAT и держится, пока не готов итоговый буфер
+                try:
+                    self._finish_streaming()
+                    self._decode_pixels()
+                finally:
+                    self._release_streaming_memory()
+            else:
+                with self._reserve_memory():
+                    self._inflate()
+                    self._apply_filters()
+                    self._decode_pixels()
+        if self._cache_key is not None:
+            self.decode_cache.put(self._cache_key, self.pixels)
+
+    def _lookup_decode_cache(self) -> bool:
+        # В потоковом режиме вызывается до первого IDAT: при попадании поток вообще не распаковывается
+        if self.decode_cache is None or self._cache_key is not None or not hasattr(self, 'ihdr_information'):
+            return self._cache_hit
+        with self.instrumentation.stage('decode_cache') as record:
+            self._cache_key = self._decode_cache_key()
+            cached = self.decode_cache.get(self._cache_key)
+            record.bytes_out = len(cached.data) if cached is not None else 0
+        if cached is not None:
+            self.pixels = cached
+            self.mode = cached.mode
+            self._cache_hit = True
+        return self._cache_hit
+
+    def _decode_cache_key(self) -> str:
+        from decode_cache import decode_key
+
+        header = [chunk.data for chunk in self.chunks if chunk.chunk_type in (b'IHDR', b'PLTE', b'tRNS')]
+        options = bytes([self.downconvert_16bit, self.expand_palette])
+        if self.compressed_data_idat:
+            return decode_key(header + [options, self.compressed_data_idat])
+        return decode_key(header + [options] + [chunk.view for chunk in self._idat_chunks()])
+
+    def _inflate(self):
+        if not hasattr(self, 'ihdr_information'):
+            raise ValueError("Невалидный PNG файл (нет чанка IHDR)")
+        # Больше, чем следует из IHDR, не распаковываем: сжатый поток может разворачиваться в гигабайты
+        expected = sum((stride + 1) * rows for stride, rows in self._row_layout())
+        with self.instrumentation.stage('inflate') as record:
+            if self.compressed_data_idat:
+                sources = [self.compressed_data_idat]
+            else:
+                # IDAT не склеиваются: распаковываем прямо из отображённых в память чанков
+                sources = (chunk.view for chunk in self._idat_chunks())
+            inflater = zlib.decompressobj()
+            decompressed_data = bytearray()
+            for data in sources:
+                record.bytes_in += len(data)
+                decompressed_data += inflater.decompress(data, expected - len(decompressed_data))
+                if len(decompressed_data) == expected:
+                    if not inflater.eof and inflater.decompress(inflater.unconsumed_tail, 1):
+                        logger.warning("В IDAT данных больше, чем нужно изображению, лишнее пропускаем.")
+                    break
+            record.bytes_out = len(decompressed_data)
 
-        stride = self._get_stride()
         self.raw_image = []
 
         i = 0
-        for row in range(self.ihdr_information.height):
-            if i >= len(decompressed_data):
-                raise ValueError("Недостаточно данных изображения.")
-            filter_type = decompressed_data[i]  # Каждая строка начинается с байта фильтра
-            i += 1
-            scanline = decompressed_data[i:i + stride]
-            if len(scanline) != stride:
-                raise ValueError("Длина сканлайна не соответствует ожидаемому значению.")
-            i += stride
-            self.raw_image.append((filter_type, scanline))
-
-        print(f"Распарсили {len(self.raw_image)} scanlines.")
-
-        self._apply_filters()
-        self._decode_pixels()
-
-    def display_image(self):
+        for stride, rows in self._row_layout():
+            for row in range(rows):
+                if i >= len(decompressed_data):
+                    raise ValueError("Недостаточно данных изображения.")
+                filter_type = decompressed_data[i]  # Каждая строка начинается с байта фильтра
+                i += 1
+                scanline = decompressed_data[i:i + stride]
+                if len(scanline) != stride:
+                    raise ValueError("Длина сканлайна не соответствует ожидаемому значению.")
+                i += stride
+                self.raw_image.append((filter_type, scanline))
+
+    def iter_progressive(self):
+        if self.streaming or self.metadata_only:
+            raise ValueError("Прогрессивное декодирование недоступно в потоковом режиме и в режиме метаданных.")
+
+        with self._reserve_memory():
+            self._reset_filters()
+            stream = ScanlineStream(self._get_stride(), self.ihdr_information.height, self._row_layout())
+            last_pass = self._adam7.passes[-1].number if self._adam7 is not None else 1
+
+            for filter_type, scanline in self._iter_idat_rows(stream):
+                if self._apply_filter(filter_type, scanline) and self._adam7.completed_pass.number != last_pass:
+                    yield self._adam7.completed_pass.number, self._make_pixel_buffer(
+                        self._adam7.preview(), self._get_samples_per_pixel(),
+                        MODES_BY_COLOR_TYPE[self.ihdr_information.color_type]
+                    )
+
+            self._decode_pixels()
+        yield last_pass, self.pixels
+
+    def decode_reduced(self, factor: int) -> PixelBuffer:
+        # Каждый factor-й пиксель по обеим осям: полноразмерный буфер не собирается
+        if factor == 1:
+            self.decompress_data()
+            return self.pixels
+
+        if self._lookup_decode_cache():
+            # Полное изображение уже в кэше: уменьшаем его, ничего не распаковывая
+            self.pixels = self.pixels.subsample(factor)
+        elif self._is_interlaced():
+            if factor % 8 == 0:
+                # Adam7Decoder выделяет буфер под всё изображение даже ради первого прохода
+                with self._reserve_memory():
+                    self._decode_first_pass()
+            else:
+                self.decompress_data()
+            self.pixels = self.pixels.subsample(factor)
+        else:
+            bands = [band.subsample(factor, offset_y=-start % factor) for start, band in self.iter_bands()]
+            first = bands[0]
+            self.pixels = PixelBuffer(bytearray().join(band.data for band in bands), first.width,
+                                      sum(band.height for band in bands), first.channels, first.mode,
+                                      bit_depth=first.bit_depth)
+        self.mode = self.pixels.mode
+        return self.pixels
+
+    def _decode_first_pass(self):
+        # Первый проход Adam7 - это ровно каждый восьмой пиксель, остальные проходы не распаковываем
+        self._reset_filters()
+        stream = ScanlineStream(self._get_stride(), self.ihdr_information.height, self._row_layout())
+        for filter_type, scanline in self._iter_idat_rows(stream):
+            if self._apply_filter(filter_type, scanline):
+                break
+        self.pixels = self._make_pixel_buffer(self._adam7.samples, self._get_samples_per_pixel(),
+                                              MODES_BY_COLOR_TYPE[self.ihdr_information.color_type])
+
+    def iter_bands(self, band_rows: int = BAND_ROWS):
+        if self.streaming or self.metadata_only:
+            raise ValueError("Построчное декодирование недоступно в потоковом режиме и в режиме метаданных.")
+        if self._is_interlaced():
+            raise ValueError("Построчное декодирование не поддерживается для чересстрочных (Adam7) изображений.")
+
+        with self._reserve_memory(self._estimate_band_memory(band_rows)):
+            yield from self._decode_bands(band_rows)
+
+    def _decode_bands(self, band_rows: int):
+        stride = self._get_stride()
+        bpp = self._get_bytes_per_pixel()
+        stream = ScanlineStream(stride, self.ihdr_information.height)
+        previous = bytearray(stride)
+        band = bytearray()
+        band_start = 0
+        rows = 0
+
+        # В памяти только предыдущая строка для фильтров и текущая полоса
+        for filter_type, scanline in self._iter_idat_rows(stream):
+            self.instrumentation.count_filter(filter_type)
+            recon = self._unfilter_scanline(filter_type, scanline, previous, bpp)
+            if recon is None:
+                logger.warning("Неизвестный тип фильтра: %d", filter_type)
+                recon = bytearray(stride)
+            band += recon
+            previous = recon
+            rows += 1
+
+            if rows == band_rows:
+                yield band_start, self._make_band(band, rows)
+                band_start += rows
+                band = bytearray()
+                rows = 0
+
+        if rows:
+            yield band_start, self._make_band(band, rows)
+
+    def iter_rows(self, start: int = 0, stop: int = None, band_rows: int = BAND_ROWS):
+        stop = self.ihdr_information.height if stop is None else min(stop, self.ihdr_information.height)
+        if start >= stop:
+            return
+
+        for band_start, band in self.iter_bands(band_rows):
+            for y in range(max(start, band_start), min(stop, band_start + band.height)):
+                offset = (y - band_start) * band.stride
+                yield y, band.data[offset:offset + band.stride]
+            if band_start + band.height >= stop:
+                return
+
+    def _make_band(self, band: bytearray, rows: int) -> PixelBuffer:
+        channels = self._get_samples_per_pixel()
+        data = unpack_samples(band, self.ihdr_information.width, rows, channels, self.ihdr_information.bit_depth,
+                              scale=self.ihdr_information.color_type == ColorTypes.L)
+        return self._make_pixel_buffer(data, channels, MODES_BY_COLOR_TYPE[self.ihdr_information.color_type],
+                                       height=rows)
+
+    def _idat_chunks(self):
+        return (chunk for chunk in self.chunks if chunk.chunk_type == b'IDAT')
+
+    def _iter_idat_rows(self, stream: ScanlineStream):
+        for chunk in self._idat_chunks():
+            yield from stream.feed(chunk.view)
+        yield from stream.close()
+
+    def _estimate_decode_memory(self) -> int:
+        width = self.ihdr_information.width
+        height = self.ihdr_information.height
+        sample_size = 2 if self.ihdr_information.bit_depth == 16 else 1
+        pixels = width * height * self._get_samples_per_pixel() * sample_size
+        filtered = sum(stride * rows for stride, rows in self._row_layout())
+        if self.streaming:
+            return filtered + pixels
+        # Без потокового режима одновременно живут распакованный поток, его построчная копия и результат
+        inflated = sum((stride + 1) * rows for stride, rows in self._row_layout())
+        return 2 * inflated + filtered + pixels
+
+    def _estimate_band_memory(self, band_rows: int) -> int:
+        stride = self._get_stride()
+        sample_size = 2 if self.ihdr_information.bit_depth == 16 else 1
+        row_pixels = self.ihdr_information.width * self._get_samples_per_pixel() * sample_size
+        return 2 * stride + band_rows * (stride + row_pixels)
+
+    @contextmanager
+    def _reserve_memory(self, required: int = None):
+        # Бюджет одного разбора проверяется сразу, бюджет процесса держится до конца декодирования
+        if not hasattr(self, 'ihdr_information'):
+            yield
+            return
+        if required is None:
+            required = self._estimate_decode_memory()
+            self._check_memory_budget(required)
+        with self.memory_pool.reserve(required):
+            yield
+
+    def _check_memory_budget(self, required: int = None):
+        if self.memory_budget is None or not hasattr(self, 'ihdr_information'):
+            return
+        required = self._estimate_decode_memory() if required is None else required
+        if required > self.memory_budget:
+            raise ImageTooLargeError(required, self.memory_budget)
+
+    def _is_interlaced(self) -> bool:
+        return self.ihdr_information.interface_method == InterlaceMethods.Adam7
+
+    def _row_layout(self):
+        width = self.ihdr_information.width
+        height = self.ihdr_information.height
+        if self._is_interlaced():
+            bits_per_pixel = self._get_samples_per_pixel() * self.ihdr_information.bit_depth
+            return [(p.stride, p.height) for p in adam7_passes(width, height, bits_per_pixel) if not p.is_empty]
+        return [(self._get_stride(), height)]
+
+    def _start_streaming(self):
+        # Распаковка идёт прямо во время parse(), поэтому и пул процесса резервируется уже здесь
+        self._streaming_memory = ExitStack()
+        self._streaming_memory.enter_context(self._reserve_memory())
+        self._reset_filters()
+        self.scanline_stream = ScanlineStream(self._get_stride(), self.ihdr_information.height,
+                                              self._row_layout())
+
+    def _finish_streaming(self):
+        if self.scanline_stream is None:
+            self._start_streaming()
+        with self.instrumentation.stage('inflate') as record:
+            for filter_type, scanline in self.scanline_stream.close():
+                self._apply_filter(filter_type, scanline)
+            record.bytes_out = self.scanline_stream.rows_emitted * (self._get_stride() + 1)
+        self.scanline_stream = None
+
+    def _release_streaming_memory(self):
+        if self._streaming_memory is not None:
+            self._streaming_memory.close()
+            self._streaming_memory = None
+
+    def display_image(self, target_size=None):
+        img = self.to_image()
+        logger.info("Отображаем изображение: %dx%d, режим: %s", img.width, img.height, self.mode)
+
+        img = self._apply_post_processing(img, img.width, img.height, target_size)
+
+        img.show()
+
+    def save_image(self, output_path: str):
+        self.to_image().save(output_path, "PNG")
+
+    def to_image(self) -> Image:
         if not self.pixels:
             raise ValueError(
                 "Данные изображения не декодированы. Вызовите decompress_data() и decode_pixels() сначала."
             )
 
-        width = self.ihdr_information.width
-        height = self.ihdr_information.height
+        width = self.pixels.width
+        height = self.pixels.height
 
-        print(f"Отображаем изображение: {width}x{height}, режим: {self.mode}")
+        if self.pixels.bit_depth == 16 and self.mode == Modes.L:
+            return Image.frombuffer("I;16B", (width, height), self.pixels.data, "raw", "I;16B", 0, 1)
 
         if self.mode == Modes.RGB:
             img = self._create_image(height, width, Modes.RGB)
@@ -106,67 +477,147 @@ class Parser:
         else:
             raise NotImplementedError(f"Режим {self.mode} не поддерживается для отображения.")
 
-        img = self._apply_post_processing(img, width, height)
+        return img
 
-        img.show()
+    def _apply_post_processing(self, img: Image, width: int, height: int, target_size=None) -> Image:
+        pipeline = self.post_processing(target_size)
+        logger.debug("План постобработки %dx%d: %s", width, height, pipeline.plan(width, height))
+        return pipeline.apply(img)
+
+    def post_processing(self, target_size=None) -> "PostProcessing":
+        from post_processing import PostProcessing
 
-    def _apply_post_processing(self, img: Image, width: int, height: int) -> Image:
+        # Операции только записываются; порядок выбирается под итоговый размер при применении
+        pipeline = PostProcessing(target_size)
         if self.should_blur:
-            print("Обнаружено '18+' в метаданных. Применяем размытие.")
-            img = img.filter(ImageFilter.GaussianBlur(radius=15))
+            logger.info("Обнаружено '18+' в метаданных. Применяем размытие.")
+            pipeline.add_blur(BLUR_RADIUS)
 
         if self.should_bw:
-            print("Обнаружено '1950s vibe' в метаданных. Преобразуем изображение в черно-белый формат.")
-            img = self._apply_grayscale_with_transparency(img)
+            logger.info("Обнаружено '1950s vibe' в метаданных. Преобразуем изображение в черно-белый формат.")
+            pipeline.add_grayscale()
 
-        if width <= 50 or height <= 50:
-            img = self._rescale_if_smaller_50px(height, width, img)
-
-        return img
+        return pipeline.add_upscale(MIN_DISPLAY_SIDE, SCALE_FACTOR)
 
     def _create_image_with_alpha(self, height: int, width: int, mode: str) -> Image:
-        img = Image.new(mode, (width, height))
-        flat_pixels = [pixel for row in self.pixels for pixel in row]
-        img.putdata(flat_pixels)
-        return img
-
-    def _record_chunks(self, file):
-        while True:
-            length_bytes = file.read(4)
-            if len(length_bytes) < 4:
-                if len(length_bytes) == 0:
-                    print("Записали все чанки.")
-                else:
-                    print("У файла в конце чанк битый. Запись чанков может сработать неверно.")
-                break
+        return self._create_image(height, width, mode)
+
+    @property
+    def hidden_data(self) -> bytes:
+        if self._hidden_data is None:
+            self._hidden_data = bytes(self._hidden_view)
+        return self._hidden_data
+
+    def _record_chunks(self, buffer: memoryview):
+        with self.instrumentation.stage('record_chunks') as record:
+            self.file_buffer = buffer
+            reader = ChunkReader(self.file_buffer)
+            record.bytes_in = len(self.file_buffer)
+            self._read_chunks(reader)
+            record.bytes_out = len(self.chunks)
+
+    def _read_chunks(self, reader: ChunkReader):
+        # Вложенный PNG дальше остатка бюджета не читаем: ни CRC, ни разбор чанков для него не запускаются
+        limit = self.hidden_bytes_budget if self._depth else None
+        for chunk in reader:
+            if limit is not None and reader.position > limit:
+                self._over_budget = True
+                return
+            self.chunks.append(chunk)
+
+            if chunk.chunk_type == b'IEND':
+                self._hidden_view = reader.remaining()
+                self._hidden_data = None
+                self.hidden_data_offset = reader.position
+                self.hidden_data_length = len(self._hidden_view)
+                return
+
+        if reader.truncated:
+            logger.warning("У файла в конце чанк битый. Запись чанков может сработать неверно.")
+
+    def _scan_chunk_headers(self, file):
+        with self.instrumentation.stage('scan_chunk_headers') as record:
+            self._scan_chunks(file)
+            record.bytes_out = len(self.chunks)
+
+    def _scan_chunks(self, file):
+        scanner = ChunkHeaderScanner(file, self.metadata_chunk_types)
+        remaining_types = set(self.metadata_chunk_types)
+
+        for chunk in scanner:
+            self.chunks.append(chunk)
+            remaining_types.discard(chunk.chunk_type)
+
+            if chunk.chunk_type == b'IEND':
+                self.hidden_data_offset = scanner.position
+                self.hidden_data_length = max(file.seek(0, os.SEEK_END) - scanner.position, 0)
+                if self.read_hidden_data and self.hidden_data_length:
+                    file.seek(scanner.position)
+                    self._hidden_view = memoryview(file.read())
+                    self._hidden_data = None
+                return
+
+            if not remaining_types:
+                logger.debug("Все запрошенные чанки найдены, дальше файл не читаем.")
+                return
+
+        if scanner.truncated:
+            logger.warning("У файла в конце чанк битый. Запись чанков может сработать неверно.")
+
+    def _verify_crc(self):
+        if self.crc_policy == CrcPolicies.Skip:
+            return
 
-            length = int.from_bytes(length_bytes, 'big')
-            chunk_type = file.read(4)
-            data = file.read(length)
-            crc = file.read(4)
-            self.chunks.append(Chunk(length, chunk_type, data, crc))
+        with self.instrumentation.stage('crc') as record:
+            record.bytes_in = sum(len(chunk.view) for chunk in self.chunks if chunk.view is not None)
+            self.corrupted_chunks = find_corrupted_chunks(self.chunks, self.crc_executor)
 
-            if chunk_type == b'IEND':
-                print("Обнаружен блок IEND. Проверяем на наличие скрытых данных...")
-                self.hidden_data = file.read()
-                break
+        for chunk in self.corrupted_chunks:
+            if self.crc_policy == CrcPolicies.Strict:
+                raise CrcMismatchError(chunk.chunk_type, chunk.offset)
+            logger.warning("Неверный CRC у чанка %s по смещению %d.", chunk.chunk_type, chunk.offset)
 
     @staticmethod
-    def _is_png(data: bytes) -> bool:
-        return data.startswith(b'\x89PNG\r\n\x1a\n')
+    def _is_png(data) -> bool:
+        return bytes(data[:len(PNG_SIGNATURE)]) == PNG_SIGNATURE
 
     def _process_hidden_file(self):
-        num = random.randint(1, 1_000_000)
-        with open(f"hidden_data/hidden_file{num}.png", "wb") as hidden_file:
-            hidden_file.write(self.hidden_data)
+        if self._depth >= self.max_hidden_depth:
+            logger.warning("Достигнута максимальная глубина вложенности PNG (%d), дальше не разбираем.",
+                           self.max_hidden_depth)
+            return
+        budget = self._hidden_budget_left()
+        if budget <= 0:
+            logger.warning("Исчерпан бюджет байт на вложенные PNG, дальше не разбираем.")
+            return
 
-        hidden_parser = Parser()
-        hidden_parser.parse(f"hidden_data/hidden_file{num}.png")
+        # Вложенный PNG разбираем прямо из среза буфера, без временных файлов
+        hidden_parser = Parser(filter_engine=self.filter_engine, crc_policy=self.crc_policy,
+                               instrumentation=Instrumentation(self.instrumentation.hooks),
+                               memory_budget=self.memory_budget, max_hidden_depth=self.max_hidden_depth,
+                               hidden_bytes_budget=budget, text_rules=self.text_rules,
+                               memory_pool=self.memory_pool)
+        hidden_parser._depth = self._depth + 1
+        hidden_parser.parse(self._hidden_view)
+        if hidden_parser._over_budget:
+            logger.warning("Вложенный PNG больше оставшегося бюджета (%d байт), пропускаем.", budget)
+            return
+
+        self.hidden_parser = hidden_parser
         hidden_parser.decompress_data()
         hidden_parser.display_image()
 
+    def _hidden_budget_left(self) -> int:
+        # Верхний уровень бюджет не тратит, вложенный PNG расходует его на собственный размер
+        if not self._depth:
+            return self.hidden_bytes_budget
+        size = self.hidden_data_offset if self.hidden_data_offset is not None else len(self.file_buffer)
+        return self.hidden_bytes_budget - size
+
     def _parse_IHDR(self, chunk: Chunk):
         data = chunk.data
+        if len(data) != 13:
+            raise ValueError(f"Невалидный PNG файл (длина IHDR {len(data)} байт вместо 13)")
         self.ihdr_information = IHDRInformation(
             width=int.from_bytes(data[0:4], 'big'),
             height=int.from_bytes(data[4:8], 'big'),
@@ -176,139 +627,246 @@ class Parser:
             filter_method=data[11],
             interface_method=data[12]
         )
-        print(f"Parsed IHDR: {self.ihdr_information}\n")
+        if not 0 < self.ihdr_information.width <= MAX_PNG_DIMENSION or \
+                not 0 < self.ihdr_information.height <= MAX_PNG_DIMENSION:
+            raise ValueError(f"Недопустимый размер изображения: "
+                             f"{self.ihdr_information.width}x{self.ihdr_information.height}")
+        allowed_bit_depths = ALLOWED_BIT_DEPTHS_BY_COLOR_TYPE.get(self.ihdr_information.color_type)
+        if allowed_bit_depths is None:
+            raise ValueError(f"Неподдерживаемый цветовой тип: {self.ihdr_information.color_type}")
+        if self.ihdr_information.bit_depth not in allowed_bit_depths:
+            raise ValueError(f"Недопустимая глубина цвета {self.ihdr_information.bit_depth} "
+                             f"для цветового типа {self.ihdr_information.color_type}")
+        if self.ihdr_information.interface_method not in (InterlaceMethods.None_, InterlaceMethods.Adam7):
+            raise ValueError(f"Неизвестный метод чересстрочной развёртки: {self.ihdr_information.interface_method}")
+        logger.info("Parsed IHDR: %s", self.ihdr_information)
 
     def _parse_IDAT(self, chunk: Chunk):
-        self.compressed_data_idat += chunk.data
-        print(f"Накопили IDAT информацию: {len(self.compressed_data_idat)} байт.\n")
+        with self.instrumentation.stage('parse_IDAT', len(chunk.view)):
+            if self.streaming:
+                if self._lookup_decode_cache():
+                    return
+                if self.scanline_stream is None:
+                    self._start_streaming()
+                for filter_type, scanline in self.scanline_stream.feed(chunk.view):
+                    self._apply_filter(filter_type, scanline)
 
     def _parse_PLTE(self, chunk: Chunk):
+        self._require_ihdr(chunk)
         if self.ihdr_information.color_type != 3:
-            print("PLTE чанк найден, но цветовой тип не 3 (Indexed-color). Игнорируем.")
+            logger.info("PLTE чанк найден, но цветовой тип не 3 (Indexed-color). Игнорируем.")
             return
 
         if chunk.length % 3 != 0:
             raise ValueError("Невалидный PNG файл (длина PLTE информации не кратна трем)")
 
-        data = chunk.data
-        self.palette = []
-
-        for i in range(0, len(data), 3):
-            self.palette.append(PLTEInformation(i // 3, data[i], data[i + 1], data[i + 2]))
+        self.palette = Palette(chunk.data)
 
-    def _parse_text_chunk(self, chunk: Chunk):
-        data = ''
-        try:
-            data = chunk.data.decode('utf-8')
-        except UnicodeDecodeError:
-            print("Ошибка декодирования текстового чанка.")
-        except ValueError:
-            print("Ошибка разбора текстового чанка.")
-
-        keyword, text = data.split('\x00', 1)
-        print(f"{keyword}: {text}\n")
+    def _parse_tRNS(self, chunk: Chunk):
+        self._require_ihdr(chunk)
+        if self.ihdr_information.color_type != ColorTypes.P:
+            logger.info("tRNS поддерживается только для Indexed-color изображений. Игнорируем.")
+            return
+        if not self.palette:
+            raise ValueError("Невалидный PNG файл (tRNS встретился раньше PLTE)")
+        self.palette.set_alpha(chunk.data)
 
-        if "18+" in text:
-            self.should_blur = True
+    def _require_ihdr(self, chunk: Chunk):
+        if not hasattr(self, 'ihdr_information'):
+            raise ValueError(f"Невалидный PNG файл ({chunk.chunk_type.decode()} встретился раньше IHDR)")
 
-        if "1950s vibe" in text:
-            self.should_bw = True
+    def _parse_text_chunk(self, chunk: Chunk):
+        # В индекс попадает только ключевое слово; текст распаковывается, когда его просят правила или вызывающий
+        entry = self.text_index.add(chunk)
+        logger.info("Текстовый чанк %s: %s", entry.chunk_type.decode(), entry.keyword)
+
+    @property
+    def should_blur(self) -> bool:
+        self._apply_text_rules()
+        return self._should_blur
+
+    @should_blur.setter
+    def should_blur(self, value: bool):
+        self._should_blur = value
+
+    @property
+    def should_bw(self) -> bool:
+        self._apply_text_rules()
+        return self._should_bw
+
+    @should_bw.setter
+    def should_bw(self, value: bool):
+        self._should_bw = value
+
+    @property
+    def text_actions(self) -> set:
+        self._apply_text_rules()
+        return self._text_actions
+
+    def _apply_text_rules(self):
+        # Правила прогоняются при первом обращении к флагам и только по ещё не проверенным чанкам
+        entries = self.text_index.entries[self._matched_entries:]
+        if not entries or not self.text_rules:
+            return
+        self._matched_entries += len(entries)
+        actions = self.text_rules.match('\x00'.join(entry.text for entry in entries))
+        self._text_actions |= actions
+        if TextActions.Blur in actions:
+            self._should_blur = True
+        if TextActions.Grayscale in actions:
+            self._should_bw = True
+
+    def _get_samples_per_pixel(self):
+        color_type = self.ihdr_information.color_type
+        if color_type not in SAMPLES_ON_PIXEL_BY_COLOR_TYPE:
+            raise ValueError(f"Неподдерживаемый цветовой тип: {color_type}")
+        return SAMPLES_ON_PIXEL_BY_COLOR_TYPE[color_type]
 
     def _get_bytes_per_pixel(self):
-        color_type = self.ihdr_information.color_type
-        bytes_per_pixel = BYTES_ON_PIXEL_BY_COLOR_TYPE.get(color_type,
-                                                           ValueError(f"Неподдерживаемый цветой тип: {color_type}"))
-        return bytes_per_pixel
+        # Для глубины меньше 8 бит фильтры работают с шагом в один байт
+        bits_per_pixel = self._get_samples_per_pixel() * self.ihdr_information.bit_depth
+        return max(1, bits_per_pixel // 8)
 
     def _get_stride(self):
-        return self.ihdr_information.width * self._get_bytes_per_pixel()
+        bits_per_pixel = self._get_samples_per_pixel() * self.ihdr_information.bit_depth
+        return (self.ihdr_information.width * bits_per_pixel + 7) // 8
 
     def _apply_filters(self):
-        print("Применяем фильтры для восстановления пиксельных данных...")
-        self.image_data = []
-        previous_scanline = bytearray([0] * self._get_stride())
-
-        for idx, (filter_type, scanline) in enumerate(self.raw_image):
-            if filter_type == FilterTypes.None_:
-                recon = bytearray(scanline)
-            elif filter_type == FilterTypes.Sub:
-                recon = self._filter_sub(scanline, self._get_bytes_per_pixel())
-            elif filter_type == FilterTypes.Up:
-                recon = self._filter_up(scanline, previous_scanline)
-            elif filter_type == FilterTypes.Average:
-                recon = self._filter_average(scanline, previous_scanline, self._get_bytes_per_pixel())
-            elif filter_type == FilterTypes.Paeth:
-                recon = self._filter_paeth(scanline, previous_scanline, self._get_bytes_per_pixel())
-            else:
-                print(f"Неизвестный тип фильтра: {filter_type}")
-                continue
-
-            self.image_data.append(recon)
-            previous_scanline = recon
-
-            if (idx + 1) % 100 == 0 or (idx + 1) == len(self.raw_image):
-                print(f"Обработано {idx + 1}/{len(self.raw_image)} строк.")
+        with self.instrumentation.stage('apply_filters') as record:
+            self._reset_filters()
+
+            for filter_type, scanline in self.raw_image:
+                self._apply_filter(filter_type, scanline)
+
+            record.bytes_in = sum(len(scanline) + 1 for _, scanline in self.raw_image)
+            record.bytes_out = len(self.image_data)
+
+    def _reset_filters(self):
+        self._filtered_rows = 0
+        if self._is_interlaced():
+            # Для Adam7 image_data сразу содержит распакованные отсчёты итогового изображения
+            self._adam7 = Adam7Decoder(
+                self.ihdr_information.width, self.ihdr_information.height, self._get_samples_per_pixel(),
+                self.ihdr_information.bit_depth, self.ihdr_information.color_type == ColorTypes.L,
+                self._get_bytes_per_pixel(), self._unfilter_scanline
+            )
+            self.image_data = self._adam7.samples
+            return
 
-        print("Все фильтры успешно применены.")
+        self._adam7 = None
+        stride = self._get_stride()
+        self.image_data = bytearray(stride * self.ihdr_information.height)
+        self._previous_scanline = bytearray(stride)
+
+    def _apply_filter(self, filter_type, scanline) -> bool:
+        self._filtered_rows += 1
+        self.instrumentation.count_filter(filter_type)
+        if filter_type > FilterTypes.Paeth:
+            logger.warning("Неизвестный тип фильтра: %d", filter_type)
+
+        if self._adam7 is not None:
+            return self._adam7.push_row(filter_type, scanline)
+
+        recon = self._unfilter_scanline(filter_type, scanline, self._previous_scanline,
+                                        self._get_bytes_per_pixel())
+        if recon is not None:
+            stride = len(recon)
+            offset = (self._filtered_rows - 1) * stride
+            self.image_data[offset:offset + stride] = recon
+            self._previous_scanline = recon
+        return False
+
+    def _unfilter_scanline(self, filter_type, scanline, previous, bpp):
+        if self.filter_engine == FilterEngines.NumPy:
+            engine = numpy_filters
+            filter_sub, filter_up = engine.filter_sub, engine.filter_up
+            filter_average, filter_paeth = engine.filter_average, engine.filter_paeth
+        else:
+            filter_sub, filter_up = self._filter_sub, self._filter_up
+            filter_average, filter_paeth = self._filter_average, self._filter_paeth
+
+        if filter_type == FilterTypes.None_:
+            return bytearray(scanline)
+        elif filter_type == FilterTypes.Sub:
+            return filter_sub(scanline, bpp)
+        elif filter_type == FilterTypes.Up:
+            return filter_up(scanline, previous)
+        elif filter_type == FilterTypes.Average:
+            return filter_average(scanline, previous, bpp)
+        elif filter_type == FilterTypes.Paeth:
+            return filter_paeth(scanline, previous, bpp)
+        return None
 
     def _decode_pixels(self):
-        print("Декодируем пиксели из восстановленных данных...")
+        with self.instrumentation.stage('decode_pixels', len(self.image_data)) as record:
+            self._decode_pixels_by_color_type()
+            record.bytes_out = len(self.pixels.data)
+
+    def _decode_pixels_by_color_type(self):
         color_type = self.ihdr_information.color_type
 
         if color_type == ColorTypes.L:
             self.mode = Modes.L
-            self.pixels = self._decode_simple_pixels()
-            print("Декодировано изображение Grayscale (L).")
+            self.pixels = self._decode_grouped_pixels(1)
+            logger.debug("Декодировано изображение Grayscale (L).")
 
         elif color_type == ColorTypes.RGB:
             self.mode = Modes.RGB
             self.pixels = self._decode_grouped_pixels(3)
-            print("Декодировано изображение Truecolor (RGB).")
+            logger.debug("Декодировано изображение Truecolor (RGB).")
 
         elif color_type == ColorTypes.P:
             self.mode = Modes.Palette
             if not self.palette:
                 raise ValueError("PLTE chunk отсутствует для Indexed-color изображения.")
-            self.pixels = self._decode_simple_pixels()
-            print("Декодировано изображение Indexed-color (P).")
+            self.pixels = self._decode_grouped_pixels(1)
+            self.mode = self.pixels.mode
+            logger.debug("Декодировано изображение Indexed-color (P).")
 
         elif color_type == ColorTypes.LA:
             self.mode = Modes.LA
             self.pixels = self._decode_grouped_pixels(2)
-            print("Декодировано изображение Grayscale with alpha (LA).")
+            logger.debug("Декодировано изображение Grayscale with alpha (LA).")
 
         elif color_type == ColorTypes.RGBA:
             self.mode = Modes.RGBA
             self.pixels = self._decode_grouped_pixels(4)
-            print("Декодировано изображение Truecolor с альфа-каналом (RGBA).")
+            logger.debug("Декодировано изображение Truecolor с альфа-каналом (RGBA).")
         else:
             raise NotImplementedError(f"Декодирование для цветового типа {color_type} не реализовано.")
 
-    def _decode_simple_pixels(self):
-        return [list(row) for row in self.image_data]
-
     def _decode_grouped_pixels(self, group_size):
-        return [
-            [tuple(row[i:i + group_size]) for i in range(0, len(row), group_size)]
-            for row in self.image_data
-        ]
+        if self._adam7 is not None:
+            data = self.image_data
+        else:
+            scale = self.ihdr_information.color_type == ColorTypes.L
+            data = unpack_samples(self.image_data, self.ihdr_information.width, self.ihdr_information.height,
+                                  group_size, self.ihdr_information.bit_depth, scale=scale)
+        return self._make_pixel_buffer(data, group_size, self.mode)
+
+    def _make_pixel_buffer(self, data, group_size, mode, height: int = None):
+        width = self.ihdr_information.width
+        height = self.ihdr_information.height if height is None else height
+        bit_depth = self.ihdr_information.bit_depth
+        if mode == Modes.Palette and self.expand_palette:
+            # Индексы сразу раскрываются в цвета одной выборкой по таблице
+            data = self.palette.expand(data)
+            group_size, mode = (4, Modes.RGBA) if self.palette.has_alpha else (3, Modes.RGB)
+        if bit_depth == 16 and self.downconvert_16bit:
+            return PixelBuffer(downconvert_16bit(data), width, height, group_size, mode)
+        return PixelBuffer(data, width, height, group_size, mode, bit_depth=max(bit_depth, 8))
 
     def _create_palette_image(self, height, width):
-        img = Image.new("P", (width, height))
-        flat_palette = []
-        for entry in self.palette:
-            flat_palette.extend([entry.R, entry.G, entry.B])
-        flat_palette += [0] * (768 - len(flat_palette))
-        img.putpalette(flat_palette)
-        flat_pixels = [pixel for row in self.pixels for pixel in row]
-        img.putdata(flat_pixels)
+        if self.palette.has_alpha:
+            # Прозрачность из tRNS сохраняется, только если раскрыть палитру в RGBA
+            data = self.palette.expand(self.pixels.data)
+            return Image.frombuffer(Modes.RGBA, (width, height), data, "raw", Modes.RGBA, 0, 1)
+        img = self._create_image(height, width, Modes.Palette)
+        img.putpalette(self.palette.padded_rgb())
         return img
 
     def _create_image(self, height, width, mode):
-        img = Image.new(mode, (width, height))
-        flat_pixels = [pixel for row in self.pixels for pixel in row]
-        img.putdata(flat_pixels)
-        return img
+        return Image.frombuffer(mode, (width, height), self.pixels.to_8bit().data, "raw", mode, 0, 1)
 
     @staticmethod
     def _filter_sub(scanline, bpp):
@@ -356,17 +914,9 @@ class Parser:
     @staticmethod
     def _rescale_if_smaller_50px(height, width, img):
         return img.resize((width * SCALE_FACTOR, height * SCALE_FACTOR),
-                          Image.Resampling.NEAREST) if height < 50 or width < 50 else img
+                          Image.Resampling.NEAREST) if height < MIN_DISPLAY_SIDE or width < MIN_DISPLAY_SIDE else img
 
     @staticmethod
     def _apply_grayscale_with_transparency(image: Image) -> Image:
-        if image.mode != "RGBA":
-            raise ValueError(
-                "Для сохранения прозрачности изображение должно быть в режиме RGBA.")
-
-        r, g, b, a = image.split()
-
-        grayscale = Image.merge("RGB", (r, g, b)).convert("L")
-        result = Image.merge("RGBA", (grayscale, grayscale, grayscale, a))
-
-        return result
+        from post_processing import grayscale_with_transparency
+        return grayscale_with_transparency(image)
@@ -0,0 +1,94 @@
+from samples import downconvert_16bit
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+
+class PixelBuffer:
+    def __init__(self, data, width: int, height: int, channels: int, mode: str, bit_depth: int = 8):
+        self.sample_size = 2 if bit_depth == 16 else 1
+        if len(data) != width * height * channels * self.sample_size:
+            raise ValueError("Размер буфера пикселей не соответствует размеру изображения.")
+        self.data = data
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.mode = mode
+        self.bit_depth = bit_depth
+
+    @property
+    def stride(self) -> int:
+        return self.width * self.channels * self.sample_size
+
+    @property
+    def shape(self) -> tuple:
+        if self.channels == 1:
+            return self.height, self.width
+        return self.height, self.width, self.channels
+
+    def row(self, y: int) -> list:
+        if not 0 <= y < self.height:
+            raise IndexError("Номер строки вне изображения.")
+        start = y * self.stride
+        row = self.data[start:start + self.stride]
+        if self.sample_size == 2:
+            row = [int.from_bytes(row[i:i + 2], 'big') for i in range(0, len(row), 2)]
+        if self.channels == 1:
+            return list(row)
+        return [tuple(row[i:i + self.channels]) for i in range(0, len(row), self.channels)]
+
+    def to_numpy(self):
+        import numpy as np
+        dtype = np.dtype('>u2') if self.sample_size == 2 else np.uint8
+        return np.frombuffer(self.data, dtype=dtype).reshape(self.shape)
+
+    def to_8bit(self) -> "PixelBuffer":
+        if self.bit_depth != 16:
+            return self
+        return PixelBuffer(downconvert_16bit(self.data), self.width, self.height, self.channels, self.mode)
+
+    def subsample(self, step: int, offset_y: int = 0) -> "PixelBuffer":
+        pixel_size = self.channels * self.sample_size
+        width = len(range(0, self.width, step))
+        height = len(range(offset_y, self.height, step))
+        if np is not None:
+            image = np.frombuffer(self.data, dtype=np.uint8).reshape(self.height, self.width, pixel_size)
+            data = bytearray(image[offset_y::step, ::step].tobytes())
+        else:
+            data = bytearray(width * height * pixel_size)
+            row_size = width * pixel_size
+            for index, y in enumerate(range(offset_y, self.height, step)):
+                row = self.data[y * self.stride:(y + 1) * self.stride]
+                target = index * row_size
+                for byte in range(pixel_size):
+                    data[target + byte:target + row_size:pixel_size] = row[byte::step * pixel_size]
+        return PixelBuffer(data, width, height, self.channels, self.mode, self.bit_depth)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(y) for y in range(*index.indices(self.height))]
+        if index < 0:
+            index += self.height
+        return self.row(index)
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield self.row(y)
+
+    def __len__(self):
+        return self.height
+
+    def __bool__(self):
+        return len(self.data) > 0
+
+    def __eq__(self, other):
+        if isinstance(other, PixelBuffer):
+            return (self.shape == other.shape and self.mode == other.mode
+                    and self.bit_depth == other.bit_depth and self.data == other.data)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return (f"PixelBuffer({self.width}x{self.height}, mode={self.mode}, channels={self.channels}, "
+                f"bit_depth={self.bit_depth})")
@@ -1,6 +1,82 @@
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+PALETTE_SIZE = 256
+
+
 class PLTEInformation:
     def __init__(self, index: int, R: int, G: int, B: int):
         self.index = index
         self.R = R
         self.G = G
-        self.B = B
\ No newline at end of file
+        self.B = B
+
+
+class Palette:
+    def __init__(self, rgb: bytes = b'', alpha: bytes = b''):
+        # Вся палитра - один буфер RGB по 3 байта на цвет и необязательная альфа из tRNS
+        self.rgb = bytes(rgb)
+        self.alpha = bytes(alpha)
+        self._luts = {}
+
+    @property
+    def has_alpha(self) -> bool:
+        return bool(self.alpha)
+
+    def set_alpha(self, alpha: bytes):
+        self.alpha = bytes(alpha[:len(self)])
+        self._luts.clear()
+
+    def padded_rgb(self) -> bytes:
+        return self.rgb + bytes(3 * PALETTE_SIZE - len(self.rgb))
+
+    def lut(self, with_alpha: bool) -> bytes:
+        # Таблица на все 256 индексов: несуществующие цвета чёрные и непрозрачные
+        if with_alpha not in self._luts:
+            rgb = self.padded_rgb()
+            if not with_alpha:
+                self._luts[with_alpha] = rgb
+            else:
+                alpha = self.alpha + b'\xff' * (PALETTE_SIZE - len(self.alpha))
+                lut = bytearray(4 * PALETTE_SIZE)
+                for channel in range(3):
+                    lut[channel::4] = rgb[channel::3]
+                lut[3::4] = alpha
+                self._luts[with_alpha] = bytes(lut)
+        return self._luts[with_alpha]
+
+    def expand(self, indexes, with_alpha: bool = None) -> bytearray:
+        with_alpha = self.has_alpha if with_alpha is None else with_alpha
+        channels = 4 if with_alpha else 3
+        lut = self.lut(with_alpha)
+        if np is not None:
+            table = np.frombuffer(lut, dtype=np.uint8).reshape(PALETTE_SIZE, channels)
+            return bytearray(np.take(table, np.frombuffer(indexes, dtype=np.uint8), axis=0).tobytes())
+
+        # Без NumPy: один translate на канал и запись со страйдом
+        indexes = bytes(indexes)
+        expanded = bytearray(len(indexes) * channels)
+        for channel in range(channels):
+            expanded[channel::channels] = indexes.translate(lut[channel::channels])
+        return expanded
+
+    def __len__(self):
+        return len(self.rgb) // 3
+
+    def __bool__(self):
+        return bool(self.rgb)
+
+    def __getitem__(self, index: int) -> PLTEInformation:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Индекс вне палитры.")
+        return PLTEInformation(index, *self.rgb[3 * index:3 * index + 3])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"Palette({len(self)} colors, alpha={len(self.alpha)})"
@@ -0,0 +1,101 @@
+from typing import List, Optional, Tuple
+from PIL import Image, ImageFilter
+from constants import Modes
+
+SIXTEEN_BIT_MODES = ("I;16", "I;16B", "I;16L", "I")
+
+
+def grayscale_with_transparency(image: Image) -> Image:
+    if image.mode != "RGBA":
+        raise ValueError(
+            "Для сохранения прозрачности изображение должно быть в режиме RGBA.")
+
+    r, g, b, a = image.split()
+
+    grayscale = Image.merge("RGB", (r, g, b)).convert("L")
+    return Image.merge("RGBA", (grayscale, grayscale, grayscale, a))
+
+
+def to_8bit(image: Image) -> Image:
+    # 16-битный серый: GaussianBlur и LANCZOS с ним не работают, а convert("L") обрезает значения выше 255
+    return image.convert("I").point(lambda value: value * (1 / 256)).convert(Modes.L)
+
+
+def to_grayscale(image: Image) -> Image:
+    if image.mode == Modes.RGBA:
+        return grayscale_with_transparency(image)
+    if image.mode in (Modes.L, Modes.LA):
+        return image
+    return image.convert(Modes.L)
+
+
+class PostProcessing:
+    def __init__(self, target_size: Optional[Tuple[int, int]] = None):
+        # target_size - рамка, в которую итог будет показан; мельче неё считать не нужно
+        self.target_size = target_size
+        self.blur_radius = None
+        self.grayscale = False
+        self.upscale_below = None
+        self.upscale_factor = 1
+
+    def add_blur(self, radius: float) -> "PostProcessing":
+        self.blur_radius = radius
+        return self
+
+    def add_grayscale(self) -> "PostProcessing":
+        self.grayscale = True
+        return self
+
+    def add_upscale(self, below: int, factor: int) -> "PostProcessing":
+        self.upscale_below = below
+        self.upscale_factor = factor
+        return self
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        if self.upscale_below is not None and (width < self.upscale_below or height < self.upscale_below):
+            width, height = width * self.upscale_factor, height * self.upscale_factor
+        if self.target_size is not None:
+            scale = min(self.target_size[0] / width, self.target_size[1] / height)
+            if scale < 1:
+                width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        return width, height
+
+    def plan(self, width: int, height: int) -> List[tuple]:
+        size = self.output_size(width, height)
+        scale = size[0] / width
+        steps = []
+        if scale < 1:
+            # Уменьшаем сначала: размытие с пропорционально меньшим радиусом и серый цвет на маленьком кадре
+            steps.append(("resize", size, Image.Resampling.LANCZOS))
+            if self.blur_radius:
+                steps.append(("blur", self.blur_radius * scale))
+            if self.grayscale:
+                steps.append(("grayscale",))
+            return steps
+
+        # Увеличение ближайшим соседом ничего не добавляет, поэтому всё дорогое делаем до него
+        if self.blur_radius:
+            steps.append(("blur", self.blur_radius))
+        if self.grayscale:
+            steps.append(("grayscale",))
+        if size != (width, height):
+            steps.append(("resize", size, Image.Resampling.NEAREST))
+        return steps
+
+    def apply(self, image: Image) -> Image:
+        steps = self.plan(image.width, image.height)
+        if image.mode in SIXTEEN_BIT_MODES and any(step[0] != "resize" for step in steps):
+            image = to_8bit(image)
+        if image.mode == Modes.Palette and any(step[0] != "resize" or step[2] != Image.Resampling.NEAREST
+                                               for step in steps):
+            # Размытие и сглаживающее уменьшение работают только с настоящими цветами
+            image = image.convert(Modes.RGBA if "transparency" in image.info else Modes.RGB)
+
+        for step in steps:
+            if step[0] == "resize":
+                image = image.resize(step[1], step[2])
+            elif step[0] == "blur":
+                image = image.filter(ImageFilter.GaussianBlur(radius=step[1]))
+            else:
+                image = to_grayscale(image)
+        return image
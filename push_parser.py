@@ -0,0 +1,242 @@
+import sys
+import zlib
+from typing import List, Tuple
+from chunk import Chunk
+from chunk_reader import CHUNK_HEADER, CRC_SIZE, PNG_SIGNATURE
+from constants import TEXT_CHUNK_LIMIT, TEXT_CHUNK_TYPES, ColorTypes, CrcPolicies, FilterEngines, PushEvents
+from errors import CrcMismatchError
+from instrumentation import Instrumentation, logger
+from parser import Parser
+from samples import unpack_samples
+from scanline_stream import ScanlineStream
+
+READ_SIZE = 64 << 10
+
+# Копятся только чанки, которые разбирает парсер; остальные идут лишь через CRC
+PAYLOAD_LIMITS = {b'IHDR': 13, b'PLTE': 256 * 3, b'tRNS': 256,
+                  **{chunk_type: TEXT_CHUNK_LIMIT for chunk_type in TEXT_CHUNK_TYPES}}
+
+# Состояния разбора: что ожидается следующим во входном потоке
+_SIGNATURE, _HEADER, _PAYLOAD, _CRC, _TRAILER = range(5)
+
+
+class PushParser:
+    def __init__(self, filter_engine: str = FilterEngines.Python, crc_policy: str = CrcPolicies.Warn,
+                 instrumentation: Instrumentation = None):
+        # Разбор IHDR/PLTE/текста и фильтры берём у обычного парсера, файл ему не нужен
+        self._parser = Parser(filter_engine=filter_engine, crc_policy=crc_policy, instrumentation=instrumentation,
+                              process_hidden_files=False)
+        self.crc_policy = CrcPolicies(crc_policy)
+        self.position = 0
+        self.finished = False
+        self.hidden_data_length = 0
+        self._state = _SIGNATURE
+        self._buffer = bytearray()
+        self._chunk_type = None
+        self._chunk_length = 0
+        self._chunk_offset = 0
+        self._remaining = 0
+        self._payload = None
+        self._crc = 0
+        self._stream = None
+        self._previous = None
+        self._row = 0
+
+    @property
+    def ihdr_information(self):
+        return self._parser.ihdr_information
+
+    @property
+    def palette(self):
+        return self._parser.palette
+
+    @property
+    def chunks(self) -> List[Chunk]:
+        return self._parser.chunks
+
+    def feed(self, data) -> List[Tuple[str, object]]:
+        events = []
+        view = memoryview(data).cast('B')
+        while view:
+            if self._state == _TRAILER:
+                events.append((PushEvents.HiddenData, bytes(view)))
+                self.hidden_data_length += len(view)
+                self.position += len(view)
+                break
+
+            if self._state == _PAYLOAD:
+                piece = view[:self._remaining]
+                self._consume_payload(piece, events)
+                view = view[len(piece):]
+                self._remaining -= len(piece)
+                self.position += len(piece)
+                if not self._remaining:
+                    self._state = _CRC
+                continue
+
+            # Сигнатура, заголовок чанка и CRC короткие: их можно накопить целиком
+            needed = self._needed() - len(self._buffer)
+            piece = view[:needed]
+            self._buffer += piece
+            view = view[len(piece):]
+            self.position += len(piece)
+            if len(piece) == needed:
+                self._advance(events)
+        return events
+
+    def close(self) -> List[Tuple[str, object]]:
+        events = []
+        if self._state != _TRAILER:
+            if self._stream is not None:
+                self._take_rows(self._stream.close(), events)
+                self._finish_interlaced(events)
+            logger.warning("Поток PNG закончился без IEND.")
+            events.append((PushEvents.End, None))
+        self.finished = True
+        return events
+
+    def feed_stream(self, file, read_size: int = READ_SIZE):
+        while True:
+            data = file.read(read_size)
+            if not data:
+                break
+            yield from self.feed(data)
+        yield from self.close()
+
+    def _needed(self) -> int:
+        if self._state == _SIGNATURE:
+            return len(PNG_SIGNATURE)
+        if self._state == _HEADER:
+            return CHUNK_HEADER.size
+        return CRC_SIZE
+
+    def _advance(self, events: list):
+        buffer = bytes(self._buffer)
+        self._buffer.clear()
+
+        if self._state == _SIGNATURE:
+            if buffer != PNG_SIGNATURE:
+                raise ValueError("Не PNG файл, попробуйте другой")
+            self._state = _HEADER
+            return
+
+        if self._state == _HEADER:
+            self._chunk_length, self._chunk_type = CHUNK_HEADER.unpack(buffer)
+            self._chunk_offset = self.position - CHUNK_HEADER.size
+            self._crc = zlib.crc32(self._chunk_type)
+            self._payload = None
+            if self._chunk_type == b'IDAT':
+                if self._stream is None:
+                    self._start_stream()
+                # IDAT не копим: данные сразу уходят в распаковщик
+            elif self._chunk_type in PAYLOAD_LIMITS:
+                self._payload = self._start_payload()
+            self._remaining = self._chunk_length
+            self._state = _PAYLOAD if self._chunk_length else _CRC
+            return
+
+        self._finish_chunk(buffer, events)
+
+    def _start_payload(self):
+        if self._chunk_length <= PAYLOAD_LIMITS[self._chunk_type]:
+            return bytearray()
+        if self._chunk_type in TEXT_CHUNK_TYPES:
+            logger.warning("Текстовый чанк %s длиной %d байт больше лимита, пропускаем.",
+                           self._chunk_type, self._chunk_length)
+            return None
+        raise ValueError(f"Невалидный PNG файл (чанк {self._chunk_type.decode()} длиной {self._chunk_length} байт)")
+
+    def _consume_payload(self, piece: memoryview, events: list):
+        if self.crc_policy != CrcPolicies.Skip:
+            self._crc = zlib.crc32(piece, self._crc)
+        if self._payload is not None:
+            self._payload += piece
+        elif self._chunk_type == b'IDAT':
+            self._take_rows(self._stream.feed(piece), events)
+
+    def _finish_chunk(self, crc: bytes, events: list):
+        chunk = Chunk(self._chunk_length, self._chunk_type,
+                      bytes(self._payload) if self._payload is not None else None, crc, offset=self._chunk_offset)
+        if self.crc_policy != CrcPolicies.Skip and self._crc != int.from_bytes(crc, 'big'):
+            if self.crc_policy == CrcPolicies.Strict:
+                raise CrcMismatchError(chunk.chunk_type, chunk.offset)
+            logger.warning("Неверный CRC у чанка %s по смещению %d.", chunk.chunk_type, chunk.offset)
+
+        parser = self._parser
+        parser.chunks.append(chunk)
+        parser.instrumentation.count_chunk(chunk.chunk_type)
+        events.append((PushEvents.Chunk, chunk))
+        self._state = _HEADER
+
+        if chunk.chunk_type == b'IHDR':
+            parser._parse_IHDR(chunk)
+            events.append((PushEvents.Header, parser.ihdr_information))
+        elif chunk.chunk_type == b'PLTE':
+            parser._parse_PLTE(chunk)
+        elif chunk.chunk_type == b'tRNS':
+            parser._parse_tRNS(chunk)
+        elif chunk.chunk_type in TEXT_CHUNK_TYPES and chunk.view is not None:
+            parser._parse_text_chunk(chunk)
+        elif chunk.chunk_type == b'IEND':
+            if self._stream is not None:
+                self._take_rows(self._stream.close(), events)
+                self._finish_interlaced(events)
+            events.append((PushEvents.End, None))
+            self._state = _TRAILER
+
+    def _start_stream(self):
+        parser = self._parser
+        if not hasattr(parser, 'ihdr_information'):
+            raise ValueError("Чанк IDAT встретился раньше IHDR.")
+        if parser._is_interlaced():
+            # Adam7 собирается в памяти целиком, поэтому проверяем бюджет
+            parser._check_memory_budget()
+            parser._reset_filters()
+        self._stream = ScanlineStream(parser._get_stride(), parser.ihdr_information.height, parser._row_layout())
+        self._previous = bytearray(parser._get_stride())
+
+    def _take_rows(self, rows, events: list):
+        parser = self._parser
+        if parser._adam7 is not None:
+            # Чересстрочные строки окончательны только после последнего прохода
+            for filter_type, scanline in rows:
+                parser._apply_filter(filter_type, scanline)
+            return
+
+        ihdr = parser.ihdr_information
+        channels = parser._get_samples_per_pixel()
+        bpp = parser._get_bytes_per_pixel()
+        for filter_type, scanline in rows:
+            parser.instrumentation.count_filter(filter_type)
+            recon = parser._unfilter_scanline(filter_type, scanline, self._previous, bpp)
+            if recon is None:
+                logger.warning("Неизвестный тип фильтра: %d", filter_type)
+                recon = bytearray(len(scanline))
+            self._previous = recon
+            samples = unpack_samples(recon, ihdr.width, 1, channels, ihdr.bit_depth,
+                                     scale=ihdr.color_type == ColorTypes.L)
+            events.append((PushEvents.Row, (self._row, samples)))
+            self._row += 1
+
+    def _finish_interlaced(self, events: list):
+        parser = self._parser
+        if parser._adam7 is None:
+            return
+        parser._decode_pixels()
+        pixels = parser.pixels
+        for y in range(pixels.height):
+            events.append((PushEvents.Row, (y, pixels.data[y * pixels.stride:(y + 1) * pixels.stride])))
+        self._row = pixels.height
+
+
+if __name__ == "__main__":
+    # cat image.png | python push_parser.py
+    push_parser = PushParser()
+    rows = 0
+    for event, value in push_parser.feed_stream(sys.stdin.buffer):
+        if event == PushEvents.Header:
+            print(f"IHDR: {value}")
+        elif event == PushEvents.Row:
+            rows += 1
+    print(f"Декодировано строк: {rows}, чанков: {len(push_parser.chunks)}, "
+          f"данных после IEND: {push_parser.hidden_data_length} байт.")
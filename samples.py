@@ -0,0 +1,55 @@
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+SCALE_TO_8BIT = {1: 0xFF, 2: 0x55, 4: 0x11, 8: 1}
+
+
+def unpack_samples(data, width: int, height: int, channels: int, bit_depth: int,
+                   scale: bool = False) -> bytearray:
+    samples_per_row = width * channels
+    if bit_depth == 8:
+        return data if isinstance(data, bytearray) else bytearray(data)
+    if bit_depth == 16:
+        return bytearray(data)
+
+    stride = (samples_per_row * bit_depth + 7) // 8
+    if np is not None:
+        return _unpack_numpy(data, height, stride, samples_per_row, bit_depth, scale)
+    return _unpack_translate(data, height, stride, samples_per_row, bit_depth, scale)
+
+
+def downconvert_16bit(data) -> bytearray:
+    # Старший байт big-endian отсчёта и есть округлённое вниз 8-битное значение
+    return bytearray(memoryview(data)[0::2])
+
+
+def _unpack_numpy(data, height: int, stride: int, samples_per_row: int, bit_depth: int, scale: bool) -> bytearray:
+    packed = np.frombuffer(data, dtype=np.uint8).reshape(height, stride)
+    shifts = np.arange(8 - bit_depth, -1, -bit_depth, dtype=np.uint8)
+    mask = (1 << bit_depth) - 1
+    unpacked = ((packed[:, :, None] >> shifts) & mask).reshape(height, -1)[:, :samples_per_row]
+    if scale:
+        unpacked = unpacked * np.uint8(SCALE_TO_8BIT[bit_depth])
+    return bytearray(np.ascontiguousarray(unpacked, dtype=np.uint8).tobytes())
+
+
+def _unpack_translate(data, height: int, stride: int, samples_per_row: int, bit_depth: int,
+                      scale: bool) -> bytearray:
+    per_byte = 8 // bit_depth
+    mask = (1 << bit_depth) - 1
+    factor = SCALE_TO_8BIT[bit_depth] if scale else 1
+    packed = bytes(data)
+    unpacked = bytearray(len(packed) * per_byte)
+    # Для каждой позиции отсчёта в байте одна таблица translate и одно присваивание со страйдом
+    for position in range(per_byte):
+        shift = 8 - bit_depth * (position + 1)
+        table = bytes(((value >> shift) & mask) * factor for value in range(256))
+        unpacked[position::per_byte] = packed.translate(table)
+
+    row_length = stride * per_byte
+    if row_length == samples_per_row:
+        return unpacked
+    return bytearray().join(
+        unpacked[start:start + samples_per_row] for start in range(0, height * row_length, row_length)
+    )
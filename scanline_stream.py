@@ -0,0 +1,61 @@
+import zlib
+from typing import Iterator, List, Tuple
+
+ROWS_PER_INFLATE = 8
+
+# Вход распаковщику подаётся кусками: unconsumed_tail копирует весь остаток, а не только кусок
+INPUT_SLICE_SIZE = 64 << 10
+
+
+class ScanlineStream:
+    def __init__(self, stride: int, height: int, layout: List[Tuple[int, int]] = None):
+        # layout - список (длина строки, число строк); у чересстрочного изображения своя пара на каждый проход
+        self.layout = [(s, rows) for s, rows in (layout or [(stride, height)]) if rows > 0]
+        self.stride = stride
+        self.height = sum(rows for _, rows in self.layout)
+        self.rows_emitted = 0
+        self._row_length = max((s for s, _ in self.layout), default=stride) + 1
+        self._segment = 0
+        self._segment_rows = 0
+        self._inflater = zlib.decompressobj()
+        self._pending = bytearray()
+
+    def feed(self, data) -> Iterator[Tuple[int, bytes]]:
+        # Распаковываем порциями по несколько строк, чтобы не держать в памяти весь IDAT целиком
+        limit = self._row_length * ROWS_PER_INFLATE
+        data = memoryview(data).cast('B')
+        for start in range(0, len(data), INPUT_SLICE_SIZE):
+            piece = data[start:start + INPUT_SLICE_SIZE]
+            while piece and not self._inflater.eof and self.rows_emitted < self.height:
+                self._pending += self._inflater.decompress(piece, limit)
+                piece = self._inflater.unconsumed_tail
+                yield from self._take_rows()
+            if self._inflater.eof or self.rows_emitted >= self.height:
+                return
+
+    def close(self) -> Iterator[Tuple[int, bytes]]:
+        # Если все строки уже получены, хвост потока не распаковываем: flush развернул бы его целиком
+        if self.rows_emitted < self.height:
+            self._pending += self._inflater.flush()
+        yield from self._take_rows()
+        if self.rows_emitted < self.height:
+            raise ValueError("Недостаточно данных изображения.")
+
+    def _take_rows(self) -> Iterator[Tuple[int, bytes]]:
+        pending = self._pending
+        rows = []
+        start = 0
+        while self._segment < len(self.layout):
+            stride, segment_rows = self.layout[self._segment]
+            end = start + stride + 1
+            if end > len(pending):
+                break
+            rows.append((pending[start], bytes(pending[start + 1:end])))
+            start = end
+            self._segment_rows += 1
+            if self._segment_rows == segment_rows:
+                self._segment += 1
+                self._segment_rows = 0
+        del pending[:start]
+        self.rows_emitted += len(rows)
+        return iter(rows)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import unittest
+from PIL import Image
+from async_parser import DecodeExecutor, parse_async
+from constants import FilterEngines
+from decode_cache import DecodeCache
+from errors import MemoryBudgetExceededError
+from instrumentation import Instrumentation
+from memory_budget import MemoryPool
+from parser import Parser
+
+
+class TestAsyncParser(unittest.IsolatedAsyncioTestCase):
+    TEST_DIR = "test_async_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, width=30, height=20, mode="RGB"):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        channels = len(mode)
+        Image.frombytes(mode, (width, height), os.urandom(width * height * channels)).save(filepath, "PNG")
+        return filepath
+
+    def _decode(self, filepath, **options):
+        parser = Parser(**options)
+        parser.parse(filepath)
+        parser.decompress_data()
+        return parser
+
+    async def test_matches_sync_decode_in_threads(self):
+        filepath = self._create_test_png("threads.png")
+        async with DecodeExecutor(processes=0) as executor:
+            parser = await parse_async(filepath, band_rows=3, executor=executor)
+
+        self.assertEqual(parser.pixels, self._decode(filepath).pixels)
+        self.assertEqual(parser.mode, "RGB")
+
+    async def test_matches_sync_decode_in_processes(self):
+        filepath = self._create_test_png("processes.png", mode="RGBA")
+        async with DecodeExecutor(processes=1) as executor:
+            parser = await parse_async(filepath, executor=executor, filter_engine=FilterEngines.Python)
+
+        self.assertEqual(parser.pixels, self._decode(filepath).pixels)
+
+    async def test_process_decode_keeps_options_and_file_objects(self):
+        filepath = os.path.join(self.TEST_DIR, "palette.png")
+        image = Image.frombytes("P", (20, 12), os.urandom(20 * 12))
+        image.putpalette(os.urandom(256 * 3))
+        image.save(filepath, "PNG", transparency=bytes(range(256)))
+        expected = self._decode(filepath, expand_palette=True).pixels
+
+        async with DecodeExecutor(processes=1) as executor:
+            parser = await parse_async(filepath, executor=executor, expand_palette=True)
+            self.assertEqual(parser.mode, "RGBA")
+            self.assertEqual(parser.pixels, expected)
+
+            with open(filepath, "rb") as file:
+                parser = await parse_async(file, executor=executor, expand_palette=True)
+            self.assertEqual(parser.pixels, expected)
+
+    async def test_concurrency_limits(self):
+        paths = [self._create_test_png(f"many{i}.png", width=10 + i) for i in range(6)]
+        async with DecodeExecutor(max_concurrency=2, max_pending=1, processes=0) as executor:
+            parsers = await asyncio.gather(*(parse_async(path, executor=executor) for path in paths))
+
+        self.assertEqual([parser.pixels.width for parser in parsers], [10 + i for i in range(6)])
+
+    async def test_process_budget_covers_async_decode(self):
+        filepath = self._create_test_png("budget.png", width=100, height=100)
+        for processes in (0, 1):
+            pool = MemoryPool(budget=50_000)
+            async with DecodeExecutor(processes=processes) as executor:
+                with self.assertRaises(MemoryBudgetExceededError):
+                    await parse_async(filepath, executor=executor, memory_pool=pool)
+            self.assertEqual(pool.in_use, 0)
+
+    async def test_decode_cache_hit_skips_bands(self):
+        filepath = self._create_test_png("cache.png")
+        cache = DecodeCache()
+        for processes in (0, 1):
+            async with DecodeExecutor(processes=processes) as executor:
+                parser = await parse_async(filepath, executor=executor, decode_cache=cache)
+                instrumentation = Instrumentation()
+                cached = await parse_async(filepath, executor=executor, decode_cache=cache,
+                                           instrumentation=instrumentation)
+
+            self.assertEqual(cached.pixels, self._decode(filepath).pixels)
+            self.assertEqual(cached.pixels, parser.pixels)
+            self.assertFalse(instrumentation.filter_histogram)
+        self.assertEqual((cache.misses, cache.hits, len(cache)), (1, 3, 1))
+
+    async def test_cancel_stops_between_bands(self):
+        filepath = self._create_test_png("cancel.png", width=64, height=2000, mode="L")
+        instrumentation = Instrumentation()
+        async with DecodeExecutor(processes=0, threads=1) as executor:
+            task = asyncio.create_task(parse_async(filepath, band_rows=8, executor=executor,
+                                                   instrumentation=instrumentation))
+            while not instrumentation.filter_histogram:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertLess(sum(instrumentation.filter_histogram.values()), 2000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import unittest
+from PIL import Image
+from batch import decode_file, expand_paths, main
+
+
+class TestBatch(unittest.TestCase):
+    TEST_DIR = "test_batch_output"
+
+    def setUp(self):
+        os.makedirs(os.path.join(self.TEST_DIR, "nested"), exist_ok=True)
+
+    def tearDown(self):
+        for root, dirs, files in os.walk(self.TEST_DIR, topdown=False):
+            for file in files:
+                os.remove(os.path.join(root, file))
+            for directory in dirs:
+                os.rmdir(os.path.join(root, directory))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, width=20, height=10):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        Image.new("RGB", (width, height), (10, 20, 30)).save(filepath, "PNG")
+        return filepath
+
+    def test_expand_paths(self):
+        first = self._create_test_png("a.png")
+        second = self._create_test_png(os.path.join("nested", "b.png"))
+
+        self.assertEqual(sorted(expand_paths([self.TEST_DIR])), sorted([first, second]))
+        self.assertEqual(expand_paths([os.path.join(self.TEST_DIR, "*.png")]), [first])
+
+    def test_decode_file_result(self):
+        filepath = self._create_test_png("result.png")
+        with open(filepath, "ab") as f:
+            f.write(b"secret")
+
+        result = decode_file(filepath)
+
+        self.assertIsNone(result["error"])
+        self.assertEqual(result["ihdr"]["width"], 20)
+        self.assertEqual([chunk["type"] for chunk in result["chunks"]], ["IHDR", "IDAT", "IEND"])
+        self.assertTrue(result["hidden_data"])
+        self.assertFalse(result["hidden_png"])
+        self.assertIn("decompress_data", result["timings"])
+        self.assertEqual(sum(result["filters"].values()), 10)
+
+    def test_decode_file_reports_errors(self):
+        filepath = os.path.join(self.TEST_DIR, "broken.png")
+        with open(filepath, "wb") as f:
+            f.write(b"NotAPNG")
+
+        result = decode_file(filepath)
+
+        self.assertTrue(result["error"].startswith("ValueError"))
+
+    def test_main_writes_json_lines(self):
+        for i in range(5):
+            self._create_test_png(f"image{i}.png", width=5 + i)
+        output = os.path.join(self.TEST_DIR, "results.jsonl")
+
+        main([self.TEST_DIR, "--workers", "2", "--chunksize", "2", "--output", output])
+
+        with open(output, encoding="utf-8") as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual(sorted(result["ihdr"]["width"] for result in results), [5, 6, 7, 8, 9])
+
+
+if __name__ == "__main__":
+    unittest.main()
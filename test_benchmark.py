@@ -0,0 +1,83 @@
+import json
+import os
+import unittest
+from benchmark import (MIXED_FILTER, STAGES, build_png, compare, generate_pixels, main, measure_startup,
+                       parse_importtime, run_benchmark)
+from constants import ColorTypes, FilterTypes
+from parser import Parser
+
+
+class TestBenchmark(unittest.TestCase):
+    TEST_DIR = "test_benchmark_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def test_synthetic_png_round_trip(self):
+        for color_type in ColorTypes:
+            pixels = generate_pixels(9, 6, color_type)
+            for filter_choice in [*FilterTypes, MIXED_FILTER]:
+                filepath = os.path.join(self.TEST_DIR, "synthetic.png")
+                with open(filepath, "wb") as f:
+                    f.write(build_png(pixels, 9, 6, color_type, filter_choice))
+
+                parser = Parser()
+                parser.parse(filepath)
+                parser.decompress_data()
+
+                self.assertEqual(bytes(parser.pixels.data), pixels, f"{color_type!r}, {filter_choice!r}")
+                histogram = parser.instrumentation.filter_histogram
+                if filter_choice == MIXED_FILTER:
+                    self.assertEqual(len(histogram), len(FilterTypes))
+                else:
+                    self.assertEqual(dict(histogram), {filter_choice: 6})
+
+    def test_run_benchmark_reports_every_stage(self):
+        results = run_benchmark([(8, 4)], color_types=[ColorTypes.RGB], filters=[FilterTypes.Paeth], repeat=1)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["case"], "RGB/Paeth/8x4")
+        self.assertEqual(set(results[0]["seconds"]), set(STAGES))
+        self.assertEqual(results[0]["raw_bytes"], 8 * 4 * 3)
+
+    def test_saved_results_can_be_compared(self):
+        output = os.path.join(self.TEST_DIR, "results.json")
+        main(["--sizes", "8x4", "--color-types", "L", "--filters", "Up", "--repeat", "1", "-o", output])
+
+        with open(output, encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertIn("revision", report["environment"])
+
+        slower = json.loads(json.dumps(report))
+        for result in slower["results"]:
+            result["seconds"] = {stage: seconds * 10 + 1 for stage, seconds in result["seconds"].items()}
+        self.assertEqual(compare(report, slower, threshold=0.1), ["L/Up/8x4"])
+        self.assertEqual(compare(slower, report, threshold=0.1), [])
+
+    def test_parse_only_startup_skips_pillow_and_numpy(self):
+        startup = measure_startup(repeat=1)
+
+        self.assertEqual(startup["heavy_modules"], [])
+        self.assertIn("parser", startup["modules"])
+        self.assertGreater(startup["import_us"], 0)
+
+        report = {"results": [], "startup": startup}
+        slower = {"results": [], "startup": dict(startup, import_us=startup["import_us"] * 2)}
+        self.assertEqual(compare(report, slower, threshold=0.1), ["startup"])
+
+    def test_parse_importtime_keeps_top_level_modules(self):
+        output = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       100 |        100 |     zlib\n"
+                  "import time:       300 |        400 |   chunk_reader\n"
+                  "import time:       500 |        900 | parser\n")
+        self.assertEqual(parse_importtime(output), {"parser": 900})
+
+
+if __name__ == "__main__":
+    unittest.main()
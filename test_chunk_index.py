@@ -0,0 +1,118 @@
+import os
+import unittest
+from PIL import Image
+from chunk_index import ChunkIndex
+from encoder import make_chunk
+from parser import Parser
+
+
+class TestChunkIndex(unittest.TestCase):
+    TEST_DIR = "test_index_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+        self.index = ChunkIndex(os.path.join(self.TEST_DIR, "index.sqlite"), hash_content=True)
+
+    def tearDown(self):
+        self.index.close()
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, width=30, height=20, trailing=b""):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        Image.new("RGB", (width, height), (1, 2, 3)).save(filepath, "PNG")
+        with open(filepath, "ab") as f:
+            f.write(trailing)
+        return filepath
+
+    def test_parser_fills_index(self):
+        filepath = self._create_test_png("filled.png", trailing=b"tail")
+        parser = Parser(chunk_index=self.index)
+        parser.parse(filepath)
+
+        entry = self.index.lookup(filepath)
+
+        self.assertEqual(entry.ihdr_information.width, 30)
+        self.assertEqual([chunk.chunk_type for chunk in entry.chunks], [chunk.chunk_type for chunk in parser.chunks])
+        self.assertEqual([chunk.offset for chunk in entry.chunks], [chunk.offset for chunk in parser.chunks])
+        self.assertEqual(entry.hidden_data_length, 4)
+        self.assertEqual(entry.hidden_data_offset, os.path.getsize(filepath) - 4)
+
+    def test_partial_scan_is_not_stored(self):
+        filepath = self._create_test_png("partial.png", trailing=b"tail")
+        parser = Parser(metadata_only=True, metadata_chunk_types=(b'IHDR',), chunk_index=self.index)
+        parser.parse(filepath)
+
+        self.assertIsNone(self.index.lookup(filepath))
+        self.assertEqual(self.index.update([filepath]), 1)
+        self.assertEqual(self.index.lookup(filepath).hidden_data_length, 4)
+
+    def test_update_skips_broken_files(self):
+        broken = os.path.join(self.TEST_DIR, "broken.png")
+        with open(broken, "wb") as f:
+            f.write(b"NotAPNG")
+        filepath = self._create_test_png("good.png")
+
+        with self.assertLogs("png_parser", level="WARNING"):
+            self.assertEqual(self.index.update([broken, filepath]), 1)
+        self.assertIn(os.path.abspath(broken), self.index.errors)
+        self.assertIsNone(self.index.lookup(broken))
+        self.assertIsNotNone(self.index.lookup(filepath))
+
+    def test_update_skips_malformed_headers(self):
+        ihdr = (4).to_bytes(4, "big") * 2 + bytes([8, 3, 0, 0, 0])
+        contents = {
+            "short_ihdr.png": make_chunk(b"IHDR", ihdr[:5]) + make_chunk(b"IEND", b""),
+            "plte_first.png": make_chunk(b"PLTE", bytes(6)) + make_chunk(b"IHDR", ihdr) + make_chunk(b"IEND", b""),
+            "no_iend.png": make_chunk(b"IHDR", ihdr),
+        }
+        paths = []
+        for name, chunks in contents.items():
+            paths.append(os.path.join(self.TEST_DIR, name))
+            with open(paths[-1], "wb") as f:
+                f.write(b"\x89PNG\r\n\x1a\n" + chunks)
+        paths.append(self._create_test_png("good.png"))
+
+        with self.assertLogs("png_parser", level="WARNING"):
+            self.assertEqual(self.index.update(paths), 1)
+        self.assertEqual(set(self.index.errors), {os.path.abspath(path) for path in paths[:2]})
+        self.assertIsNone(self.index.lookup(paths[2]))
+        self.assertIsNotNone(self.index.lookup(paths[3]))
+
+    def test_incremental_update(self):
+        first = self._create_test_png("first.png")
+        second = self._create_test_png("second.png")
+
+        self.assertEqual(self.index.update([first, second]), 2)
+        self.assertEqual(self.index.update([first, second]), 0)
+
+        self._create_test_png("second.png", width=40)
+        self.assertEqual(self.index.update([first, second]), 1)
+        self.assertEqual(self.index.lookup(second).ihdr_information.width, 40)
+
+    def test_touched_file_is_not_rescanned(self):
+        filepath = self._create_test_png("touched.png")
+        self.index.update([filepath])
+        stat = os.stat(filepath)
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        self.assertEqual(self.index.update([filepath]), 0)
+        self.assertIsNotNone(self.index.lookup(filepath))
+
+    def test_changed_or_missing_file_is_invalidated(self):
+        filepath = self._create_test_png("changed.png")
+        self.index.update([filepath])
+        with open(filepath, "ab") as f:
+            f.write(b"more")
+
+        self.assertIsNone(self.index.lookup(filepath))
+
+        self.index.update([filepath])
+        os.remove(filepath)
+        self.assertEqual(self.index.prune(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
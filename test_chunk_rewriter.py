@@ -0,0 +1,137 @@
+import contextlib
+import io
+import itertools
+import os
+import unittest
+from unittest import mock
+import zlib
+from PIL import Image, PngImagePlugin
+import chunk_rewriter
+from chunk_reader import ChunkReader
+from chunk_rewriter import copy_range, make_text_chunk, rewrite_text_chunks
+from metadata_updater import add_metadata_to_png
+from parser import Parser
+
+
+class TestChunkRewriter(unittest.TestCase):
+    TEST_DIR = "test_rewriter_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, text=None):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        info = PngImagePlugin.PngInfo()
+        for keyword, value in (text or {}).items():
+            info.add_text(keyword, value)
+        Image.frombytes("RGB", (20, 15), os.urandom(20 * 15 * 3)).save(filepath, "PNG", pnginfo=info)
+        return filepath
+
+    @staticmethod
+    def _chunks(filepath):
+        parser = Parser(process_hidden_files=False)
+        parser.parse(filepath)
+        return parser
+
+    @staticmethod
+    def _idat(parser):
+        return [bytes(chunk.view) for chunk in parser.chunks if chunk.chunk_type == b"IDAT"]
+
+    def test_insert_replace_delete(self):
+        source = self._create_test_png("source.png", {"Author": "someone", "Comment": "old"})
+        output = os.path.join(self.TEST_DIR, "output.png")
+
+        rewrite_text_chunks(source, output, {"Comment": "18+", "Title": "новое"}, delete=["Author"])
+
+        original, rewritten = self._chunks(source), self._chunks(output)
+        self.assertEqual(self._idat(rewritten), self._idat(original))
+        self.assertTrue(rewritten.should_blur)
+        image = Image.open(output)
+        image.load()
+        self.assertEqual(image.text, {"Comment": "18+", "Title": "новое"})
+        self.assertEqual(image.tobytes(), Image.open(source).tobytes())
+
+    def test_compressed_chunks_and_hidden_data(self):
+        source = self._create_test_png("hidden.png")
+        with open(source, "ab") as f:
+            f.write(b"secret tail")
+        output = os.path.join(self.TEST_DIR, "compressed.png")
+
+        rewrite_text_chunks(source, output, {"Comment": "x" * 200}, chunk_type=b"zTXt")
+
+        with open(output, "rb") as f:
+            reader = ChunkReader(f.read())
+        chunks = list(itertools.takewhile(lambda chunk: chunk.chunk_type != b"IEND", reader))
+        self.assertEqual(bytes(reader.remaining()), b"secret tail")
+        ztxt = [chunk for chunk in chunks if chunk.chunk_type == b"zTXt"]
+        self.assertEqual(zlib.decompress(ztxt[0].data[len(b"Comment") + 2:]), b"x" * 200)
+        image = Image.open(output)
+        image.load()
+        self.assertEqual(image.text["Comment"], "x" * 200)
+
+    def test_in_place(self):
+        source = self._create_test_png("in_place.png", {"Comment": "old"})
+        idat = self._idat(self._chunks(source))
+
+        rewrite_text_chunks(source, source, delete=["Comment"])
+
+        self.assertEqual(self._idat(self._chunks(source)), idat)
+        self.assertEqual(Image.open(source).text, {})
+        self.assertEqual(sorted(os.listdir(self.TEST_DIR)), ["in_place.png"])
+
+    def test_in_place_keeps_mode_and_failures_leave_nothing(self):
+        source = self._create_test_png("mode.png", {"Comment": "old"})
+        for mode in (0o644, 0o755):
+            os.chmod(source, mode)
+            rewrite_text_chunks(source, source, {"Comment": "new"})
+            self.assertEqual(os.stat(source).st_mode & 0o777, mode)
+
+        output = os.path.join(self.TEST_DIR, "failed.png")
+        with mock.patch.object(chunk_rewriter, "copy_range", side_effect=OSError("диск заполнен")):
+            with self.assertRaises(OSError):
+                rewrite_text_chunks(source, output, {"Comment": "x"})
+            with self.assertRaises(OSError):
+                rewrite_text_chunks(source, source, {"Comment": "x"})
+        self.assertEqual(sorted(os.listdir(self.TEST_DIR)), ["mode.png"])
+        self.assertEqual(Image.open(source).text, {"Comment": "new"})
+
+    def test_copy_fallbacks(self):
+        source = os.path.join(self.TEST_DIR, "bytes.bin")
+        with open(source, "wb") as f:
+            f.write(bytes(range(256)) * 10)
+        for patches in ([], ["copy_file_range"], ["copy_file_range", "sendfile"]):
+            output = os.path.join(self.TEST_DIR, "copy.bin")
+            with contextlib.ExitStack() as stack:
+                for name in patches:
+                    stack.enter_context(mock.patch.object(chunk_rewriter.os, name, side_effect=OSError))
+                with open(source, "rb") as src, open(output, "wb", buffering=0) as dst:
+                    dst.write(b"head")
+                    copy_range(src, dst, 100, 1000)
+            with open(output, "rb") as f:
+                self.assertEqual(f.read(), b"head" + (bytes(range(256)) * 10)[100:1100], patches)
+
+    def test_itxt_chunk_layout(self):
+        chunk = make_text_chunk("Json metadata", "значение", compress=True)
+        payload = chunk[8:-4]
+        self.assertEqual(payload[:16], b"Json metadata\x00\x01\x00")
+        self.assertEqual(zlib.decompress(payload[18:]).decode("utf-8"), "значение")
+
+    def test_add_metadata_to_png(self):
+        source = self._create_test_png("metadata.png")
+        output = os.path.join(self.TEST_DIR, "metadata_18.png")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            add_metadata_to_png(source, output, {"Warning": "18+"})
+
+        self.assertEqual(self._idat(self._chunks(output)), self._idat(self._chunks(source)))
+        self.assertEqual(Image.open(output).text["Json metadata"], '{"Warning": "18+"}')
+
+
+if __name__ == '__main__':
+    unittest.main()
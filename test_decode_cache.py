@@ -0,0 +1,165 @@
+import os
+import unittest
+from PIL import Image
+from decode_cache import DecodeCache
+from instrumentation import Instrumentation
+from parser import Parser
+from pixel_buffer import PixelBuffer
+
+
+class TestDecodeCache(unittest.TestCase):
+    TEST_DIR = "test_cache_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for root, directories, files in os.walk(self.TEST_DIR, topdown=False):
+            for file in files:
+                os.remove(os.path.join(root, file))
+            for directory in directories:
+                os.rmdir(os.path.join(root, directory))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, width=24, height=16, mode="RGB"):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        Image.frombytes(mode, (width, height), os.urandom(width * height * len(mode))).save(filepath, "PNG")
+        return filepath
+
+    def _decode(self, filepath, cache, **options):
+        instrumentation = Instrumentation()
+        parser = Parser(decode_cache=cache, instrumentation=instrumentation, **options)
+        parser.parse(filepath)
+        parser.decompress_data()
+        return parser, instrumentation
+
+    def test_memory_hit_skips_inflate(self):
+        filepath = self._create_test_png("hit.png")
+        cache = DecodeCache()
+        first, instrumentation = self._decode(filepath, cache)
+        self.assertIn("inflate", instrumentation.stages)
+
+        second, instrumentation = self._decode(filepath, cache)
+        self.assertNotIn("inflate", instrumentation.stages)
+        self.assertEqual(second.pixels, first.pixels)
+        self.assertEqual(second.mode, "RGB")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Тот же файл под другим именем - тот же ключ
+        copy_path = os.path.join(self.TEST_DIR, "copy.png")
+        with open(filepath, "rb") as source, open(copy_path, "wb") as target:
+            target.write(source.read())
+        self._decode(copy_path, cache)
+        self.assertEqual(cache.hits, 2)
+
+    def test_key_covers_palette_and_options(self):
+        indexes = os.urandom(8 * 8)
+        paths = []
+        for number, palette in enumerate((bytes(range(256)) * 3, bytes(range(255, -1, -1)) * 3)):
+            image = Image.frombytes("P", (8, 8), indexes)
+            image.putpalette(palette)
+            paths.append(os.path.join(self.TEST_DIR, f"palette{number}.png"))
+            image.save(paths[-1], "PNG")
+
+        cache = DecodeCache()
+        first, _ = self._decode(paths[0], cache, expand_palette=True)
+        second, _ = self._decode(paths[1], cache, expand_palette=True)
+        self.assertNotEqual(first.pixels, second.pixels)
+        indexed, _ = self._decode(paths[0], cache)
+        self.assertEqual(indexed.pixels.mode, "P")
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+
+    def test_lru_eviction(self):
+        cache = DecodeCache(max_bytes=300)
+        buffers = [PixelBuffer(bytes([i]) * 100, 10, 10, 1, "L") for i in range(4)]
+        for i, pixels in enumerate(buffers[:3]):
+            cache.put(str(i), pixels)
+        self.assertIsNotNone(cache.get("0"))
+        cache.put("3", buffers[3])
+
+        self.assertIsNone(cache.get("1"))
+        self.assertEqual(cache.get("0"), buffers[0])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["bytes"], 300)
+
+        cache.put("big", PixelBuffer(bytes(400), 20, 20, 1, "L"))
+        self.assertNotIn("big", cache)
+
+    def test_disk_tier_maps_buffers_without_decoding(self):
+        filepath = self._create_test_png("disk.png", mode="RGBA")
+        directory = os.path.join(self.TEST_DIR, "pixels")
+        first, _ = self._decode(filepath, DecodeCache(directory=directory))
+
+        # Новый процесс: память пуста, буфер читается с диска через mmap
+        cache = DecodeCache(directory=directory)
+        second, instrumentation = self._decode(filepath, cache)
+        self.assertNotIn("inflate", instrumentation.stages)
+        self.assertIsInstance(second.pixels.data, memoryview)
+        self.assertEqual(second.pixels, first.pixels)
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+        self.assertEqual(second.to_image().tobytes(), Image.open(filepath).tobytes())
+
+        self._decode(filepath, cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_corrupted_disk_entry_is_a_miss(self):
+        filepath = self._create_test_png("corrupted.png")
+        directory = os.path.join(self.TEST_DIR, "corrupted")
+        first, _ = self._decode(filepath, DecodeCache(directory=directory))
+        entry = os.path.join(directory, os.listdir(directory)[0])
+
+        for damage in (b"", b"PXB1", b"XXXX" + bytes(40), None):
+            if damage is None:
+                with open(entry, "r+b") as f:
+                    f.truncate(100)
+            else:
+                with open(entry, "wb") as f:
+                    f.write(damage)
+            cache = DecodeCache(directory=directory)
+            with self.assertLogs("png_parser", level="WARNING"):
+                parser, instrumentation = self._decode(filepath, cache)
+            self.assertIn("inflate", instrumentation.stages)
+            self.assertEqual(parser.pixels, first.pixels)
+            self.assertEqual((cache.misses, cache.disk_hits), (1, 0))
+            self.assertEqual(os.listdir(directory), [os.path.basename(entry)])
+
+    def test_streaming_hit_skips_inflate(self):
+        filepath = self._create_test_png("streaming.png")
+        cache = DecodeCache()
+        first, _ = self._decode(filepath, cache, streaming=True)
+
+        second, instrumentation = self._decode(filepath, cache, streaming=True)
+        self.assertNotIn("inflate", instrumentation.stages)
+        self.assertNotIn("apply_filters", instrumentation.stages)
+        self.assertIsNone(second.scanline_stream)
+        self.assertEqual(second.pixels, first.pixels)
+        self.assertEqual(cache.hits, 1)
+
+    def test_reduced_decode_uses_cached_image(self):
+        filepath = self._create_test_png("reduced.png")
+        cache = DecodeCache()
+        first, _ = self._decode(filepath, cache)
+
+        instrumentation = Instrumentation()
+        parser = Parser(decode_cache=cache, instrumentation=instrumentation)
+        parser.parse(filepath)
+        reduced = parser.decode_reduced(4)
+        self.assertFalse(instrumentation.filter_histogram)
+        self.assertEqual(reduced, first.pixels.subsample(4))
+        self.assertEqual(cache.hits, 1)
+
+    def test_disk_tier_is_bounded(self):
+        directory = os.path.join(self.TEST_DIR, "bounded")
+        cache = DecodeCache(directory=directory, max_disk_bytes=250)
+        for i in range(3):
+            cache.put(str(i), PixelBuffer(bytes(100), 10, 10, 1, "L"))
+            os.utime(os.path.join(directory, f"{i}.pix"), ns=(i * 10 ** 9, i * 10 ** 9))
+            cache._trim_disk()
+
+        self.assertEqual(sorted(os.listdir(directory)), ["1.pix", "2.pix"])
+        self.assertEqual(cache.disk_evictions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
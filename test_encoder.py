@@ -0,0 +1,126 @@
+import io
+import os
+import subprocess
+import sys
+import unittest
+import zlib
+from PIL import Image
+import encoder
+from constants import ColorTypes, FilterTypes
+from parser import Parser
+
+
+class TestEncoder(unittest.TestCase):
+    TEST_DIR = "test_encoder_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    @staticmethod
+    def _gradient(width, height, channels):
+        return bytes((x * 5 + y * 3 + c * 40 + (x * y) % 7) & 0xFF
+                     for y in range(height) for x in range(width) for c in range(channels))
+
+    def _decode(self, png):
+        parser = Parser()
+        parser.parse(png)
+        parser.decompress_data()
+        return parser
+
+    def test_round_trip_all_color_types(self):
+        for color_type, mode in ((ColorTypes.L, "L"), (ColorTypes.RGB, "RGB"), (ColorTypes.LA, "LA"),
+                                 (ColorTypes.RGBA, "RGBA")):
+            data = self._gradient(23, 17, len(mode))
+            png = encoder.encode_png(data, 23, 17, color_type)
+
+            self.assertEqual(bytes(self._decode(png).pixels.data), data, mode)
+            self.assertEqual(Image.open(io.BytesIO(png)).tobytes(), data, mode)
+
+    def test_palette_and_text(self):
+        data = bytes(value % 16 for value in range(12 * 5))
+        palette = bytes(range(48))
+        png = encoder.encode_png(data, 12, 5, ColorTypes.P, palette=palette, text={"Comment": "1950s vibe"})
+
+        parser = self._decode(png)
+        self.assertEqual(bytes(parser.pixels.data), data)
+        self.assertEqual(len(parser.palette), 16)
+        self.assertTrue(parser.should_bw)
+
+    def test_sixteen_bit_and_sub_byte(self):
+        data = os.urandom(7 * 3 * 2 * 3)
+        parser = self._decode(encoder.encode_png(data, 7, 3, ColorTypes.RGB, bit_depth=16))
+        self.assertEqual(bytes(parser.pixels.data), data)
+
+        packed = bytes(value & (0xFF if i % 2 == 0 else 0xF8) for i, value in enumerate(os.urandom(2 * 6)))
+        source = Image.open(io.BytesIO(encoder.encode_png(packed, 13, 6, ColorTypes.L, bit_depth=1)))
+        self.assertEqual(source.tobytes(), packed)
+
+    def test_adaptive_filters(self):
+        data = self._gradient(64, 40, 3)
+        parser = self._decode(encoder.encode_png(data, 64, 40, ColorTypes.RGB))
+
+        self.assertGreater(len(parser.instrumentation.filter_histogram), 1)
+        for filter_type in FilterTypes:
+            parser = self._decode(encoder.encode_png(data, 64, 40, ColorTypes.RGB, filter_type=filter_type))
+            self.assertEqual(dict(parser.instrumentation.filter_histogram), {filter_type: 40})
+
+    @unittest.skipUnless(encoder.np is not None, "NumPy не установлен")
+    def test_numpy_and_python_filters_match(self):
+        data = os.urandom(9 * 11 * 4)
+        numpy_rows = encoder.filter_rows(data, 36, 3, 11, 4)
+        numpy_module, encoder.np = encoder.np, None
+        try:
+            python_rows = encoder.filter_rows(data, 36, 3, 11, 4)
+        finally:
+            encoder.np = numpy_module
+        self.assertEqual(numpy_rows, python_rows)
+
+    def test_parallel_blocks_form_one_zlib_stream(self):
+        data = self._gradient(50, 60, 3)
+        serial = encoder.encode_png(data, 50, 60, ColorTypes.RGB, workers=1)
+        parallel = encoder.encode_png(data, 50, 60, ColorTypes.RGB, workers=4, block_size=1000)
+
+        parser = self._decode(parallel)
+        self.assertEqual(bytes(parser.pixels.data), data)
+        self.assertGreater(parser.instrumentation.chunk_counts["IDAT"], 1)
+        stream = b"".join(bytes(chunk.view) for chunk in parser.chunks if chunk.chunk_type == b"IDAT")
+        self.assertEqual(zlib.decompress(stream), zlib.decompress(
+            b"".join(bytes(chunk.view) for chunk in self._decode(serial).chunks if chunk.chunk_type == b"IDAT")
+        ))
+
+    def test_threaded_encode_in_fresh_process(self):
+        # NumPy подгружается лениво: первыми к нему одновременно обращаются потоки кодировщика
+        script = ("import os; from encoder import encode_png; "
+                  "data = os.urandom(300 * 400 * 3); "
+                  "png = encode_png(data, 300, 400, 2, workers=16, block_size=2000); "
+                  "print(len(png))")
+        for _ in range(3):
+            result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(encoder.__file__)))
+            self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_save_png_and_pixel_buffer(self):
+        filepath = os.path.join(self.TEST_DIR, "saved.png")
+        data = self._gradient(8, 8, 4)
+        encoder.save_png(filepath, data, 8, 8, ColorTypes.RGBA)
+        parser = self._decode(filepath)
+
+        self.assertEqual(encoder.encode_pixel_buffer(parser.pixels), encoder.encode_png(data, 8, 8, ColorTypes.RGBA))
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            encoder.encode_png(bytes(10), 4, 4, ColorTypes.RGB)
+        with self.assertRaises(ValueError):
+            encoder.encode_png(bytes(16), 4, 4, ColorTypes.RGB, bit_depth=4)
+        with self.assertRaises(ValueError):
+            encoder.encode_png(bytes(16), 4, 4, ColorTypes.P)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import os
+import unittest
+from unittest import mock
+from PIL import Image
+from constants import ColorTypes, FilterTypes
+from embeding import embed_png_in_png, embed_pngs_in_png
+from encoder import encode_png
+from hidden_data import add_hidden_data_to_png, splice_after_iend
+from parser import Parser
+
+
+class TestHiddenData(unittest.TestCase):
+    TEST_DIR = "test_hidden_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def _write_png(self, filename, width=8, marker=b"IEND"):
+        # Несжатый IDAT содержит байты 'IEND' прямо в данных пикселей
+        filepath = os.path.join(self.TEST_DIR, filename)
+        data = (marker * (width * 3))[:width * 3 * 4]
+        with open(filepath, "wb") as f:
+            f.write(encode_png(data, width, 4, ColorTypes.RGB, filter_type=FilterTypes.None_, level=0))
+        return filepath
+
+    def _parse(self, filepath, **options):
+        parser = Parser(**options)
+        parser.parse(filepath)
+        return parser
+
+    def test_iend_inside_idat(self):
+        source = self._write_png("source.png")
+        output = os.path.join(self.TEST_DIR, "output.png")
+        with open(source, "rb") as f:
+            png = f.read()
+        self.assertLess(png.find(b"IEND"), len(png) - 8)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            add_hidden_data_to_png(source, output, b"secret")
+
+        parser = self._parse(output)
+        self.assertEqual(parser.hidden_data, b"secret")
+        self.assertEqual(parser.hidden_data_offset, len(png))
+
+    def test_batch_payloads_keep_trailer(self):
+        source = self._write_png("trailer.png")
+        with open(source, "ab") as f:
+            f.write(b"-old")
+        payload = os.path.join(self.TEST_DIR, "payload.bin")
+        with open(payload, "wb") as f:
+            f.write(b"-file")
+
+        splice_after_iend(source, source, [b"first", payload])
+
+        self.assertEqual(self._parse(source).hidden_data, b"first-file-old")
+        self.assertEqual(sorted(os.listdir(self.TEST_DIR)), ["payload.bin", "trailer.png"])
+
+    def test_embed_chain_of_pngs(self):
+        container = self._write_png("container.png")
+        hidden = [self._write_png(f"hidden{i}.png", width=10 + i) for i in range(2)]
+        output = os.path.join(self.TEST_DIR, "embedded.png")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            embed_pngs_in_png(container, hidden, output)
+
+        with mock.patch.object(Image.Image, "show"):
+            parser = self._parse(output)
+        self.assertEqual(parser.hidden_parser.ihdr_information.width, 10)
+        self.assertEqual(parser.hidden_parser.hidden_parser.ihdr_information.width, 11)
+
+    def test_embed_rejects_non_png(self):
+        container = self._write_png("container.png")
+        text = os.path.join(self.TEST_DIR, "text.txt")
+        with open(text, "wb") as f:
+            f.write(b"not a png")
+
+        with self.assertRaises(ValueError):
+            embed_png_in_png(container, text, os.path.join(self.TEST_DIR, "out.png"))
+        with self.assertRaises(ValueError):
+            splice_after_iend(text, os.path.join(self.TEST_DIR, "out.png"), [b"x"])
+
+
+if __name__ == '__main__':
+    unittest.main()
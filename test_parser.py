@@ -1,9 +1,26 @@
+import contextlib
+import io
 import unittest
+from unittest import mock
 import os
+import tracemalloc
 import zlib
 from PIL import Image
 from parser import Parser
 from chunk import Chunk
+from concurrent.futures import ThreadPoolExecutor
+from constants import ADAM7_PASSES, ColorTypes, CrcPolicies, FilterEngines, FilterTypes
+from errors import CrcMismatchError, ImageTooLargeError, MemoryBudgetExceededError
+from instrumentation import Instrumentation
+from pixel_buffer import PixelBuffer
+import encoder
+import interlace
+import memory_budget
+import numpy_filters
+import pixel_buffer
+import plte_information
+import samples
+import scanline_stream
 
 
 class TestParser(unittest.TestCase):
@@ -24,6 +41,37 @@ class TestParser(unittest.TestCase):
         img.save(filepath, "PNG")
         return filepath
 
+    def _create_split_idat_png(self, filename, width, height, idat_size):
+        source = io.BytesIO()
+        Image.frombytes("RGB", (width, height), os.urandom(width * height * 3)).save(source, "PNG")
+        png = source.getvalue()
+        ihdr_end = 8 + 8 + 13 + 4
+        idat = self._collect_idat(png)
+
+        filepath = os.path.join(self.TEST_DIR, filename)
+        with open(filepath, "wb") as f:
+            f.write(png[:ihdr_end])
+            for i in range(0, len(idat), idat_size):
+                f.write(self._make_chunk(b"IDAT", idat[i:i + idat_size]))
+            f.write(self._make_chunk(b"IEND", b""))
+        return filepath
+
+    @staticmethod
+    def _make_chunk(chunk_type, data):
+        crc = zlib.crc32(chunk_type + data)
+        return len(data).to_bytes(4, "big") + chunk_type + data + crc.to_bytes(4, "big")
+
+    @staticmethod
+    def _collect_idat(png):
+        idat = b""
+        position = 8
+        while position < len(png):
+            length = int.from_bytes(png[position:position + 4], "big")
+            if png[position + 4:position + 8] == b"IDAT":
+                idat += png[position + 8:position + 8 + length]
+            position += length + 12
+        return idat
+
     def _create_corrupted_png(self, filename):
         filepath = os.path.join(self.TEST_DIR, filename)
         with open(filepath, "wb") as f:
@@ -124,6 +172,68 @@ class TestParser(unittest.TestCase):
 
         self.assertTrue(parser._is_png(parser.hidden_data))
 
+    def test_parse_from_memory_sources(self):
+        filepath = self._create_test_png("memory.png", width=12, height=9, color=(1, 2, 3, 255))
+        with open(filepath, "rb") as f:
+            png = f.read()
+        expected = self._decode(filepath).pixels
+
+        read_end, write_end = os.pipe()
+        os.write(write_end, png + b"tail")
+        os.close(write_end)
+        with open(read_end, "rb") as pipe:
+            sources = [png, bytearray(png), memoryview(png), io.BytesIO(png + b"tail"), pipe]
+            for source in sources:
+                parser = Parser()
+                parser.parse(source)
+                parser.decompress_data()
+                self.assertEqual(parser.pixels, expected)
+        self.assertEqual(parser.hidden_data, b"tail")
+
+        parser = Parser(metadata_only=True)
+        parser.parse(io.BytesIO(png + b"tail"))
+        self.assertEqual(parser.ihdr_information.width, 12)
+        self.assertEqual(parser.hidden_data, b"tail")
+
+    def _create_nested_png(self, depth):
+        png = b""
+        for level in range(depth):
+            filepath = self._create_test_png(f"nested{level}.png", width=60 + level, height=60)
+            with open(filepath, "rb") as f:
+                png += f.read()
+        return png
+
+    def test_nested_png_depth_limit(self):
+        png = self._create_nested_png(4)
+
+        parser = Parser(max_hidden_depth=2)
+        with mock.patch.object(Image.Image, "show"):
+            parser.parse(png)
+
+        self.assertEqual(parser.hidden_parser.ihdr_information.width, 61)
+        self.assertEqual(parser.hidden_parser.hidden_parser.ihdr_information.width, 62)
+        self.assertIsNone(parser.hidden_parser.hidden_parser.hidden_parser)
+
+    def test_nested_png_bytes_budget(self):
+        png = self._create_nested_png(3)
+        parser = Parser(process_hidden_files=False)
+        parser.parse(png)
+        nested_size = len(parser.hidden_data)
+
+        parser = Parser(hidden_bytes_budget=nested_size - 1)
+        with mock.patch.object(Image.Image, "show"):
+            parser.parse(png)
+        self.assertIsNotNone(parser.hidden_parser)
+        self.assertIsNone(parser.hidden_parser.hidden_parser)
+
+        # Вложенный файл сверх бюджета отбрасывается до проверки CRC и разбора его чанков
+        parser = Parser(hidden_bytes_budget=10)
+        with mock.patch.object(Image.Image, "show"), \
+                mock.patch.object(Parser, "_verify_crc", autospec=True) as verify_crc:
+            parser.parse(png)
+        self.assertIsNone(parser.hidden_parser)
+        self.assertEqual([call.args[0] for call in verify_crc.call_args_list], [parser])
+
     def test_grayscale_with_transparency(self):
         img = Image.new("RGBA", (10, 10), (255, 0, 0, 128))
         parser = Parser()
@@ -146,10 +256,17 @@ class TestParser(unittest.TestCase):
 
     def test_decompress_data_corrupted_idat(self):
         parser = Parser()
+        parser.parse(self._create_test_png("corrupted_idat.png"))
         parser.compressed_data_idat = b'corrupted_data'
         with self.assertRaises(zlib.error):
             parser.decompress_data()
 
+        # Без IHDR неизвестно, сколько распаковывать, поэтому не распаковываем вовсе
+        parser = Parser()
+        parser.compressed_data_idat = zlib.compress(b'data')
+        with self.assertRaises(ValueError):
+            parser.decompress_data()
+
     def test_display_image_without_decompression(self):
         filepath = self._create_test_png("no_decompression.png")
         parser = Parser()
@@ -199,6 +316,624 @@ class TestParser(unittest.TestCase):
         expected = bytearray([150, 94, 80, 110])
         self.assertEqual(result, expected)
 
+    @unittest.skipUnless(numpy_filters.is_available(), "NumPy не установлен")
+    def test_numpy_engine_matches_python_filters(self):
+        parser = Parser()
+        numpy_parser = Parser(filter_engine=FilterEngines.NumPy)
+        for bpp in (1, 2, 3, 4):
+            scanline = os.urandom(bpp * 37)
+            for previous in (bytes(bpp * 37), os.urandom(bpp * 37)):
+                for filter_type in FilterTypes:
+                    expected = parser._unfilter_scanline(filter_type, scanline, previous, bpp)
+                    result = numpy_parser._unfilter_scanline(filter_type, scanline, previous, bpp)
+                    self.assertEqual(result, expected, f"filter={filter_type.name}, bpp={bpp}")
+
+    @unittest.skipUnless(numpy_filters.is_available(), "NumPy не установлен")
+    def test_numpy_engine_decodes_same_image(self):
+        filepath = os.path.join(self.TEST_DIR, "noise.png")
+        Image.frombytes("RGBA", (40, 30), os.urandom(40 * 30 * 4)).save(filepath, "PNG")
+
+        parser = Parser()
+        parser.parse(filepath)
+        parser.decompress_data()
+        numpy_parser = Parser(filter_engine=FilterEngines.NumPy)
+        numpy_parser.parse(filepath)
+        numpy_parser.decompress_data()
+
+        self.assertEqual(numpy_parser.image_data, parser.image_data)
+
+    def test_streaming_decode_matches_default(self):
+        filepath = self._create_split_idat_png("split.png", 30, 20, idat_size=7)
+
+        parser = Parser()
+        parser.parse(filepath)
+        parser.decompress_data()
+        streaming_parser = Parser(streaming=True)
+        streaming_parser.parse(filepath)
+
+        self.assertEqual(len(streaming_parser.compressed_data_idat), 0)
+        self.assertEqual(streaming_parser._filtered_rows, 20)
+        streaming_parser.decompress_data()
+        self.assertEqual(streaming_parser.image_data, parser.image_data)
+        self.assertEqual(streaming_parser.pixels, parser.pixels)
+
+    def test_streaming_decode_single_large_idat(self):
+        filepath = self._create_split_idat_png("large.png", 300, 200, idat_size=1 << 24)
+        parser = self._decode(filepath)
+
+        # Один IDAT режется на куски для распаковщика; границы кусков не должны ломать строки
+        for slice_size in (scanline_stream.INPUT_SLICE_SIZE, 1000):
+            with mock.patch.object(scanline_stream, "INPUT_SLICE_SIZE", slice_size):
+                streaming_parser = self._decode(filepath, streaming=True)
+            self.assertEqual(streaming_parser.pixels, parser.pixels)
+
+    def test_streaming_decode_truncated_idat(self):
+        filepath = self._create_split_idat_png("truncated.png", 30, 20, idat_size=50)
+        with open(filepath, "rb") as f:
+            png = f.read()
+        with open(filepath, "wb") as f:
+            f.write(png[:33] + self._make_chunk(b"IDAT", self._collect_idat(png)[:60]))
+
+        parser = Parser(streaming=True)
+        parser.parse(filepath)
+        with self.assertRaises(ValueError):
+            parser.decompress_data()
+
+    def test_chunks_are_views_into_mapped_file(self):
+        filepath = self._create_split_idat_png("mapped.png", 20, 10, idat_size=40)
+        with open(filepath, "ab") as f:
+            f.write(b"tail")
+
+        parser = Parser()
+        parser.parse(filepath)
+
+        with open(filepath, "rb") as f:
+            png = f.read()
+        for chunk in parser.chunks:
+            self.assertIsInstance(chunk.view, memoryview)
+            if chunk.chunk_type == b"IDAT":
+                self.assertIsNone(chunk._data)
+            self.assertEqual(chunk.view, png[chunk.offset + 8:chunk.offset + 8 + chunk.length])
+        self.assertEqual(parser.chunks[-1].chunk_type, b"IEND")
+        self.assertEqual(parser.hidden_data, b"tail")
+
+    def test_truncated_last_chunk(self):
+        filepath = self._create_test_png("truncated_chunk.png")
+        with open(filepath, "rb") as f:
+            png = f.read()
+        with open(filepath, "wb") as f:
+            f.write(png[:-2])
+
+        parser = Parser()
+        parser.parse(filepath)
+
+        self.assertEqual(parser.chunks[-1].chunk_type, b"IEND")
+        self.assertEqual(len(parser.chunks[-1].crc), 2)
+
+    def test_pixels_are_contiguous_buffer(self):
+        filepath = os.path.join(self.TEST_DIR, "buffer.png")
+        source = Image.frombytes("RGB", (12, 7), os.urandom(12 * 7 * 3))
+        source.save(filepath, "PNG")
+
+        parser = Parser()
+        parser.parse(filepath)
+        parser.decompress_data()
+
+        self.assertIsInstance(parser.pixels.data, bytearray)
+        self.assertEqual(parser.pixels.shape, (7, 12, 3))
+        self.assertEqual(bytes(parser.pixels.data), source.tobytes())
+        self.assertEqual(parser.pixels[2][5], source.getpixel((5, 2)))
+        self.assertEqual(len(parser.pixels), 7)
+
+    def test_to_image_uses_decoded_buffer(self):
+        for mode in ("L", "LA", "RGB", "RGBA", "P"):
+            filepath = os.path.join(self.TEST_DIR, f"export_{mode}.png")
+            source = Image.frombytes(mode, (9, 5), os.urandom(9 * 5 * len(mode)))
+            if mode == "P":
+                source.putpalette(list(range(256)) * 3)
+            source.save(filepath, "PNG")
+
+            parser = Parser()
+            parser.parse(filepath)
+            parser.decompress_data()
+            img = parser.to_image()
+
+            self.assertEqual(img.mode, mode)
+            self.assertEqual(img.tobytes(), source.tobytes())
+
+    def _create_bad_crc_png(self, filename):
+        filepath = self._create_test_png(filename)
+        with open(filepath, "r+b") as f:
+            f.seek(8 + 8 + 13)
+            f.write(b"\x00\x00\x00\x00")
+        return filepath
+
+    def test_crc_policy_strict(self):
+        filepath = self._create_bad_crc_png("bad_crc_strict.png")
+        parser = Parser(crc_policy=CrcPolicies.Strict)
+
+        with self.assertRaises(CrcMismatchError) as context:
+            parser.parse(filepath)
+        self.assertEqual(context.exception.chunk_type, b"IHDR")
+
+    def test_crc_policy_warn_and_skip(self):
+        filepath = self._create_bad_crc_png("bad_crc_warn.png")
+
+        parser = Parser(crc_policy=CrcPolicies.Warn)
+        parser.parse(filepath)
+        self.assertEqual([chunk.chunk_type for chunk in parser.corrupted_chunks], [b"IHDR"])
+        self.assertIn("crc", parser.timings)
+
+        parser = Parser(crc_policy=CrcPolicies.Skip)
+        parser.parse(filepath)
+        self.assertEqual(parser.corrupted_chunks, [])
+        self.assertNotIn("crc", parser.timings)
+
+    def test_crc_verification_on_thread_pool(self):
+        filepath = self._create_split_idat_png("crc_threads.png", 40, 40, idat_size=100)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            parser = Parser(crc_policy=CrcPolicies.Strict, crc_executor=executor)
+            parser.parse(filepath)
+
+        self.assertEqual(parser.corrupted_chunks, [])
+
+    def test_metadata_only_skips_idat_payloads(self):
+        filepath = self._create_split_idat_png("metadata.png", 30, 30, idat_size=64)
+        with open(filepath, "ab") as f:
+            f.write(b"trailing")
+
+        parser = Parser(metadata_only=True, read_hidden_data=False)
+        parser.parse(filepath)
+
+        self.assertEqual(parser.ihdr_information.width, 30)
+        idat_chunks = [chunk for chunk in parser.chunks if chunk.chunk_type == b"IDAT"]
+        self.assertTrue(idat_chunks)
+        self.assertTrue(all(chunk.view is None for chunk in idat_chunks))
+        self.assertEqual(len(parser.compressed_data_idat), 0)
+        self.assertEqual(parser.hidden_data_length, len(b"trailing"))
+        self.assertEqual(parser.hidden_data_offset, os.path.getsize(filepath) - len(b"trailing"))
+        self.assertEqual(parser.hidden_data, b"")
+
+    def test_metadata_only_stops_after_requested_chunks(self):
+        filepath = self._create_split_idat_png("metadata_stop.png", 30, 30, idat_size=64)
+
+        parser = Parser(metadata_only=True, metadata_chunk_types=[b"IHDR"])
+        parser.parse(filepath)
+
+        self.assertEqual([chunk.chunk_type for chunk in parser.chunks], [b"IHDR"])
+        self.assertEqual(parser.ihdr_information.height, 30)
+
+    def test_parser_is_silent_by_default(self):
+        filepath = self._create_test_png("silent.png")
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            parser = Parser()
+            parser.parse(filepath)
+            parser.decompress_data()
+
+        self.assertEqual(output.getvalue(), "")
+
+    def test_instrumentation_reports_stages(self):
+        filepath = self._create_split_idat_png("instrumented.png", 16, 12, idat_size=30)
+        records = []
+        parser = Parser(instrumentation=Instrumentation(hooks=[records.append]))
+        parser.parse(filepath)
+        parser.decompress_data()
+
+        report = parser.instrumentation.report()
+        stages = report["stages"]
+        for name in ("parse", "record_chunks", "crc", "parse_IDAT", "decompress_data", "inflate",
+                     "apply_filters", "decode_pixels"):
+            self.assertIn(name, stages)
+        self.assertEqual(stages["parse_IDAT"]["calls"], report["chunks"]["IDAT"])
+        self.assertEqual(stages["inflate"]["bytes_out"], 12 * (16 * 3 + 1))
+        self.assertEqual(stages["decode_pixels"]["bytes_out"], 16 * 12 * 3)
+        self.assertEqual(sum(report["filters"].values()), 12)
+        self.assertEqual(sum(1 for record in records if record.name == "parse_IDAT"), report["chunks"]["IDAT"])
+
+    def _decode(self, filepath, **options):
+        parser = Parser(**options)
+        parser.parse(filepath)
+        parser.decompress_data()
+        return parser
+
+    def _write_raw_png(self, filename, width, height, bit_depth, color_type, raw_rows):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        ihdr = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([bit_depth, color_type, 0, 0, 0])
+        raw = b"".join(b"\x00" + row for row in raw_rows)
+        with open(filepath, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + self._make_chunk(b"IHDR", ihdr)
+                    + self._make_chunk(b"IDAT", zlib.compress(raw)) + self._make_chunk(b"IEND", b""))
+        return filepath
+
+    def test_one_bit_grayscale(self):
+        filepath = os.path.join(self.TEST_DIR, "bilevel.png")
+        source = Image.frombytes("1", (13, 5), os.urandom(2 * 5))
+        source.save(filepath, "PNG")
+
+        parser = self._decode(filepath)
+
+        self.assertEqual(parser.ihdr_information.bit_depth, 1)
+        self.assertEqual(bytes(parser.pixels.data), source.convert("L").tobytes())
+
+    def test_sub_byte_palette(self):
+        for bits in (1, 2, 4):
+            filepath = os.path.join(self.TEST_DIR, f"palette{bits}.png")
+            indexes = bytes(value % (1 << bits) for value in os.urandom(11 * 7))
+            source = Image.frombytes("P", (11, 7), indexes)
+            source.putpalette(list(range(3 << bits)))
+            source.save(filepath, "PNG", bits=bits)
+
+            parser = self._decode(filepath)
+
+            self.assertEqual(parser.ihdr_information.bit_depth, bits)
+            self.assertEqual(bytes(parser.pixels.data), indexes)
+
+    def _write_palette_png(self, filename, indexes, width, height, palette, transparency=None):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        with open(filepath, "wb") as f:
+            f.write(encoder.encode_png(indexes, width, height, ColorTypes.P, palette=palette,
+                                       transparency=transparency))
+        return filepath
+
+    def test_palette_transparency(self):
+        palette = bytes(range(30))
+        indexes = bytes(value % 12 for value in os.urandom(9 * 7))
+        filepath = self._write_palette_png("trns.png", indexes, 9, 7, palette, transparency=b"\x00\x80")
+
+        parser = self._decode(filepath)
+        self.assertEqual(len(parser.palette), 10)
+        self.assertEqual(parser.palette[3].G, 10)
+        self.assertEqual(parser.mode, "P")
+        image = parser.to_image()
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(image.tobytes(), Image.open(filepath).convert("RGBA").tobytes())
+
+        expanded = self._decode(filepath, expand_palette=True)
+        self.assertEqual(expanded.mode, "RGBA")
+        self.assertEqual(bytes(expanded.pixels.data), image.tobytes())
+
+    def test_palette_expand_without_numpy(self):
+        palette = bytes(range(48))
+        indexes = bytes(value % 16 for value in os.urandom(11 * 5))
+        filepath = self._write_palette_png("expand.png", indexes, 11, 5, palette)
+
+        parser = self._decode(filepath, expand_palette=True)
+        self.assertEqual(parser.mode, "RGB")
+        self.assertEqual(bytes(parser.pixels.data), Image.open(filepath).convert("RGB").tobytes())
+
+        numpy_module, plte_information.np = plte_information.np, None
+        try:
+            self.assertEqual(parser.palette.expand(indexes), parser.pixels.data)
+            self.assertEqual(parser.palette.expand(indexes, with_alpha=True)[3::4], b"\xff" * len(indexes))
+        finally:
+            plte_information.np = numpy_module
+
+    def test_reduced_resolution_decode(self):
+        filepath = os.path.join(self.TEST_DIR, "reduced.png")
+        source = Image.frombytes("RGB", (23, 70), os.urandom(23 * 70 * 3))
+        source.save(filepath, "PNG")
+
+        parser = Parser()
+        parser.parse(filepath)
+        pixels = parser.decode_reduced(3)
+
+        full = self._decode(filepath).pixels
+        self.assertEqual((pixels.width, pixels.height), (8, 24))
+        self.assertEqual(pixels[5], full[15][::3])
+        self.assertEqual(parser.mode, "RGB")
+
+    def test_reduced_decode_adam7_first_pass(self):
+        width, height = 21, 17
+        source = Image.frombytes("L", (width, height), os.urandom(width * height))
+        rows = [list(source.tobytes()[y * width:(y + 1) * width]) for y in range(height)]
+        filepath = self._write_interlaced_png("reduced_adam7.png", rows, width, height, 1, 8, 0)
+
+        parser = Parser()
+        parser.parse(filepath)
+        pixels = parser.decode_reduced(8)
+
+        self.assertEqual(pixels, [row[::8] for row in rows[::8]])
+        self.assertEqual(sum(parser.instrumentation.filter_histogram.values()), 3)
+
+    def test_subsample_without_numpy(self):
+        pixels = PixelBuffer(bytearray(os.urandom(7 * 5 * 2 * 2)), 7, 5, 2, "LA", bit_depth=16)
+        expected = pixels.subsample(2, offset_y=1)
+        numpy_module, pixel_buffer.np = pixel_buffer.np, None
+        try:
+            self.assertEqual(pixels.subsample(2, offset_y=1), expected)
+        finally:
+            pixel_buffer.np = numpy_module
+        self.assertEqual(expected[1], pixels[3][::2])
+
+    def test_sixteen_bit_samples(self):
+        values = [[(x * 4099 + y * 257 + channel) & 0xFFFF for x in range(6) for channel in range(3)]
+                  for y in range(4)]
+        rows = [b"".join(value.to_bytes(2, "big") for value in row) for row in values]
+        filepath = self._write_raw_png("rgb16.png", 6, 4, 16, 2, rows)
+
+        parser = self._decode(filepath)
+        self.assertEqual(parser.pixels.bit_depth, 16)
+        self.assertEqual(parser.pixels[1][2], tuple(values[1][6:9]))
+        self.assertEqual(parser.to_image().getpixel((2, 1)), tuple(value >> 8 for value in values[1][6:9]))
+
+        parser = self._decode(filepath, downconvert_16bit=True)
+        self.assertEqual(parser.pixels.bit_depth, 8)
+        self.assertEqual(parser.pixels[1][2], tuple(value >> 8 for value in values[1][6:9]))
+
+    def test_sixteen_bit_gray_post_processing(self):
+        filepath = os.path.join(self.TEST_DIR, "gray16.png")
+        samples_16 = b"".join(((x * 4099 + y * 997) & 0xFFFF).to_bytes(2, "big") for y in range(8) for x in range(8))
+        encoder.save_png(filepath, samples_16, 8, 8, ColorTypes.L, bit_depth=16, text={"Comment": "18+"})
+
+        parser = self._decode(filepath)
+        self.assertTrue(parser.should_blur)
+        with mock.patch.object(Image.Image, "show") as show:
+            parser.display_image()
+        show.assert_called_once()
+
+        image = parser.post_processing().apply(parser.to_image())
+        self.assertEqual((image.mode, image.size), ("L", (800, 800)))
+
+    def test_invalid_bit_depth(self):
+        filepath = self._write_raw_png("bad_depth.png", 2, 2, 4, 2, [bytes(3)] * 2)
+
+        with self.assertRaises(ValueError):
+            Parser().parse(filepath)
+
+    @unittest.skipUnless(samples.np is not None, "NumPy не установлен")
+    def test_unpack_paths_match(self):
+        for bit_depth in (1, 2, 4):
+            width, height = 13, 3
+            stride = (width * bit_depth + 7) // 8
+            packed = os.urandom(stride * height)
+            for scale in (False, True):
+                self.assertEqual(
+                    samples._unpack_numpy(packed, height, stride, width, bit_depth, scale),
+                    samples._unpack_translate(packed, height, stride, width, bit_depth, scale),
+                )
+
+    def test_iter_bands_matches_full_decode(self):
+        filepath = os.path.join(self.TEST_DIR, "bands.png")
+        source = Image.frombytes("RGB", (9, 23), os.urandom(9 * 23 * 3))
+        source.save(filepath, "PNG")
+        parser = self._decode(filepath)
+
+        band_parser = Parser()
+        band_parser.parse(filepath)
+        bands = list(band_parser.iter_bands(band_rows=5))
+
+        self.assertEqual([start for start, _ in bands], [0, 5, 10, 15, 20])
+        self.assertEqual([band.height for _, band in bands], [5, 5, 5, 5, 3])
+        self.assertEqual(b"".join(bytes(band.data) for _, band in bands), bytes(parser.pixels.data))
+        self.assertEqual(len(band_parser.image_data), 0)
+
+    def test_iter_rows_stops_early(self):
+        rows = [bytes([y] * 4) for y in range(40)]
+        filepath = self._write_raw_png("rows.png", 4, 40, 8, 0, rows)
+        parser = Parser()
+        parser.parse(filepath)
+
+        selected = list(parser.iter_rows(3, 7, band_rows=4))
+
+        self.assertEqual([y for y, _ in selected], [3, 4, 5, 6])
+        self.assertEqual([bytes(row) for _, row in selected], rows[3:7])
+        self.assertLess(parser.instrumentation.filter_histogram[FilterTypes.None_], 40)
+
+    def test_memory_budget(self):
+        filepath = self._write_raw_png("budget.png", 64, 64, 8, 2, [bytes(64 * 3)] * 64)
+        parser = Parser(memory_budget=4096)
+        parser.parse(filepath)
+
+        with self.assertRaises(ImageTooLargeError):
+            parser.decompress_data()
+        self.assertEqual(sum(len(band.data) for _, band in parser.iter_bands()), 64 * 64 * 3)
+
+        parser = self._decode(filepath, memory_budget=None)
+        self.assertEqual(len(parser.pixels.data), 64 * 64 * 3)
+
+    def _write_bomb_png(self, filename, width, height, extra):
+        # Настоящие строки изображения, а за ними в том же zlib-потоке extra нулевых байт
+        filepath = os.path.join(self.TEST_DIR, filename)
+        compressor = zlib.compressobj(9)
+        idat = compressor.compress(bytes((width + 1) * height))
+        block = bytes(1 << 20)
+        for _ in range(extra // len(block)):
+            idat += compressor.compress(block)
+        idat += compressor.flush()
+        ihdr = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([8, 0, 0, 0, 0])
+        with open(filepath, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + self._make_chunk(b"IHDR", ihdr)
+                    + self._make_chunk(b"IDAT", idat) + self._make_chunk(b"IEND", b""))
+        return filepath
+
+    def test_inflate_bounded_by_ihdr(self):
+        filepath = self._write_bomb_png("bomb.png", 16, 16, 64 << 20)
+        for options in ({}, {"streaming": True}):
+            tracemalloc.start()
+            with self.assertLogs("png_parser", level="WARNING") if not options else contextlib.nullcontext():
+                parser = self._decode(filepath, **options)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            self.assertEqual(bytes(parser.pixels.data), bytes(16 * 16))
+            self.assertLess(peak, 16 << 20, options)
+
+        parser = Parser()
+        parser.parse(filepath)
+        self.assertEqual(sum(band.height for _, band in parser.iter_bands(4)), 16)
+
+    def test_invalid_dimensions(self):
+        filepath = self._write_raw_png("empty.png", 0, 4, 8, 0, [])
+        with self.assertRaises(ValueError):
+            Parser().parse(filepath)
+
+    def test_reduced_interlaced_decode_checks_budget(self):
+        filepath = os.path.join(self.TEST_DIR, "huge_adam7.png")
+        ihdr = (60000).to_bytes(4, "big") * 2 + bytes([8, 6, 0, 0, 1])
+        with open(filepath, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + self._make_chunk(b"IHDR", ihdr)
+                    + self._make_chunk(b"IDAT", zlib.compress(bytes(1024))) + self._make_chunk(b"IEND", b""))
+
+        parser = Parser()
+        parser.parse(filepath)
+        with self.assertRaises(ImageTooLargeError):
+            parser.decode_reduced(8)
+
+        pool = memory_budget.MemoryPool(budget=1 << 20)
+        parser = Parser(memory_budget=None, memory_pool=pool)
+        parser.parse(filepath)
+        with self.assertRaises(MemoryBudgetExceededError):
+            parser.decode_reduced(16)
+        self.assertEqual(pool.in_use, 0)
+
+    def test_process_memory_budget(self):
+        filepath = self._write_raw_png("pool.png", 64, 64, 8, 2, [bytes(64 * 3)] * 64)
+        pool = memory_budget.MemoryPool(budget=100_000)
+        parser = Parser(memory_pool=pool)
+        parser.parse(filepath)
+        parser.decompress_data()
+        self.assertEqual(pool.in_use, 0)
+        self.assertGreater(pool.peak, 64 * 64 * 3)
+
+        # Пока другое декодирование держит резерв, второе получает отказ, а не съедает память
+        with pool.reserve(60_000):
+            with self.assertRaises(MemoryBudgetExceededError) as error:
+                parser.decompress_data()
+            self.assertIsInstance(error.exception, ImageTooLargeError)
+            self.assertEqual(error.exception.in_use, 60_000)
+            bands = parser.iter_bands(8)
+            next(bands)
+            self.assertGreater(pool.in_use, 60_000)
+            bands.close()
+        self.assertEqual(pool.in_use, 0)
+
+    def test_streaming_decode_reserves_process_memory(self):
+        filepath = self._write_raw_png("stream_pool.png", 64, 64, 8, 2, [bytes(64 * 3)] * 64)
+        pool = memory_budget.MemoryPool(budget=100_000)
+        parser = Parser(streaming=True, memory_pool=pool)
+        parser.parse(filepath)
+        # Строки уже распакованы во время parse(), резерв держится до готового буфера
+        self.assertGreater(pool.in_use, 64 * 64 * 3)
+        parser.decompress_data()
+        self.assertEqual(pool.in_use, 0)
+
+        with pool.reserve(80_000):
+            with self.assertRaises(MemoryBudgetExceededError):
+                Parser(streaming=True, memory_pool=pool).parse(filepath)
+        self.assertEqual(pool.in_use, 0)
+
+        with open(filepath, "rb") as f:
+            data = bytearray(f.read())
+        data[-20] ^= 0xFF
+        with self.assertRaises(zlib.error):
+            Parser(streaming=True, memory_pool=pool, crc_policy=CrcPolicies.Skip).parse(data)
+        self.assertEqual(pool.in_use, 0)
+
+    def _write_interlaced_png(self, filename, samples, width, height, channels, bit_depth, color_type):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        raw = bytearray()
+        for x0, y0, dx, dy in ADAM7_PASSES:
+            pass_width = len(range(x0, width, dx))
+            for y in range(y0, height, dy):
+                if not pass_width:
+                    break
+                row = [samples[y][x * channels + c] for x in range(x0, width, dx) for c in range(channels)]
+                raw.append(FilterTypes.Sub)
+                packed = self._pack_row(row, bit_depth)
+                bpp = max(1, channels * bit_depth // 8)
+                raw += bytes((packed[i] - (packed[i - bpp] if i >= bpp else 0)) & 0xFF for i in range(len(packed)))
+        ihdr = width.to_bytes(4, "big") + height.to_bytes(4, "big") + bytes([bit_depth, color_type, 0, 0, 1])
+        with open(filepath, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + self._make_chunk(b"IHDR", ihdr)
+                    + self._make_chunk(b"IDAT", zlib.compress(bytes(raw))) + self._make_chunk(b"IEND", b""))
+        return filepath
+
+    @staticmethod
+    def _pack_row(row, bit_depth):
+        if bit_depth == 8:
+            return bytes(row)
+        per_byte = 8 // bit_depth
+        packed = bytearray()
+        for i in range(0, len(row), per_byte):
+            value = 0
+            group = row[i:i + per_byte]
+            for position, sample in enumerate(group):
+                value |= sample << (8 - bit_depth * (position + 1))
+            packed.append(value)
+        return bytes(packed)
+
+    def test_adam7_interlaced_decode(self):
+        for width, height in ((13, 11), (1, 1), (3, 2), (8, 8)):
+            source = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+            rows = [list(source.tobytes()[y * width * 3:(y + 1) * width * 3]) for y in range(height)]
+            filepath = self._write_interlaced_png(f"adam7_{width}x{height}.png", rows, width, height, 3, 8, 2)
+
+            parser = self._decode(filepath)
+            self.assertEqual(bytes(parser.pixels.data), source.tobytes(), f"{width}x{height}")
+
+            streaming_parser = self._decode(filepath, streaming=True)
+            self.assertEqual(streaming_parser.pixels, parser.pixels)
+
+    def test_adam7_interlaced_sub_byte(self):
+        width, height = 10, 9
+        rows = [[value & 1 for value in os.urandom(width)] for _ in range(height)]
+        filepath = self._write_interlaced_png("adam7_1bit.png", rows, width, height, 1, 1, 0)
+
+        parser = self._decode(filepath)
+
+        self.assertEqual(bytes(parser.pixels.data), bytes(sample * 255 for row in rows for sample in row))
+
+    def test_progressive_previews(self):
+        width, height = 16, 16
+        source = Image.frombytes("L", (width, height), os.urandom(width * height))
+        rows = [list(source.tobytes()[y * width:(y + 1) * width]) for y in range(height)]
+        filepath = self._write_interlaced_png("progressive.png", rows, width, height, 1, 8, 0)
+
+        parser = Parser()
+        parser.parse(filepath)
+        frames = list(parser.iter_progressive())
+
+        self.assertEqual([number for number, _ in frames], [1, 2, 3, 4, 5, 6, 7])
+        first_preview = frames[0][1]
+        self.assertEqual(first_preview[0][:8], [rows[0][0]] * 8)
+        self.assertEqual(first_preview[7][8:], [rows[0][8]] * 8)
+        self.assertEqual(first_preview[8][0], rows[8][0])
+        self.assertEqual(bytes(frames[-1][1].data), source.tobytes())
+        self.assertIs(frames[-1][1], parser.pixels)
+
+    def test_adam7_without_numpy(self):
+        width, height = 11, 10
+        source = Image.frombytes("LA", (width, height), os.urandom(width * height * 2))
+        rows = [list(source.tobytes()[y * width * 2:(y + 1) * width * 2]) for y in range(height)]
+        filepath = self._write_interlaced_png("adam7_pure.png", rows, width, height, 2, 8, 4)
+
+        parser = Parser()
+        parser.parse(filepath)
+        expected = [bytes(pixels.data) for _, pixels in parser.iter_progressive()]
+
+        numpy_module, interlace.np, samples.np = interlace.np, None, None
+        try:
+            parser = Parser()
+            parser.parse(filepath)
+            result = [bytes(pixels.data) for _, pixels in parser.iter_progressive()]
+        finally:
+            interlace.np, samples.np = numpy_module, numpy_module
+
+        self.assertEqual(result, expected)
+        self.assertEqual(result[-1], source.tobytes())
+
+    def test_progressive_non_interlaced(self):
+        filepath = self._create_test_png("progressive_plain.png", width=4, height=3)
+        parser = Parser()
+        parser.parse(filepath)
+
+        frames = list(parser.iter_progressive())
+
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0][1][2][3], (255, 255, 255, 255))
+
 
 if __name__ == "__main__":
     unittest.main()
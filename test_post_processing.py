@@ -0,0 +1,53 @@
+import os
+import unittest
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+from post_processing import PostProcessing, grayscale_with_transparency, to_grayscale
+
+
+class TestPostProcessing(unittest.TestCase):
+    def _pipeline(self, target_size=None):
+        return PostProcessing(target_size).add_blur(15).add_grayscale().add_upscale(50, 100)
+
+    def test_small_image_matches_eager_order(self):
+        image = Image.frombytes("RGBA", (12, 9), os.urandom(12 * 9 * 4))
+        expected = grayscale_with_transparency(image.filter(ImageFilter.GaussianBlur(radius=15)))
+        expected = expected.resize((1200, 900), Image.Resampling.NEAREST)
+
+        self.assertEqual(self._pipeline().apply(image).tobytes(), expected.tobytes())
+
+    def test_target_size_limits_upscale(self):
+        image = Image.new("RGB", (40, 20), (200, 10, 10))
+        pipeline = self._pipeline(target_size=(400, 400))
+
+        self.assertEqual(pipeline.output_size(40, 20), (400, 200))
+        self.assertEqual([step[0] for step in pipeline.plan(40, 20)], ["blur", "grayscale", "resize"])
+        result = pipeline.apply(image)
+        self.assertEqual((result.size, result.mode), ((400, 200), "L"))
+
+    def test_downscale_first(self):
+        gradient = bytes((x + y) % 256 for y in range(400) for x in range(400))
+        image = Image.merge("RGB", [Image.frombytes("L", (400, 400), gradient)] * 3)
+        pipeline = self._pipeline(target_size=(100, 100))
+
+        plan = pipeline.plan(400, 400)
+        self.assertEqual(plan[0][0], "resize")
+        self.assertAlmostEqual(plan[1][1], 15 / 4)
+        result = pipeline.apply(image)
+
+        eager = to_grayscale(image.filter(ImageFilter.GaussianBlur(radius=15)))
+        eager = eager.resize((100, 100), Image.Resampling.LANCZOS)
+        self.assertEqual(result.size, (100, 100))
+        self.assertLess(ImageStat.Stat(ImageChops.difference(result, eager)).mean[0], 4)
+
+    def test_palette_image(self):
+        image = Image.new("P", (60, 60), 3)
+        image.putpalette(list(range(256)) * 3)
+
+        result = PostProcessing().add_blur(2).apply(image)
+
+        self.assertEqual(result.mode, "RGB")
+        self.assertEqual(result.getpixel((30, 30)), (9, 10, 11))
+
+
+if __name__ == '__main__':
+    unittest.main()
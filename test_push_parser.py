@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+import tracemalloc
+import unittest
+import zlib
+from PIL import Image
+from constants import CrcPolicies, PushEvents
+from errors import CrcMismatchError
+from parser import Parser
+from encoder import make_chunk
+from push_parser import PushParser
+
+
+class TestPushParser(unittest.TestCase):
+    TEST_DIR = "test_push_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, width=17, height=12, mode="RGB", **options):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        source = Image.frombytes(mode, (width, height), os.urandom(width * height * len(mode)))
+        source.save(filepath, "PNG", **options)
+        with open(filepath, "rb") as f:
+            return filepath, f.read()
+
+    @staticmethod
+    def _rows(events):
+        return b"".join(bytes(value[1]) for event, value in events if event == PushEvents.Row)
+
+    def test_feed_in_small_pieces(self):
+        filepath, png = self._create_test_png("pieces.png")
+        parser = Parser()
+        parser.parse(filepath)
+        parser.decompress_data()
+
+        push_parser = PushParser()
+        events = []
+        for start in range(0, len(png), 7):
+            events += push_parser.feed(png[start:start + 7])
+        events += push_parser.close()
+
+        self.assertEqual(self._rows(events), bytes(parser.pixels.data))
+        self.assertEqual(events[-1], (PushEvents.End, None))
+        headers = [value for event, value in events if event == PushEvents.Header]
+        self.assertEqual((headers[0].width, headers[0].height), (17, 12))
+        self.assertEqual([chunk.chunk_type for chunk in push_parser.chunks],
+                         [chunk.chunk_type for chunk in parser.chunks])
+
+    def test_rows_before_upload_finishes(self):
+        _, png = self._create_test_png("partial.png", width=64, height=64, mode="L", compress_level=0)
+
+        push_parser = PushParser()
+        events = push_parser.feed(png[:len(png) // 2])
+        rows = [value[0] for event, value in events if event == PushEvents.Row]
+
+        self.assertGreater(len(rows), 0)
+        self.assertEqual(rows, list(range(len(rows))))
+
+    def test_interlaced_and_hidden_data(self):
+        filepath, png = self._create_test_png("interlaced.png", mode="RGBA")
+        image = Image.open(filepath)
+        image.save(filepath, "PNG", interlace=1)
+        with open(filepath, "rb") as f:
+            png = f.read()
+
+        push_parser = PushParser()
+        events = push_parser.feed(png + b"secret") + push_parser.close()
+
+        self.assertEqual(self._rows(events), image.tobytes())
+        self.assertIn((PushEvents.HiddenData, b"secret"), events)
+        self.assertEqual(push_parser.hidden_data_length, 6)
+
+    def test_crc_strict(self):
+        _, png = self._create_test_png("bad_crc.png")
+        broken = bytearray(png)
+        broken[29] ^= 0xFF  # CRC чанка IHDR
+
+        with self.assertRaises(CrcMismatchError):
+            PushParser(crc_policy=CrcPolicies.Strict).feed(broken)
+
+    def test_idat_before_ihdr(self):
+        idat = zlib.compress(b"\x00")
+        chunk = len(idat).to_bytes(4, "big") + b"IDAT" + idat + zlib.crc32(b"IDAT" + idat).to_bytes(4, "big")
+        with self.assertRaises(ValueError):
+            PushParser().feed(b"\x89PNG\r\n\x1a\n" + chunk)
+
+    def test_unused_chunks_are_not_buffered(self):
+        filepath, png = self._create_test_png("ancillary.png")
+        parser = Parser()
+        parser.parse(filepath)
+        parser.decompress_data()
+
+        extra = (make_chunk(b"zzZz", bytes(8 << 20)) + make_chunk(b"tEXt", b"Big\x00" + bytes(2 << 20))
+                 + make_chunk(b"tEXt", b"Title\x00small"))
+        png = png[:33] + extra + png[33:]
+        push_parser = PushParser()
+        events = []
+        tracemalloc.start()
+        for start in range(0, len(png), 1 << 16):
+            events += push_parser.feed(memoryview(png)[start:start + (1 << 16)])
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.assertLess(peak, 1 << 20)
+        self.assertEqual(self._rows(events), bytes(parser.pixels.data))
+        chunks = {chunk.chunk_type: chunk for chunk in push_parser.chunks}
+        self.assertIsNone(chunks[b"zzZz"].view)
+        self.assertEqual(push_parser._parser.text_index.keywords(), ["Title"])
+
+        with self.assertRaises(ValueError):
+            PushParser().feed(png[:33] + make_chunk(b"PLTE", bytes(3 << 10)))
+
+    def test_stdin(self):
+        _, png = self._create_test_png("stdin.png")
+        result = subprocess.run([sys.executable, "push_parser.py"], input=png, capture_output=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        self.assertIn("Декодировано строк: 12", result.stdout.decode("utf-8"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import json
+import os
+import unittest
+from unittest import mock
+import zlib
+from PIL import Image
+import text_index
+from chunk_rewriter import make_text_chunk, rewrite_text_chunks
+from constants import TextActions
+from parser import Parser
+from text_index import decode_text_chunk
+from text_rules import RuleEngine
+
+
+class TestTextIndex(unittest.TestCase):
+    TEST_DIR = "test_text_output"
+
+    def setUp(self):
+        if not os.path.exists(self.TEST_DIR):
+            os.makedirs(self.TEST_DIR)
+
+    def tearDown(self):
+        for file in os.listdir(self.TEST_DIR):
+            os.remove(os.path.join(self.TEST_DIR, file))
+        os.rmdir(self.TEST_DIR)
+
+    def _create_test_png(self, filename, text):
+        filepath = os.path.join(self.TEST_DIR, filename)
+        Image.new("RGB", (8, 8)).save(filepath, "PNG")
+        for chunk_type, values in text.items():
+            compress = chunk_type == b'iTXt'
+            rewrite_text_chunks(filepath, filepath, values, chunk_type=chunk_type, compress=compress)
+        return filepath
+
+    def test_decode_all_text_chunk_types(self):
+        for chunk_type, compress in ((b'tEXt', False), (b'zTXt', False), (b'iTXt', False), (b'iTXt', True)):
+            payload = make_text_chunk("Comment", "1950s vibe", chunk_type, compress)[8:-4]
+            self.assertEqual(decode_text_chunk(chunk_type, payload), ("Comment", "1950s vibe"))
+
+        payload = make_text_chunk("Title", "Ёлка", b'iTXt', True)[8:-4]
+        self.assertEqual(decode_text_chunk(b'iTXt', payload), ("Title", "Ёлка"))
+
+    def test_compressed_text_inflated_on_demand(self):
+        filepath = self._create_test_png("lazy.png", {b'zTXt': {"Author": "someone"},
+                                                      b'iTXt': {"Description": "долгое описание"}})
+        with mock.patch.object(text_index, "_inflate_text", wraps=text_index._inflate_text) as inflate:
+            parser = Parser()
+            parser.parse(filepath)
+            index = parser.text_index
+            self.assertEqual(set(index.keywords()), {"Author", "Description"})
+            self.assertTrue(all(entry.compressed for entry in index.entries))
+            inflate.assert_not_called()
+
+            self.assertEqual(index.get("Description"), "долгое описание")
+            self.assertEqual(inflate.call_count, 1)
+            self.assertEqual(index.get("Author"), "someone")
+            self.assertEqual(index.get("Author"), "someone")
+            self.assertEqual(inflate.call_count, 2)
+            self.assertFalse(parser.should_blur)
+            self.assertEqual(inflate.call_count, 2)
+            self.assertTrue(all(entry.compressed for entry in index.entries))
+
+        offsets = {entry.keyword: entry.offset for entry in index.entries}
+        self.assertEqual(index.offsets("Author"), [offsets["Author"]])
+        with open(filepath, "rb") as file:
+            file.seek(offsets["Author"] + 4)
+            self.assertEqual(file.read(4), b'zTXt')
+        self.assertIsNone(index.get("Missing"))
+        self.assertNotIn("Missing", index)
+
+    def test_rules_run_on_demand(self):
+        filepath = self._create_test_png("on_demand.png", {b'zTXt': {"Rating": "18+"}})
+        for options in ({}, {"metadata_only": True}):
+            with mock.patch.object(text_index, "_inflate_text", wraps=text_index._inflate_text) as inflate:
+                parser = Parser(**options)
+                parser.parse(filepath)
+                inflate.assert_not_called()
+
+                self.assertTrue(parser.should_blur)
+                self.assertFalse(parser.should_bw)
+                self.assertEqual(inflate.call_count, 1)
+                self.assertEqual(parser.text_actions, {TextActions.Blur})
+                self.assertEqual(inflate.call_count, 1)
+
+    def test_rules_set_flags_for_compressed_text(self):
+        filepath = self._create_test_png("flags.png", {b'zTXt': {"Rating": "18+"},
+                                                       b'iTXt': {"Style": "a 1950s vibe"}})
+        parser = Parser()
+        parser.parse(filepath)
+
+        self.assertTrue(parser.should_blur)
+        self.assertTrue(parser.should_bw)
+        self.assertEqual(parser.text_actions, {TextActions.Blur, TextActions.Grayscale})
+
+    def test_broken_compressed_text(self):
+        payload = b"Comment\x00\x00" + zlib.compress(b"text")[:-6]
+        chunk = text_index.Chunk(len(payload), b'zTXt', payload, b'', offset=33)
+        index = text_index.TextIndex()
+        entry = index.add(chunk)
+
+        self.assertEqual(entry.keyword, "Comment")
+        with self.assertLogs("png_parser", level="WARNING"):
+            self.assertEqual(entry.text, "")
+
+    def test_aho_corasick_matches_overlapping_patterns(self):
+        engine = RuleEngine({"a": ["he", "she", "his", "hers"], "b": ["e"], "c": ["xyz"]})
+        matches = [(position, pattern) for position, pattern, _ in engine.iter_matches("ushers")]
+
+        self.assertEqual(sorted(matches), [(3, "e"), (3, "he"), (3, "she"), (5, "hers")])
+        self.assertEqual(engine.match("ushers"), {"a", "b"})
+        self.assertEqual(engine.match("nothing"), set())
+        self.assertEqual(len(engine), 6)
+
+        engine = RuleEngine({"a": ["he", "she"]})
+        engine.add("x", "b")
+        self.assertEqual(sorted(pattern for _, pattern, _ in engine.iter_matches("she")), ["he", "she"])
+
+    def test_many_rules_match_like_naive_search(self):
+        patterns = [f"tag{i}" for i in range(300)] + ["18+", "nsfw", "w"]
+        engine = RuleEngine({pattern: [pattern] for pattern in patterns})
+        text = "some tag17 and tag250, also NSFW and 18+"
+
+        self.assertEqual(engine.match(text), {pattern for pattern in patterns if pattern in text})
+        folded = RuleEngine({"flag": ["nsfw"]}, case_sensitive=False)
+        self.assertEqual(folded.match(text), {"flag"})
+
+    def test_rules_from_json(self):
+        path = os.path.join(self.TEST_DIR, "rules.json")
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({TextActions.Blur: ["spoiler"], "review": ["черновик"]}, file, ensure_ascii=False)
+        engine = RuleEngine.from_json(path)
+
+        self.assertEqual(engine.match("черновик со spoiler"), {TextActions.Blur, "review"})
+        with self.assertRaises(ValueError):
+            engine.add("", "review")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+from chunk import Chunk
+from constants import TEXT_CHUNK_TYPES, TEXT_INFLATE_LIMIT
+from instrumentation import logger
+
+
+def _inflate_text(data: bytes) -> bytes:
+    inflater = zlib.decompressobj()
+    text = inflater.decompress(data, TEXT_INFLATE_LIMIT)
+    if inflater.unconsumed_tail:
+        logger.warning("Сжатый текст длиннее %d байт, обрезаем.", TEXT_INFLATE_LIMIT)
+    elif not inflater.eof:
+        raise zlib.error("Сжатый текст обрывается.")
+    return text
+
+
+def decode_text_chunk(chunk_type: bytes, payload: bytes) -> Tuple[str, str]:
+    keyword, _, rest = bytes(payload).partition(b'\x00')
+    keyword = keyword.decode('latin-1')
+    if chunk_type == b'tEXt':
+        return keyword, rest.decode('latin-1')
+    if chunk_type == b'zTXt':
+        # Первый байт - метод сжатия, дальше zlib-поток
+        return keyword, _inflate_text(rest[1:]).decode('latin-1')
+    if chunk_type == b'iTXt':
+        compressed, rest = rest[0], rest[2:]
+        _, _, rest = rest.partition(b'\x00')  # тег языка
+        _, _, text = rest.partition(b'\x00')  # переведённое ключевое слово
+        if compressed:
+            text = _inflate_text(text)
+        return keyword, text.decode('utf-8', errors='replace')
+    raise ValueError(f"Неизвестный тип текстового чанка: {chunk_type}")
+
+
+class TextEntry:
+    def __init__(self, chunk: Chunk):
+        # Ключевое слово читается сразу, сам текст распаковывается при первом обращении
+        self.chunk_type = chunk.chunk_type
+        self.offset = chunk.offset
+        self.keyword = bytes(chunk.view[:80]).partition(b'\x00')[0].decode('latin-1')
+        self.compressed = chunk.chunk_type == b'zTXt' or (
+            chunk.chunk_type == b'iTXt' and len(chunk.view) > len(self.keyword) + 1
+            and chunk.view[len(self.keyword) + 1] == 1)
+        self._chunk = chunk
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            try:
+                self._text = decode_text_chunk(self.chunk_type, self._chunk.view)[1]
+            except (zlib.error, IndexError, UnicodeDecodeError):
+                logger.warning("Ошибка разбора текстового чанка %s по смещению %s.", self.chunk_type, self.offset)
+                self._text = ''
+            self._chunk = None
+        return self._text
+
+    def __repr__(self):
+        return f"TextEntry({self.chunk_type}, {self.keyword!r}, offset={self.offset})"
+
+
+class TextIndex:
+    def __init__(self):
+        self.entries: List[TextEntry] = []
+        self._by_keyword: Dict[str, List[TextEntry]] = {}
+
+    def add(self, chunk: Chunk) -> TextEntry:
+        if chunk.chunk_type not in TEXT_CHUNK_TYPES:
+            raise ValueError(f"Чанк {chunk.chunk_type} не текстовый.")
+        entry = TextEntry(chunk)
+        self.entries.append(entry)
+        self._by_keyword.setdefault(entry.keyword, []).append(entry)
+        return entry
+
+    def keywords(self) -> List[str]:
+        return list(self._by_keyword)
+
+    def offsets(self, keyword: str) -> List[int]:
+        return [entry.offset for entry in self._by_keyword.get(keyword, [])]
+
+    def get(self, keyword: str, default: Optional[str] = None) -> Optional[str]:
+        entries = self._by_keyword.get(keyword)
+        return entries[0].text if entries else default
+
+    def get_all(self, keyword: str) -> List[str]:
+        return [entry.text for entry in self._by_keyword.get(keyword, [])]
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for entry in self.entries:
+            yield entry.keyword, entry.text
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._by_keyword
+
+    def __len__(self):
+        return len(self.entries)
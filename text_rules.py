@@ -0,0 +1,92 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from constants import TextActions
+
+
+class RuleEngine:
+    def __init__(self, rules: Dict[str, Iterable[str]] = None, case_sensitive: bool = True):
+        # rules: действие -> шаблоны; все шаблоны ищутся одним проходом автомата Ахо-Корасик
+        self.case_sensitive = case_sensitive
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._patterns: List[List[Tuple[str, str]]] = [[]]
+        self._outputs: List[List[Tuple[str, str]]] = [[]]
+        self._built = True
+        self._count = 0
+        for action, patterns in (rules or {}).items():
+            for pattern in patterns:
+                self.add(pattern, action)
+        # Автомат строим сразу: общий экземпляр могут читать несколько потоков
+        self._build()
+
+    @classmethod
+    def from_json(cls, path: str, case_sensitive: bool = True) -> "RuleEngine":
+        import json
+
+        with open(path, encoding="utf-8") as file:
+            return cls(json.load(file), case_sensitive)
+
+    def add(self, pattern: str, action: str):
+        if not pattern:
+            raise ValueError("Пустой шаблон правила.")
+        state = 0
+        for symbol in self._fold(pattern):
+            next_state = self._goto[state].get(symbol)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][symbol] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._patterns.append([])
+            state = next_state
+        self._patterns[state].append((pattern, action))
+        self._count += 1
+        self._built = False
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, str]]:
+        # (позиция конца совпадения, шаблон, действие)
+        if not self._built:
+            self._build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for position, symbol in enumerate(self._fold(text)):
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for pattern, action in outputs[state]:
+                yield position, pattern, action
+
+    def match(self, text: str) -> Set[str]:
+        return {action for _, _, action in self.iter_matches(text)}
+
+    def __len__(self):
+        return self._count
+
+    def _fold(self, text: str) -> str:
+        return text if self.case_sensitive else text.lower()
+
+    def _build(self):
+        # Ссылки неудач строятся обходом бора в ширину, выходы наследуются по ним.
+        # Выходы каждый раз собираются заново из собственных шаблонов узлов, иначе add() после сборки их задвоит
+        self._outputs = [list(patterns) for patterns in self._patterns]
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for symbol, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and symbol not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(symbol, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+                queue.append(next_state)
+        self._built = True
+
+
+DEFAULT_TEXT_RULES = {
+    TextActions.Blur: ["18+"],
+    TextActions.Grayscale: ["1950s vibe"],
+}
+
+DEFAULT_RULE_ENGINE = RuleEngine(DEFAULT_TEXT_RULES)